@@ -0,0 +1,109 @@
+#! /usr/bin/env python
+"""Compares the fetch backends on the same local stand-in server workload.
+
+Each backend runs in a process of its own, as the eventlet backend needs
+sockets monkey-patched and the thread backend must not have them. In
+each, IN_FLIGHT titles of pages that take a second are fetched at once,
+to measure the memory each fetch in flight takes, then FETCHES titles of
+pages that take 50ms are fetched, IN_FLIGHT at a time, to measure the
+throughput.
+
+Run from the top-level directory:
+    ``python -m benchmarks.bench_backends [--json FILE]``
+"""
+
+import multiprocessing
+import resource
+import time
+
+import eventlet
+
+from benchmarks import report
+from benchmarks import standin
+from strainer.backends import BACKENDS
+from strainer.backends import GreenBackend
+from strainer.connections import ConnectionPool
+from strainer.fetcher import TitleFetcher
+from strainer.hosts import Hosts
+from strainer.resolver import Resolver
+
+
+IN_FLIGHT = 200
+
+FETCHES = 2000
+
+WARMUP = 50
+
+SLOW_PAGE = '/page/%d?delay=1000'
+
+PAGE = '/page/%d?delay=50'
+
+
+def max_rss():
+    """Returns the peak memory of the process so far, in KB"""
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def fetch(base_url, path, first, count):
+    urls = [base_url + path % n for n in range(first, first + count)]
+    titles = TitleFetcher.fetch_titles(urls)
+    return sum(1 for title in titles if title)
+
+
+def run(name, base_url, results):
+    """Runs the workload with a backend and puts its result in results"""
+
+    if name == GreenBackend.name:
+        # (note): As in strainer/server.py
+        eventlet.monkey_patch(all=False, socket=True)
+    # (note): The pages are all on one host, which mustn't be what limits
+    # the fetches in flight
+    TitleFetcher.hosts = Hosts(max_concurrent=IN_FLIGHT)
+    TitleFetcher.connections = ConnectionPool(
+        max_connections=IN_FLIGHT, max_per_host=IN_FLIGHT,
+        resolver=Resolver())
+    TitleFetcher.use_backend(BACKENDS[name](size=IN_FLIGHT))
+
+    fetch(base_url, PAGE, 0, WARMUP)
+    base = max_rss()
+    titles = fetch(base_url, SLOW_PAGE, WARMUP, IN_FLIGHT)
+    per_fetch = float(max_rss() - base) / IN_FLIGHT
+
+    start = time.time()
+    titles += fetch(base_url, PAGE, WARMUP + IN_FLIGHT, FETCHES)
+    elapsed = time.time() - start
+
+    results.put({'backend': name,
+                 'in_flight': IN_FLIGHT,
+                 'kb_per_fetch': per_fetch,
+                 'fetches': IN_FLIGHT + FETCHES,
+                 'titles': titles,
+                 'fetches_per_s': FETCHES / elapsed})
+
+
+def main(argv=None):
+    args = report.parse_args(__doc__.splitlines()[0], argv)
+    process, base_url = standin.start()
+    print('%-8s %9s %12s %8s %8s' % ('backend', 'in flight', 'KB/fetch',
+                                     'titles', 'fetches/s'))
+    results = []
+    try:
+        for name in sorted(BACKENDS):
+            queue = multiprocessing.Queue()
+            child = multiprocessing.Process(target=run,
+                                            args=(name, base_url, queue))
+            child.start()
+            result = queue.get()
+            child.join()
+            print('%-8s %9d %12.1f %8d %8.0f' % (
+                name, result['in_flight'], result['kb_per_fetch'],
+                result['titles'], result['fetches_per_s']))
+            results.append(result)
+    finally:
+        standin.stop(process)
+    report.write_json(args.json, 'backends', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#! /usr/bin/env python
+"""Shows the latency gained by reusing connections for title fetches.
+
+The title of a small page on the stand-in server is fetched over a new
+connection each time and over the fetcher's pooled connections. As the
+server is local, connecting is much cheaper than over a network, so the
+server is also made to wait before handling a new connection to stand
+in for the round trips of a TCP (and TLS) handshake.
+
+Run from the top-level directory:
+    ``python -m benchmarks.bench_connections [--json FILE]``
+"""
+
+import time
+
+import requests
+
+from benchmarks import report
+from benchmarks import standin
+from strainer.fetcher import TitleFetcher
+
+
+FETCHES = 200
+
+# (note): Seconds the server waits before handling a new connection
+HANDSHAKE_DELAYS = [0, 0.001, 0.005]
+
+
+def fetch_new_connection(url):
+    resp = requests.get(url, stream=True)
+    try:
+        return TitleFetcher._read_title(resp)
+    finally:
+        resp.close()
+
+
+def fetch_pooled(url):
+    return TitleFetcher._fetch_title(url)
+
+
+def bench(base_url, func):
+    """Returns mean ms per fetch and connections made to the server"""
+
+    standin.stats(base_url, reset=True)
+    url = base_url + '/page/42'
+    start = time.time()
+    for _ in range(FETCHES):
+        assert func(url) == u'Page 42'
+    elapsed = time.time() - start
+    # (note): Less the connection asking for the stats
+    connections = standin.stats(base_url)['connections'] - 1
+    return elapsed * 1000 / FETCHES, connections
+
+
+def main(argv=None):
+    args = report.parse_args(__doc__.splitlines()[0], argv)
+    print('%-10s %16s %8s %16s %8s %8s' % ('handshake', 'new conn (ms)',
+                                           'conns', 'pooled (ms)', 'conns',
+                                           'speedup'))
+    results = []
+    for delay in HANDSHAKE_DELAYS:
+        process, base_url = standin.start(handshake_delay=delay)
+        try:
+            TitleFetcher.connections.close()
+            new, new_conns = bench(base_url, fetch_new_connection)
+            pooled, pooled_conns = bench(base_url, fetch_pooled)
+        finally:
+            standin.stop(process)
+        print('%-10s %16.3f %8d %16.3f %8d %7.2fx' % (
+            '%gms' % (delay * 1000), new, new_conns, pooled, pooled_conns,
+            new / pooled))
+        results.append({'handshake_delay_ms': delay * 1000,
+                        'new_connection_ms': new,
+                        'new_connection_connections': new_conns,
+                        'pooled_ms': pooled,
+                        'pooled_connections': pooled_conns})
+    report.write_json(args.json, 'connections', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#! /usr/bin/env python
+"""Benchmarks TitleFetcher against a local stand-in server.
+
+The stand-in simulates slow sites, big pages and sites that never answer,
+and each scenario fetches a batch of titles from it with fetch_titles.
+The cache is cleared before each scenario except 'cached'.
+
+Run from the top-level directory:
+    ``python -m benchmarks.bench_fetcher [--json FILE]``
+"""
+
+import time
+
+import eventlet
+
+from benchmarks import report
+from benchmarks import standin
+from strainer.fetcher import TitleFetcher
+
+
+DEADLINE = 0.8
+
+# (note): Each scenario is a list of (path, count) for the pages fetched,
+# and whether titles are cached beforehand
+SCENARIOS = [
+    ('small', [('/page/%d', 100)], False),
+    ('cached', [('/page/%d', 100)], True),
+    ('latency_100ms', [('/page/%d?delay=100', 100)], False),
+    ('latency_mixed', [('/page/%d?delay=10', 90),
+                       ('/page/%d?delay=500', 10)], False),
+    ('big_5mb', [('/page/%d?size=5000000', 20)], False),
+    ('images_5mb', [('/file/%d?size=5000000', 20)], False),
+    ('hangs', [('/page/%d', 50), ('/hang?%d', 10)], False),
+]
+
+
+def main(argv=None):
+    args = report.parse_args(__doc__.splitlines()[0], argv)
+    # (note): As in strainer/server.py, so fetches run concurrently
+    eventlet.monkey_patch(all=False, socket=True)
+    process, base_url = standin.start()
+    print('%-15s %6s %10s %8s %10s' % ('scenario', 'urls', 'time (ms)',
+                                       'titles', 'timed out'))
+    results = []
+    try:
+        for name, pages, cached in SCENARIOS:
+            urls = []
+            for path, count in pages:
+                for _ in range(count):
+                    urls.append(base_url + path % len(urls))
+
+            TitleFetcher.cache.clear()
+            TitleFetcher.hosts.clear()
+            TitleFetcher.connections.close()
+            if cached:
+                TitleFetcher.fetch_titles(urls, deadline=DEADLINE)
+
+            start = time.time()
+            titles = TitleFetcher.fetch_titles(urls, deadline=DEADLINE)
+            elapsed = (time.time() - start) * 1000
+
+            fetched = sum(1 for title in titles if title)
+            timed_out = sum(1 for title in titles if title is None)
+            print('%-15s %6d %10.1f %8d %10d' % (name, len(urls), elapsed,
+                                                  fetched, timed_out))
+            results.append({'scenario': name,
+                            'urls': len(urls),
+                            'deadline_ms': DEADLINE * 1000,
+                            'ms': elapsed,
+                            'titles': fetched,
+                            'timed_out': timed_out})
+    finally:
+        standin.stop(process)
+    report.write_json(args.json, 'fetcher', results)
+
+
+if __name__ == '__main__':
+    main()
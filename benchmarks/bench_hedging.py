@@ -0,0 +1,99 @@
+#! /usr/bin/env python
+"""Measures the tail latency of title fetches with and without hedging.
+
+Pages of the local stand-in server answer in a few milliseconds, but a
+small fraction of requests, picked at random, stall for much longer, as
+behind a bad connection or backend. Titles of distinct pages are fetched
+a few at a time, first without hedging, then with a HedgePolicy, and the
+latency percentiles of the fetches are compared, along with the requests
+the stand-in server got.
+
+Run from the top-level directory:
+    ``python -m benchmarks.bench_hedging [--json FILE]``
+"""
+
+import time
+
+import eventlet
+
+from benchmarks import report
+from benchmarks import standin
+from benchmarks.bench_load import percentile
+from strainer.fetcher import HEDGED
+from strainer.fetcher import TitleFetcher
+from strainer.hedging import HedgePolicy
+
+
+PAGE = '/page/%d?delay=20&stall=500&stall_ratio=0.02'
+
+# (note): Fetches run first, so the policy has fetch times to go by
+WARMUP = 200
+
+FETCHES = 2000
+
+# (note): Low enough that the CPU isn't saturated, which would add
+# queueing for it to the latencies
+CONCURRENCY = 4
+
+POLICIES = [
+    ('off', None),
+    ('p95', lambda: HedgePolicy(percentile=95, max_ratio=0.05)),
+]
+
+
+def fetch_all(urls, latencies):
+    def fetch(url):
+        start = time.time()
+        TitleFetcher.fetch_title(url)
+        latencies.append(time.time() - start)
+
+    pool = eventlet.GreenPool(CONCURRENCY)
+    for url in urls:
+        pool.spawn_n(fetch, url)
+    pool.waitall()
+
+
+def main(argv=None):
+    args = report.parse_args(__doc__.splitlines()[0], argv)
+    # (note): As in strainer/server.py, so fetches run concurrently
+    eventlet.monkey_patch(all=False, socket=True)
+    process, base_url = standin.start()
+    print('%-8s %8s %8s %8s %8s %8s %9s' % (
+        'hedging', 'p50 (ms)', 'p95 (ms)', 'p99 (ms)', 'max (ms)',
+        'hedged', 'requests'))
+    results = []
+    try:
+        for i, (name, policy) in enumerate(POLICIES):
+            TitleFetcher.cache.clear()
+            TitleFetcher.hosts.clear()
+            TitleFetcher.hedging = policy and policy()
+            offset = i * (WARMUP + FETCHES)
+            fetch_all([base_url + PAGE % (offset + n)
+                       for n in range(WARMUP)], [])
+
+            hedged = HEDGED.get()
+            standin.stats(base_url, reset=True)
+            latencies = []
+            fetch_all([base_url + PAGE % (offset + WARMUP + n)
+                       for n in range(FETCHES)], latencies)
+            requests = standin.stats(base_url)['requests']
+            hedged = HEDGED.get() - hedged
+
+            latencies.sort()
+            result = {'hedging': name, 'fetches': FETCHES,
+                      'hedged': hedged, 'requests': requests}
+            for percent in (50, 95, 99, 100):
+                key = 'max_ms' if percent == 100 else 'p%d_ms' % percent
+                result[key] = percentile(latencies, percent) * 1000
+            print('%-8s %8.1f %8.1f %8.1f %8.1f %8d %9d' % (
+                name, result['p50_ms'], result['p95_ms'], result['p99_ms'],
+                result['max_ms'], hedged, requests))
+            results.append(result)
+    finally:
+        TitleFetcher.hedging = None
+        standin.stop(process)
+    report.write_json(args.json, 'hedging', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+#! /usr/bin/env python
+"""Load tests the Strainer API end to end.
+
+strainer/server.py is started in a process of its own, and clients post
+messages from the synthetic corpus to it, as many at once as the
+concurrency, for a while. Links in the messages point to the local
+stand-in server. Throughput and latency percentiles are reported for
+each concurrency. The server can be run with several worker processes,
+to compare throughput with the number of workers and cores.
+
+Run from the top-level directory:
+    ``python -m benchmarks.bench_load [--workers N] [--json FILE]``
+"""
+
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import eventlet
+import requests
+
+from benchmarks import report
+from benchmarks import standin
+from benchmarks.corpus import Corpus
+
+
+CONCURRENCIES = [1, 10, 50]
+
+DURATION = 10
+
+MESSAGES = 2000
+
+SERVER = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                      'strainer', 'server.py')
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def start_server(workers=1):
+    """Starts the Strainer API, returning its process and url"""
+
+    port = free_port()
+    # (note): Drops the server's access log
+    devnull = open(os.devnull, 'w')
+    process = subprocess.Popen([sys.executable, SERVER, '--port', str(port),
+                                '--workers', str(workers)],
+                               stdout=devnull, stderr=devnull)
+    url = 'http://127.0.0.1:%d/strainers' % port
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port)).close()
+            return process, url
+        except socket.error:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError('Strainer API did not start')
+
+
+def percentile(values, percent):
+    """Returns the nearest-rank percentile of sorted values"""
+
+    if not values:
+        return None
+    rank = int(round(percent / 100.0 * len(values) + 0.5)) - 1
+    return values[min(max(rank, 0), len(values) - 1)]
+
+
+def client(url, messages, start, stop, latencies, errors):
+    """Posts messages one after another until stop"""
+
+    session = requests.Session()
+    i = start
+    while time.time() < stop:
+        body = json.dumps({'message': messages[i % len(messages)]})
+        i += 1
+        sent = time.time()
+        try:
+            resp = session.post(url, data=body,
+                                headers={'Content-Type': 'application/json'})
+            resp.content
+        except requests.RequestException:
+            errors.append(None)
+            continue
+        if resp.status_code == 200:
+            latencies.append(time.time() - sent)
+        else:
+            errors.append(resp.status_code)
+
+
+def run(url, messages, concurrency):
+    latencies = []
+    errors = []
+    stop = time.time() + DURATION
+    pool = eventlet.GreenPool(concurrency)
+    start = time.time()
+    for i in range(concurrency):
+        pool.spawn(client, url, messages, i * len(messages) // concurrency,
+                   stop, latencies, errors)
+    pool.waitall()
+    elapsed = time.time() - start
+    latencies.sort()
+    result = {'concurrency': concurrency,
+              'requests': len(latencies),
+              'errors': len(errors),
+              'seconds': elapsed,
+              'rps': len(latencies) / elapsed}
+    for percent in (50, 95, 99):
+        value = percentile(latencies, percent)
+        result['p%d_ms' % percent] = value and value * 1000
+    return result
+
+
+def main(argv=None):
+    parser = report.parser(__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=1,
+                        help='worker processes of the server (default: 1)')
+    args = parser.parse_args(argv)
+    eventlet.monkey_patch(all=False, socket=True)
+
+    standin_process, base_url = standin.start()
+    server_process = None
+    try:
+        server_process, url = start_server(args.workers)
+        messages = Corpus(seed=1, link_base=base_url).messages(MESSAGES)
+
+        print('workers: %d, cores: %d' % (args.workers,
+                                          multiprocessing.cpu_count()))
+        print('%12s %10s %8s %10s %10s %10s %10s' % (
+            'concurrency', 'requests', 'errors', 'req/s', 'p50 (ms)',
+            'p95 (ms)', 'p99 (ms)'))
+        results = []
+        for concurrency in CONCURRENCIES:
+            result = run(url, messages, concurrency)
+            result['workers'] = args.workers
+            print('%12d %10d %8d %10.1f %10.1f %10.1f %10.1f' % (
+                concurrency, result['requests'], result['errors'],
+                result['rps'], result['p50_ms'] or 0, result['p95_ms'] or 0,
+                result['p99_ms'] or 0))
+            results.append(result)
+    finally:
+        if server_process is not None:
+            server_process.terminate()
+            server_process.wait()
+        standin.stop(standin_process)
+    report.write_json(args.json, 'load', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#! /usr/bin/env python
+"""Micro-benchmarks each MessageStrainer method on a synthetic corpus.
+
+Each method is run over a corpus of each kind of message generated by
+benchmarks.corpus, and over the whole mix.
+
+Run from the top-level directory:
+    ``python -m benchmarks.bench_methods [--json FILE]``
+"""
+
+import timeit
+
+from benchmarks import report
+from benchmarks.corpus import Corpus
+from benchmarks.corpus import KINDS
+from strainer.strainer import MessageStrainer
+
+
+METHODS = ['strain_mentions', 'strain_emoticons', 'strain_urls',
+           'strain_all']
+
+MESSAGES = 500
+
+
+def bench(func, messages, repeat=5):
+    """Returns the best time per message in microseconds"""
+
+    def run():
+        for message in messages:
+            func(message)
+
+    best = min(timeit.Timer(run).repeat(repeat=repeat, number=1))
+    return best / len(messages) * 1e6
+
+
+def main(argv=None):
+    args = report.parse_args(__doc__.splitlines()[0], argv)
+    corpora = [(kind, Corpus(seed=1).messages(MESSAGES, [kind]))
+               for kind, _ in KINDS]
+    corpora.append(('all', Corpus(seed=1).messages(MESSAGES)))
+
+    print('%-10s %10s %-18s %12s %10s' % ('corpus', 'avg length', 'method',
+                                          'us/message', 'MB/s'))
+    results = []
+    for kind, messages in corpora:
+        length = sum(len(message) for message in messages) / len(messages)
+        for method in METHODS:
+            per_message = bench(getattr(MessageStrainer, method), messages)
+            throughput = length / per_message
+            print('%-10s %10d %-18s %12.1f %10.1f' % (
+                kind, length, method, per_message, throughput))
+            results.append({'corpus': kind,
+                            'messages': len(messages),
+                            'avg_length': length,
+                            'method': method,
+                            'us_per_message': per_message,
+                            'mb_per_s': throughput})
+    report.write_json(args.json, 'methods', results)
+
+
+if __name__ == '__main__':
+    main()
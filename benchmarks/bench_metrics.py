@@ -0,0 +1,142 @@
+#! /usr/bin/env python
+"""Measures the overhead of the metrics and request IDs on requests.
+
+Each instrumented step is timed with and without its instrumentation:
+the request middleware (request ID, requests in flight and latency),
+a stage timed inline (parse, serialize, connect) and a stage timed with
+metrics.timed (strain_* and fetch_title). The overhead per request adds
+them up as a request without links incurs them, and is compared with
+the time of a whole request to the API without links.
+
+The middleware's target is ~4 us, on a Python 2 whose function calls
+cost ~0.3 us each: a request ID, adding and removing the request from
+those in flight, two clock reads and a histogram observation. That's
+about 1% of a request without links.
+
+Run from the top-level directory:
+    ``python -m benchmarks.bench_metrics [--json FILE]``
+"""
+
+import json
+import time
+import timeit
+
+from werkzeug.test import EnvironBuilder
+
+from benchmarks import report
+from strainer import api
+from strainer import metrics
+
+
+NUMBER = 100000
+
+REPEAT = 5
+
+# (note): Stages a request without links goes through
+INLINE_STAGES = 2   # parse, serialize
+TIMED_STAGES = 1    # strain_all
+
+
+def best(func, number=NUMBER):
+    """Returns the best time of a call in microseconds"""
+
+    timer = timeit.Timer(func)
+    return min(timer.repeat(repeat=REPEAT, number=number)) / number * 1e6
+
+
+def bench_inline():
+    histogram = metrics.Histogram()
+
+    def bare():
+        pass
+
+    def instrumented():
+        start = time.time()
+        try:
+            pass
+        finally:
+            histogram.observe(time.time() - start)
+
+    return best(bare), best(instrumented)
+
+
+def bench_timed():
+    def noop():
+        pass
+
+    timed = metrics.timed(metrics.Histogram())(noop)
+    return best(noop), best(timed)
+
+
+def bench_middleware():
+    def wsgi_app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'ok']
+
+    def start_response(status, headers, exc_info=None):
+        pass
+
+    environ = EnvironBuilder(path='/strainers').get_environ()
+
+    def call(app):
+        def run():
+            response = app(environ, start_response)
+            for _ in response:
+                pass
+            if hasattr(response, 'close'):
+                response.close()
+        return run
+
+    middleware = api.RequestMiddleware(wsgi_app)
+    return best(call(wsgi_app)), best(call(middleware))
+
+
+def bench_request():
+    body = json.dumps({'message': '@chris (coffee) you around?'})
+    builder = EnvironBuilder(path='/strainers', method='POST', data=body,
+                             content_type='application/json')
+    environ = builder.get_environ()
+
+    def start_response(status, headers, exc_info=None):
+        pass
+
+    def run():
+        environ['wsgi.input'].seek(0)
+        response = api.app(dict(environ), start_response)
+        b''.join(response)
+        response.close()
+
+    return best(run, number=NUMBER // 20)
+
+
+def main(argv=None):
+    args = report.parse_args(__doc__.splitlines()[0], argv)
+    print('%-12s %12s %16s %14s' % ('step', 'bare (us)', 'instrumented (us)',
+                                    'overhead (us)'))
+    results = []
+    overheads = {}
+    for name, func in [('inline', bench_inline), ('timed', bench_timed),
+                       ('middleware', bench_middleware)]:
+        bare, instrumented = func()
+        overheads[name] = instrumented - bare
+        print('%-12s %12.3f %16.3f %14.3f' % (name, bare, instrumented,
+                                              overheads[name]))
+        results.append({'step': name,
+                        'bare_us': bare,
+                        'instrumented_us': instrumented,
+                        'overhead_us': overheads[name]})
+
+    per_request = (overheads['middleware'] +
+                   INLINE_STAGES * overheads['inline'] +
+                   TIMED_STAGES * overheads['timed'])
+    request = bench_request()
+    print('overhead per request: %.2f us of %.1f us (%.1f%%)' % (
+        per_request, request, per_request / request * 100))
+    results.append({'step': 'request',
+                    'request_us': request,
+                    'overhead_us': per_request})
+    report.write_json(args.json, 'metrics', results)
+
+
+if __name__ == '__main__':
+    main()
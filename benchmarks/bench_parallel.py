@@ -0,0 +1,85 @@
+#! /usr/bin/env python
+"""Shows the speedup of straining very long messages in parallel.
+
+Messages like pasted logs are strained in a single pass and in chunks on
+pools of processes of different sizes. The speedup depends on the number
+of cores; with one, the parallel runs only show its overhead.
+
+Run from the top-level directory:
+    ``python -m benchmarks.bench_parallel [--json FILE]``
+"""
+
+import multiprocessing
+import time
+
+from benchmarks import report
+from strainer.strainer import MessageStrainer
+
+
+LOG_LINES = [
+    '2016-08-05 10:41:07 INFO  build #4121 started by @alice\n',
+    '2016-08-05 10:41:09 DEBUG fetching http://ci.example.com/job/4121/log\n',
+    '2016-08-05 10:41:12 WARN  retrying wiki.example.org/deploy (1 of 3)\n',
+    '2016-08-05 10:41:15 ERROR test_strainer.py:42 AssertionError (failed)\n',
+    '2016-08-05 10:41:16 INFO  see https://jira.example.com/browse/OPS-17\n',
+]
+
+SIZES = [64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024]
+
+REPEAT = 3
+
+
+def make_message(size):
+    lines = []
+    length = 0
+    while length < size:
+        line = LOG_LINES[len(lines) % len(LOG_LINES)]
+        lines.append(line)
+        length += len(line)
+    return ''.join(lines)[:size]
+
+
+def bench(func, message):
+    """Returns the result and the best time in milliseconds of REPEAT"""
+
+    best = None
+    for _ in range(REPEAT):
+        start = time.time()
+        result = func(message)
+        elapsed = (time.time() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main(argv=None):
+    args = report.parse_args(__doc__.splitlines()[0], argv)
+    cores = multiprocessing.cpu_count()
+    process_counts = sorted(set([1, 2, 4, cores]))
+    print('cores: %d' % cores)
+    print('%10s %12s %10s %12s %8s' % ('size (KB)', 'serial (ms)',
+                                       'processes', 'parallel (ms)',
+                                       'speedup'))
+    results = []
+    for processes in process_counts:
+        MessageStrainer.processes = processes
+        MessageStrainer._process_pool = None
+        # (note): Starts the pool before timing
+        MessageStrainer.strain_parallel(make_message(1024))
+        for size in SIZES:
+            message = make_message(size)
+            expected, serial = bench(MessageStrainer._strain_all, message)
+            actual, parallel = bench(MessageStrainer.strain_parallel,
+                                     message)
+            assert expected == actual
+            print('%10d %12.1f %10d %12.1f %7.2fx' % (
+                size // 1024, serial, processes, parallel, serial / parallel))
+            results.append({'size': size,
+                            'processes': processes,
+                            'serial_ms': serial,
+                            'parallel_ms': parallel})
+        MessageStrainer._process_pool.terminate()
+    report.write_json(args.json, 'parallel', results)
+
+
+if __name__ == '__main__':
+    main()
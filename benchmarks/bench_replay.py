@@ -0,0 +1,114 @@
+#! /usr/bin/env python
+"""Benchmarks the fetch and parse pipeline offline, replaying an archive.
+
+Responses are recorded once, from the local stand-in server, or taken
+from an archive recorded elsewhere, e.g. by ``server.py --record``. All
+recorded URLs are then fetched REPEAT times from the archive, as fast as
+they can be parsed (latency x0) and as slowly as they were recorded
+(latency x1), so runs on machines without network can be compared.
+
+Run from the top-level directory:
+    ``python -m benchmarks.bench_replay [--archive PATH] [--json FILE]``
+"""
+
+import os
+import shutil
+import tempfile
+import time
+
+import eventlet
+
+from benchmarks import report
+from benchmarks import standin
+from strainer.archive import FetchArchive
+from strainer.archive import ReplayAdapter
+from strainer.fetcher import TitleFetcher
+
+
+REPEAT = 3
+
+SCALES = [0, 1]
+
+# (note): (path, count) of the pages recorded from the stand-in server
+PAGES = [
+    ('/page/%d?delay=20', 150),
+    ('/page/%d?delay=200', 20),
+    ('/page/%d?size=1000000', 20),
+    ('/file/%d?size=1000000', 10),
+]
+
+
+def record(path):
+    """Records the stand-in server's responses to PAGES into an archive"""
+
+    process, base_url = standin.start()
+    archive = FetchArchive(path)
+    try:
+        urls = []
+        for page, count in PAGES:
+            for _ in range(count):
+                urls.append(base_url + page % len(urls))
+        TitleFetcher.connections.use_transport(archive.recorder)
+        TitleFetcher.fetch_titles(urls)
+    finally:
+        standin.stop(process)
+    return archive
+
+
+def replay(archive, urls, scale):
+    """Returns the seconds it took to fetch all titles from the archive,
+    and the number of them found"""
+
+    TitleFetcher.cache.clear()
+    TitleFetcher.hosts.clear()
+    TitleFetcher.connections.use_transport(
+        lambda adapter: ReplayAdapter(archive, latency_scale=scale))
+    start = time.time()
+    titles = TitleFetcher.fetch_titles(urls)
+    return time.time() - start, sum(1 for title in titles if title)
+
+
+def main(argv=None):
+    parser = report.parser(__doc__.splitlines()[0])
+    parser.add_argument('--archive', metavar='PATH',
+                        help='replay this archive instead of recording one')
+    args = parser.parse_args(argv)
+    # (note): As in strainer/server.py, so fetches run concurrently
+    eventlet.monkey_patch(all=False, socket=True)
+
+    directory = None
+    if args.archive:
+        archive = FetchArchive(args.archive)
+    else:
+        directory = tempfile.mkdtemp()
+        archive = record(os.path.join(directory, 'archive.db'))
+
+    urls = archive.urls()
+    print('%-8s %6s %8s %10s %10s %10s' % ('latency', 'urls', 'titles',
+                                           'best (ms)', 'worst (ms)',
+                                           'titles/s'))
+    results = []
+    try:
+        for scale in SCALES:
+            runs = [replay(archive, urls, scale) for _ in range(REPEAT)]
+            best = min(elapsed for elapsed, _ in runs)
+            worst = max(elapsed for elapsed, _ in runs)
+            titles = runs[0][1]
+            print('x%-7g %6d %8d %10.1f %10.1f %10.0f' % (
+                scale, len(urls), titles, best * 1000, worst * 1000,
+                len(urls) / best))
+            results.append({'latency_scale': scale,
+                            'urls': len(urls),
+                            'titles': titles,
+                            'best_ms': best * 1000,
+                            'worst_ms': worst * 1000,
+                            'fetches_per_s': len(urls) / best})
+    finally:
+        archive.close()
+        if directory is not None:
+            shutil.rmtree(directory)
+    report.write_json(args.json, 'replay', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#! /usr/bin/env python
+"""Measures how soon a new process is ready to handle requests.
+
+Each run starts a fresh interpreter, which times importing the straining
+core (strainer.strainer) and the whole API (strainer.api), then the first
+and second requests to strain a message without links. With warm-up, the
+process warms up (see strainer.api.warm_up) before the first request.
+Each case runs REPEAT times and the median is reported, to track cold
+starts over time.
+
+Run from the top-level directory:
+    ``python -m benchmarks.bench_startup [--json FILE]``
+"""
+
+import json
+import subprocess
+import sys
+
+from benchmarks import report
+
+
+REPEAT = 5
+
+# (note): Run in the child; prints its timings, in seconds, as JSON
+CHILD = """
+import json, sys, time
+start = time.time()
+import strainer.strainer
+core = time.time() - start
+start = time.time()
+from strainer import api
+imported = time.time() - start
+warm_up = api.warm_up() if sys.argv[1] == 'warm' else 0.0
+client = api.app.test_client()
+body = json.dumps({'message': '@chris (coffee) see you at 5.'})
+requests = []
+for _ in range(2):
+    start = time.time()
+    client.post('/strainers', data=body, content_type='application/json')
+    requests.append(time.time() - start)
+print(json.dumps({'import_core': core, 'import_api': imported,
+                  'warm_up': warm_up, 'first_request': requests[0],
+                  'second_request': requests[1]}))
+"""
+
+FIELDS = ('import_core', 'import_api', 'warm_up', 'first_request',
+          'second_request')
+
+
+def run(mode):
+    """Returns the timings of a fresh process, warmed up or cold"""
+
+    output = subprocess.check_output([sys.executable, '-c', CHILD, mode])
+    return json.loads(output.splitlines()[-1])
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main(argv=None):
+    args = report.parse_args(__doc__.splitlines()[0], argv)
+    print('%-5s %12s %12s %10s %14s %15s' % (
+        'mode', 'import core', 'import api', 'warm up', 'first request',
+        'second request'))
+    results = []
+    for mode in ('cold', 'warm'):
+        runs = [run(mode) for _ in range(REPEAT)]
+        result = {'mode': mode}
+        for field in FIELDS:
+            result[field + '_ms'] = median([r[field] for r in runs]) * 1e3
+        print('%-5s %12.1f %12.1f %10.1f %14.2f %15.2f' % (
+            mode, result['import_core_ms'], result['import_api_ms'],
+            result['warm_up_ms'], result['first_request_ms'],
+            result['second_request_ms']))
+        results.append(result)
+    report.write_json(args.json, 'startup', results)
+
+
+if __name__ == '__main__':
+    main()
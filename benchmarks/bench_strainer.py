@@ -0,0 +1,68 @@
+#! /usr/bin/env python
+"""Compares straining a message with three regexes against one pass.
+
+Run from the top-level directory:
+    ``python -m benchmarks.bench_strainer [--json FILE]``
+"""
+
+import re
+import timeit
+
+from benchmarks import report
+from strainer.strainer import MessageStrainer
+from strainer import util
+
+
+MESSAGES = {
+    'short': '@chris you around? (coffee)',
+    'mixed': ('@bob @john (success) such a cool feature; '
+              'https://twitter.com/jdorfman/status/430511497475670016 '
+              'and www.olympic.org/rio-2016 (megusta) '),
+    'long_text': ('Lorem ipsum dolor sit amet, consectetur adipiscing elit, '
+                  'sed do eiusmod tempor incididunt ut labore. ') * 200,
+    'long_mixed': ('@alice see http://www.nbcolympics.com (yes) and '
+                   'the wiki at wiki.example.com/page please. ') * 200,
+}
+
+
+RE_URL = re.compile(util.WEB_URL_REGEX)
+
+
+def strain_separately(message):
+    return (MessageStrainer.re_mentions.findall(message),
+            MessageStrainer.re_emoticons.findall(message),
+            RE_URL.findall(message))
+
+
+def strain_together(message):
+    return MessageStrainer.strain_all(message)
+
+
+def bench(func, message, number=100, repeat=5):
+    """Returns the best time per call in microseconds"""
+
+    timer = timeit.Timer(lambda: func(message))
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def main(argv=None):
+    args = report.parse_args(__doc__.splitlines()[0], argv)
+    print('%-12s %8s %14s %14s %8s' % ('message', 'length', 'separate (us)',
+                                       'strain_all (us)', 'speedup'))
+    results = []
+    for name in sorted(MESSAGES):
+        message = MESSAGES[name]
+        assert strain_separately(message) == strain_together(message)
+        separate = bench(strain_separately, message)
+        together = bench(strain_together, message)
+        print('%-12s %8d %14.1f %14.1f %7.2fx' % (
+            name, len(message), separate, together, separate / together))
+        results.append({'message': name,
+                        'length': len(message),
+                        'separate_us': separate,
+                        'strain_all_us': together})
+    report.write_json(args.json, 'strainer', results)
+
+
+if __name__ == '__main__':
+    main()
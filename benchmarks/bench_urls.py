@@ -0,0 +1,85 @@
+#! /usr/bin/env python
+"""Shows how finding URLs scales on pathological messages.
+
+util.WEB_URL_REGEX backtracks, so its run time grows much faster than the
+message; URLFinder should grow linearly. The regex is only run on the
+smaller sizes, as it takes minutes on the bigger ones.
+
+Run from the top-level directory:
+    ``python -m benchmarks.bench_urls [--json FILE]``
+"""
+
+import re
+import time
+
+from benchmarks import report
+from strainer import util
+from strainer.urls import URLFinder
+
+
+INPUTS = {
+    'labels': lambda n: 'a.' * (n // 2),
+    'dots': lambda n: 'a' + '.' * n,
+    'hyphens': lambda n: 'a-' * (n // 2) + '.x',
+    'open_parens': lambda n: 'http://x' + '(' * n,
+    'groups': lambda n: 'http://x/' + '(a' * (n // 2) + ' ',
+    'url_parens': lambda n: 'http://a(' * (n // 9),
+    'path_parens': lambda n: 'x.com/(a' * (n // 8),
+    'chat': lambda n: ('@bob see http://www.example.com/a (yes) and '
+                       'wiki.example.org/page please. ' * n)[:n],
+}
+
+SIZES = [500, 1000, 2000, 10000, 100000]
+
+MAX_REGEX_SIZE = 1000
+
+# (note): The regex takes exponential time on these, so they're kept short
+SHORT_INPUTS = {
+    'punctuation': lambda n: 'http://x/' + '!' * n + '(',
+    'schemes': lambda n: 'http://' + '!' * n,
+}
+
+SHORT_SIZES = [10, 14, 18, 20, 1000]
+
+MAX_SHORT_REGEX_SIZE = 20
+
+
+def timed(func, message):
+    """Returns what func returns for message and the time in milliseconds"""
+
+    start = time.time()
+    result = func(message)
+    return result, (time.time() - start) * 1000
+
+
+def run(inputs, sizes, max_regex_size, results):
+    re_url = re.compile(util.WEB_URL_REGEX)
+    for name in sorted(inputs):
+        for size in sizes:
+            message = inputs[name](size)
+            urls, finder = timed(URLFinder.find_urls, message)
+            regex = None
+            if size <= max_regex_size:
+                expected, regex = timed(re_url.findall, message)
+                assert expected == urls
+            print('%-12s %8d %12s %12.2f' % (
+                name, len(message), '-' if regex is None else '%.2f' % regex,
+                finder))
+            results.append({'input': name,
+                            'length': len(message),
+                            'regex_ms': regex,
+                            'finder_ms': finder})
+
+
+def main(argv=None):
+    args = report.parse_args(__doc__.splitlines()[0], argv)
+    print('%-12s %8s %12s %12s' % ('input', 'length', 'regex (ms)',
+                                   'finder (ms)'))
+    results = []
+    run(INPUTS, SIZES, MAX_REGEX_SIZE, results)
+    run(SHORT_INPUTS, SHORT_SIZES, MAX_SHORT_REGEX_SIZE, results)
+    report.write_json(args.json, 'urls', results)
+
+
+if __name__ == '__main__':
+    main()
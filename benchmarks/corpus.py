@@ -0,0 +1,132 @@
+"""Generates synthetic chat messages for benchmarks.
+
+Messages are a mix of the kinds seen in chat rooms: short replies,
+mentions, emoticons, pasted links, all of those together, and the odd
+long paste of a log. Generation is seeded, so the same arguments always
+give the same corpus.
+
+Links point to well-known looking sites by default. Given a link base,
+e.g. the address of a local stand-in server, they point there instead,
+so fetching their titles doesn't go out to the internet.
+"""
+
+import random
+
+
+WORDS = ('the build is green again can you take a look at this when you '
+         'get a chance I think we should ship it today lunch anyone? '
+         'thanks ok sure done merged deploying now rolling back').split()
+
+NAMES = ['alice', 'bob', 'chris', 'dana', 'erin', 'frank', 'grace', 'here',
+         'all']
+
+EMOTICONS = ['coffee', 'megusta', 'success', 'yey', 'thumbsup', 'facepalm',
+             'shipit', 'allthethings']
+
+LINKS = ['https://ci.example.com/job/strainer/%d/',
+         'http://wiki.example.org/display/OPS/Runbook+%d',
+         'https://jira.example.com/browse/CHAT-%d',
+         'www.example.com/blog/%d',
+         'https://en.wikipedia.org/wiki/Python_(programming_language)?v=%d',
+         'example.io/%d']
+
+LOG_LINE = '2016-08-05 10:41:%02d INFO worker-%d processed job %d in %dms\n'
+
+# (note): Kinds of messages, with how often they occur
+KINDS = [('plain', 35), ('mentions', 20), ('emoticons', 15), ('links', 15),
+         ('mixed', 13), ('paste', 2)]
+
+
+class Corpus(object):
+    """Generates chat messages"""
+
+    def __init__(self, seed=0, link_base=None, distinct_links=100):
+        """
+        :param seed: seed for the random choices
+        :type seed: int
+        :param link_base: url links point under, e.g. 'http://127.0.0.1:80'
+        :type link_base: string
+        :param distinct_links: number of distinct links to use
+        :type distinct_links: int
+        """
+
+        self.random = random.Random(seed)
+        self.link_base = link_base
+        self.distinct_links = distinct_links
+
+    def messages(self, count, kinds=None):
+        """ Returns a list of messages
+
+        :param count: number of messages
+        :type count: int
+        :param kinds: kinds of messages to pick from, all by default
+        :type kinds: list of strings
+
+        :return: chat messages
+        :rtype: list of strings
+        """
+
+        weighted = [(kind, weight) for kind, weight in KINDS
+                    if kinds is None or kind in kinds]
+        total = sum(weight for _, weight in weighted)
+        messages = []
+        for _ in range(count):
+            pick = self.random.uniform(0, total)
+            for kind, weight in weighted:
+                pick -= weight
+                if pick <= 0:
+                    break
+            messages.append(getattr(self, kind)())
+        return messages
+
+    def words(self, low=3, high=15):
+        count = self.random.randint(low, high)
+        return [self.random.choice(WORDS) for _ in range(count)]
+
+    def mention(self):
+        return '@' + self.random.choice(NAMES)
+
+    def emoticon(self):
+        return '(%s)' % self.random.choice(EMOTICONS)
+
+    def link(self):
+        # (note): A few links are pasted much more often than the rest
+        number = int(self.random.paretovariate(0.8)) - 1
+        number %= self.distinct_links
+        if self.link_base:
+            return '%s/page/%d' % (self.link_base, number)
+        return self.random.choice(LINKS) % number
+
+    def plain(self):
+        return ' '.join(self.words())
+
+    def mentions(self):
+        words = self.words()
+        for _ in range(self.random.randint(1, 3)):
+            words.insert(self.random.randint(0, len(words)), self.mention())
+        return ' '.join(words)
+
+    def emoticons(self):
+        words = self.words(0, 8)
+        for _ in range(self.random.randint(1, 3)):
+            words.insert(self.random.randint(0, len(words)), self.emoticon())
+        return ' '.join(words)
+
+    def links(self):
+        words = self.words(0, 8)
+        for _ in range(self.random.randint(1, 2)):
+            words.insert(self.random.randint(0, len(words)), self.link())
+        return ' '.join(words)
+
+    def mixed(self):
+        words = self.words()
+        for token in [self.mention(), self.emoticon(), self.link()]:
+            words.insert(self.random.randint(0, len(words)), token)
+        return ' '.join(words)
+
+    def paste(self):
+        lines = [LOG_LINE % (i % 60, i % 8, i, self.random.randint(1, 999))
+                 for i in range(self.random.randint(50, 2000))]
+        lines.insert(self.random.randint(0, len(lines)),
+                     'see %s %s\n' % (self.link(), self.mention()))
+        return self.mention() + ' ' + ''.join(lines)
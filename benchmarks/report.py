@@ -0,0 +1,71 @@
+"""Writes benchmark results as JSON, so runs can be compared.
+
+Each benchmark takes a ``--json FILE`` option and writes its results
+there, along with where and when it was run:
+
+    {"benchmark": "<name>",
+     "environment": {"python": ..., "platform": ..., "cpus": ...,
+                     "time": ..., "commit": ...},
+     "results": [{<one object per row printed>}, ...]}
+"""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import subprocess
+import time
+
+
+def parser(description):
+    """Returns a parser of the options common to all benchmarks, to add
+    options of a benchmark to"""
+
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--json', metavar='FILE',
+                        help='write the results to FILE as JSON')
+    return parser
+
+
+def parse_args(description, argv=None):
+    """Parses the options common to all benchmarks"""
+
+    return parser(description).parse_args(argv)
+
+
+def environment():
+    """Returns where and when the benchmarks are run"""
+
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            stderr=open('/dev/null', 'w')).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': multiprocessing.cpu_count(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'commit': commit}
+
+
+def write_json(path, benchmark, results):
+    """ Writes results of a benchmark to a file, if one is given
+
+    :param path: file to write to, or None
+    :type path: string
+    :param benchmark: name of the benchmark
+    :type benchmark: string
+    :param results: a dict for each result
+    :type results: list of dicts
+    """
+
+    if not path:
+        return
+    report = {'benchmark': benchmark,
+              'environment': environment(),
+              'results': results}
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True,
+                  separators=(',', ': '))
+        f.write('\n')
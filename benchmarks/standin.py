@@ -0,0 +1,148 @@
+"""A local stand-in for the sites links point to.
+
+The server runs in a process of its own, so it doesn't compete with the
+code being benchmarked for the eventlet hub or the GIL. It serves:
+
+    /page/<n>?delay=<ms>&size=<bytes>&stall=<ms>&stall_ratio=<fraction>
+        a page titled 'Page <n>', after waiting delay ms, padded to size
+        bytes after the title (4KB by default); stall_ratio of the
+        requests, picked at random, wait stall ms more
+    /file/<n>?size=<bytes>&type=<content type>
+        size bytes (1MB by default) of a file of the content type
+        (image/png by default)
+    /hang
+        nothing, holding the connection open for an hour
+    /stats
+        {"connections": <connections made>, "requests": <requests made>}
+        as JSON; these are reset by /stats?reset=1
+
+With --handshake-delay, the server waits before the first request of
+each connection to stand in for the round trips of a TCP (and TLS)
+handshake, which are nearly free on a local server.
+
+Use start() and stop() to run it from a benchmark, or run it directly:
+    ``python -m benchmarks.standin --port 8000``
+"""
+
+import argparse
+import json
+import random
+import subprocess
+import sys
+
+try:
+    from urllib.parse import parse_qs
+except ImportError:
+    from urlparse import parse_qs
+
+import requests
+
+
+class StandIn(object):
+    """The WSGI app of the stand-in server"""
+
+    def __init__(self, handshake_delay=0):
+        self.handshake_delay = handshake_delay
+        self.clients = set()
+        self.requests = 0
+
+    def __call__(self, environ, start_response):
+        # (note): Imported here, so importing this module doesn't import
+        # eventlet into the process running the benchmark
+        import eventlet
+
+        client = (environ.get('REMOTE_ADDR'), environ.get('REMOTE_PORT'))
+        if client not in self.clients:
+            self.clients.add(client)
+            eventlet.sleep(self.handshake_delay)
+        self.requests += 1
+
+        path = environ.get('PATH_INFO', '')
+        query = parse_qs(environ.get('QUERY_STRING', ''))
+        if path.startswith('/page/'):
+            delay = float(query.get('delay', [0])[0])
+            if random.random() < float(query.get('stall_ratio', [0])[0]):
+                delay += float(query.get('stall', [0])[0])
+            eventlet.sleep(delay / 1000)
+            size = int(query.get('size', [4096])[0])
+            title = '<html><head><title>Page %s</title></head><body>' % (
+                path[len('/page/'):])
+            body = (title + 'x' * size + '</body></html>').encode('ascii')
+            start_response('200 OK', [('Content-Type', 'text/html'),
+                                      ('Content-Length', str(len(body)))])
+            return [body]
+        if path.startswith('/file/'):
+            size = int(query.get('size', [10 ** 6])[0])
+            content_type = query.get('type', ['image/png'])[0]
+            start_response('200 OK', [('Content-Type', content_type),
+                                      ('Content-Length', str(size))])
+            return [b'x' * size]
+        if path == '/hang':
+            eventlet.sleep(3600)
+        if path == '/stats':
+            stats = {'connections': len(self.clients),
+                     'requests': self.requests}
+            if 'reset' in query:
+                self.clients.clear()
+                self.requests = 0
+            body = json.dumps(stats).encode('ascii')
+            start_response('200 OK', [('Content-Type', 'application/json'),
+                                      ('Content-Length', str(len(body)))])
+            return [body]
+        start_response('404 Not Found', [('Content-Length', '0')])
+        return [b'']
+
+
+def start(handshake_delay=0):
+    """ Starts the stand-in server in a new process
+
+    :param handshake_delay: seconds to wait before a new connection's
+        first request
+    :type handshake_delay: float
+
+    :return: the server process and its base url
+    :rtype: tuple
+    """
+
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.standin', '--port', '0',
+         '--handshake-delay', str(handshake_delay)],
+        stdout=subprocess.PIPE)
+    port = int(process.stdout.readline())
+    return process, 'http://127.0.0.1:%d' % port
+
+
+def stop(process):
+    """Stops a stand-in server started with start()"""
+
+    process.terminate()
+    process.wait()
+
+
+def stats(base_url, reset=False):
+    """Returns the connection and request counts of a stand-in server"""
+
+    url = base_url + '/stats' + ('?reset=1' if reset else '')
+    return requests.get(url).json()
+
+
+def main():
+    import eventlet
+    from eventlet import wsgi
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--handshake-delay', type=float, default=0)
+    args = parser.parse_args()
+
+    eventlet.monkey_patch()
+    sock = eventlet.listen(('127.0.0.1', args.port), backlog=1024)
+    # (note): Tells start() which port was picked
+    sys.stdout.write('%d\n' % sock.getsockname()[1])
+    sys.stdout.flush()
+    wsgi.server(sock, StandIn(args.handshake_delay), max_size=10000,
+                log_output=False, keepalive=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,229 @@
 import logging
+import time
 
 from flask import abort
 from flask import Flask
+from flask import json
 from flask import jsonify
 from flask import make_response
 from flask import request
+from flask import Response
 from werkzeug import exceptions as f_exceptions
 
 from fetcher import TitleFetcher
+import metrics
 from strainer import MessageStrainer
+import tracing
 
 app = Flask(__name__)
+# (note): Max. seconds a request waits for titles of its links. Links
+# without a title by then are returned with 'timed_out' set.
+app.config.setdefault('FETCH_DEADLINE', 0.8)
+# (note): Batches are for backfills rather than someone waiting on a
+# reply, so they wait longer for titles, but are limited in size.
+app.config.setdefault('BATCH_FETCH_DEADLINE', 5)
+app.config.setdefault('MAX_BATCH_SIZE', 1000)
+# (note): Streamed responses don't hold anything back while titles are
+# fetched, so they can wait longer for them.
+app.config.setdefault('STREAM_FETCH_DEADLINE', 5)
+# (note): Optionally, a ResponseCache to answer repeated messages from.
+# Responses are kept for as long as the titles of their links are
+# cached, but no longer than RESPONSE_CACHE_TTL seconds.
+app.config.setdefault('RESPONSE_CACHE', None)
+app.config.setdefault('RESPONSE_CACHE_TTL', 3600)
+# (note): Max. mentions, emoticons and links returned for a message,
+# each, or None for all of them. Messages are scanned only until they're
+# found.
+app.config.setdefault('MAX_RESULTS', None)
+# (note): Load shedding, all off when None. While more than
+# MAX_IN_FLIGHT requests are in flight, those to strain messages are
+# answered 503 with a Retry-After of RETRY_AFTER seconds. While more
+# than MAX_FETCH_QUEUE title fetches wait for a free slot in the pool of
+# the fetch backend, or they recently waited for longer than
+# MAX_FETCH_WAIT seconds, links get only the titles already cached.
+app.config.setdefault('MAX_IN_FLIGHT', None)
+app.config.setdefault('RETRY_AFTER', 1)
+app.config.setdefault('MAX_FETCH_QUEUE', None)
+app.config.setdefault('MAX_FETCH_WAIT', None)
+# (note): Whether the process is ready for traffic, as GET /ready
+# answers. Cleared while titles are prewarmed on start up, so load
+# balancers hold traffic back until the caches are warm.
+app.config.setdefault('READY', True)
+# (note): Optionally, a Profiler to profile a fraction of requests with,
+# which can be turned on and off at runtime at /admin/profiling
+app.config.setdefault('PROFILER', None)
+
+# (note): Strained once on warming up. It has a mention, an emoticon and
+# links, so each way through straining is taken.
+WARM_UP_MESSAGE = u'@chris (coffee) http://example.com/a?b=1 www.example.org'
+
+# (note): Formats the parts of a streamed response, by mimetype
+STREAM_FORMATS = {
+    'application/x-ndjson': lambda event: json.dumps(event) + '\n',
+    'text/event-stream': lambda event: 'data: %s\n\n' % json.dumps(event),
+}
+
 LOG = logging.getLogger(__name__)
 # (note): This is a hack for allowing logging during testing
 # This won't be needed if the app is configured via config file
 if not LOG.handlers:
     LOG.addHandler(logging.StreamHandler())
 
+PARSE = metrics.stage('parse')
+SERIALIZE = metrics.stage('serialize')
+REQUEST = metrics.REGISTRY.histogram(
+    'strainer_request_seconds',
+    'Seconds from receiving a request to sending the last of the response')
+# (note): Requests in flight, by their response. Adding to and removing
+# from a set is atomic, so counting them takes no lock.
+_IN_FLIGHT = set()
+IN_FLIGHT = metrics.REGISTRY.gauge('strainer_requests_in_flight',
+                                   'Requests being handled',
+                                   func=lambda: len(_IN_FLIGHT))
+SHED = metrics.REGISTRY.counter(
+    'strainer_requests_shed_total',
+    'Requests answered 503 as too many were in flight')
+TITLES_SHED = metrics.REGISTRY.counter(
+    'strainer_titles_shed_total',
+    'Requests given only cached titles as title fetches were backed up')
+
+# (note): Endpoints whose requests are shed while too many are in flight
+SHED_ENDPOINTS = frozenset(['strain', 'strain_batch'])
+
+# (note): Admin endpoints only answer requests from the host itself
+LOCAL_ADDRESSES = frozenset(['127.0.0.1', '::1'])
+
+
+class RequestMiddleware(object):
+    """Gives each request an ID and counts requests in flight
+
+    The ID is taken from the X-Request-ID header, if the client sent a
+    valid one, or generated. It's set for the green thread handling the
+    request, so log lines can carry it, and sent back in the X-Request-ID
+    header. A request is in flight until the last of its response is
+    sent, which for streamed responses is long after the view returns.
+    With a PROFILER, requests it picks are profiled until then too.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        response = _ClosingResponse(time.time())
+        request_id = tracing.start_request(environ.get('HTTP_X_REQUEST_ID'))
+
+        def start_with_id(status, headers, exc_info=None):
+            headers.append(('X-Request-ID', request_id))
+            return start_response(status, headers, exc_info)
+
+        profiler = app.config['PROFILER']
+        if profiler is not None:
+            response.profile = profiler.start(environ, request_id)
+
+        _IN_FLIGHT.add(response)
+        try:
+            response.response = self.wsgi_app(environ, start_with_id)
+        except Exception:
+            response.close()
+            raise
+        return response
+
+
+class _ClosingResponse(object):
+    """Finishes a request once the server closes its response
+
+    (note): Iterating goes straight to the wrapped response, unlike with
+    werkzeug's ClosingIterator, to keep the overhead per request low.
+    """
+
+    __slots__ = ('response', 'start', 'profile')
+
+    def __init__(self, start):
+        self.response = None
+        self.start = start
+        self.profile = None
+
+    def __iter__(self):
+        return iter(self.response)
+
+    def close(self):
+        try:
+            if hasattr(self.response, 'close'):
+                self.response.close()
+        finally:
+            _IN_FLIGHT.discard(self)
+            REQUEST.observe(time.time() - self.start)
+            if self.profile is not None:
+                app.config['PROFILER'].stop(self.profile)
+
+
+app.wsgi_app = RequestMiddleware(app.wsgi_app)
+
+metrics.REGISTRY.counter(
+    'strainer_response_cache_hits_total', 'Responses found in the cache',
+    func=lambda: getattr(app.config['RESPONSE_CACHE'], 'hits', 0))
+metrics.REGISTRY.counter(
+    'strainer_response_cache_misses_total', 'Responses not found in the cache',
+    func=lambda: getattr(app.config['RESPONSE_CACHE'], 'misses', 0))
+metrics.REGISTRY.counter(
+    'strainer_response_cache_evictions_total',
+    'Responses evicted from the cache when it was full',
+    func=lambda: getattr(app.config['RESPONSE_CACHE'], 'evictions', 0))
+metrics.REGISTRY.gauge(
+    'strainer_response_cache_bytes', 'Bytes of responses cached',
+    func=lambda: getattr(app.config['RESPONSE_CACHE'], 'bytes', 0))
+metrics.REGISTRY.gauge(
+    'strainer_ready', 'Whether the process is ready for traffic',
+    func=lambda: int(bool(app.config['READY'])))
+
+
+def warm_up(urls=(), deadline=5, connect=False):
+    """ Pays for what the first requests would otherwise, before the
+    process accepts any: straining a message, handling a request,
+    loading the title parser and looking up the host names of URLs,
+    e.g. those about to be prewarmed, and connecting to the hosts
+
+    (note): The request handled counts in the metrics like any other.
+
+    :param urls: list of urls to look up the host names of
+    :type urls: list of string
+    :param deadline: max. seconds to look up host names for, or None
+    :type deadline: float
+    :param connect: whether to open connections to the hosts too, for a
+        process that doesn't fork afterwards
+    :type connect: bool
+
+    :return: seconds it took
+    :rtype: float
+    """
+
+    start = time.time()
+    MessageStrainer.strain_all(WARM_UP_MESSAGE)
+    # (note): Without links, so nothing is fetched. Buffering closes the
+    # response, so the request isn't left in flight.
+    app.test_client().post('/strainers',
+                           data=json.dumps({'message': u'@chris (coffee)'}),
+                           content_type='application/json', buffered=True)
+    TitleFetcher.warm_up(urls, deadline=deadline, connect=connect)
+    return time.time() - start
+
+
+@app.before_request
+def admit():
+    """Answers requests to strain messages 503 while more than
+    MAX_IN_FLIGHT requests are in flight, so they're retried later rather
+    than wait behind the others"""
+
+    max_in_flight = app.config['MAX_IN_FLIGHT']
+    if (max_in_flight is None or request.endpoint not in SHED_ENDPOINTS or
+            IN_FLIGHT.get() <= max_in_flight):
+        return None
+    SHED.inc()
+    resp = make_response(
+        jsonify({'error': 'Too many requests, please try again later.'}), 503)
+    resp.headers['Retry-After'] = str(app.config['RETRY_AFTER'])
+    return resp
+
 
 @app.route('/strainers', methods=['POST'])
 def strain():
@@ -35,6 +242,11 @@ def strain():
                           'links': [{'url': '<URL string>',
                                      'title': '<title string>'}]}
 
+    Links whose titles couldn't be fetched within the FETCH_DEADLINE have
+    an empty title and 'timed_out' set to true. Under load, links get
+    only titles already cached, and requests may be answered 503 with a
+    Retry-After header (see MAX_FETCH_WAIT and MAX_IN_FLIGHT).
+
     Example:
         Input: {'message': 'Good morning! (megusta) (coffee)'}
         Output: {'emoticons': ['megusta', 'coffee'] }
@@ -47,16 +259,338 @@ def strain():
         Output: { 'links': [ {'url': 'http://www.nbcolympics.com',
                               'title': '2016 Rio Olympic Games | NBC Olympics'
                               } ] }
+
+    Clients may instead have the response streamed, so mentions and
+    emoticons aren't held back by slow links, by accepting
+    'application/x-ndjson' (one JSON object per line) or
+    'text/event-stream' (server-sent events). The mentions and emoticons
+    are sent first, then each unique link as soon as its title is
+    fetched, then a last object marking the end of the response:
+        {'emoticons': [...], 'mentions': [...]}
+        {'link': {'url': '<URL string>', 'title': '<title string>'}}
+        ...
+        {'done': true}
+    Links whose titles couldn't be fetched within the
+    STREAM_FETCH_DEADLINE are sent last, with 'timed_out' set to true.
+
+    With 'spans' set to true in the request body, the response also has
+    the start and end of each mention, emoticon and link in the message,
+    in the same order, e.g. to highlight them. Streamed responses have
+    them in the first object.
+        Input: {'message': '@chris (coffee)?', 'spans': true}
+        Output: {'mentions': ['chris'], 'emoticons': ['coffee'],
+                 'spans': {'mentions': [[0, 6]], 'emoticons': [[7, 15]]}}
+
+    No more than MAX_RESULTS mentions, emoticons and links are returned
+    each, if it's set.
+
+    With a RESPONSE_CACHE, JSON responses without timed out links or
+    spans are cached, and a repeated message is answered from the cache.
     """
 
-    if not request.json or 'message' not in request.json:
+    body = _parse()
+    if not body or 'message' not in body:
         abort(400, 'input JSON must contain "message" element')
 
-    message = request.json.get('message')
+    message = body.get('message')
+    spans = _parse_spans(body)
+
+    mimetype = request.accept_mimetypes.best_match(
+        ['application/json'] + list(STREAM_FORMATS))
+    responses = app.config['RESPONSE_CACHE']
+    if (mimetype in STREAM_FORMATS or spans or
+            not isinstance(message, (str, type(u'')))):
+        responses = None
+    if responses is not None:
+        cached = responses.get(message)
+        if cached is not None:
+            return Response(cached, mimetype='application/json')
+
+    mentions, emoticons, urls, spans = _strain(message, spans)
+
+    if mimetype in STREAM_FORMATS:
+        # (note): eventlet's server holds back small writes to send them
+        # together, which would hold back the parts of the response
+        request.environ['eventlet.minimum_write_chunk_size'] = 0
+        events = _stream(mentions, emoticons, urls, spans,
+                         app.config['STREAM_FETCH_DEADLINE'])
+        return Response(_serialize_stream(STREAM_FORMATS[mimetype], events),
+                        mimetype=mimetype)
+
+    titles = _fetch_titles(urls, app.config['FETCH_DEADLINE'])
+
+    resp = _serialize(_strained(mentions, emoticons, urls, titles, spans))
+    if responses is not None:
+        responses.set(message, resp.get_data(), _response_ttl(titles))
+    return resp
+
+
+@app.route('/strainers/batch', methods=['POST'])
+def strain_batch():
+    """Strains many chat messages at once.
+
+    The API expects a request body in the following JSON format.
+        Input format: {'messages': [<chat message strings>]}
+
+    The API returns a JSON response with the result for each message, in
+    the same order and format as for a single message.
+        Response Format: {'results': [<results of messages>]}
+
+    Each unique URL is fetched once for the whole batch. Links whose
+    titles couldn't be fetched within the BATCH_FETCH_DEADLINE have an
+    empty title and 'timed_out' set to true. With 'spans' set to true,
+    each result has spans, as for a single message.
+
+    Example:
+        Input: {'messages': ['@chris you around?', 'Good morning! (coffee)']}
+        Output: {'results': [{'mentions': ['chris']},
+                             {'emoticons': ['coffee']}]}
+    """
+
+    body = _parse()
+    if not body or 'messages' not in body:
+        abort(400, 'input JSON must contain "messages" element')
+
+    messages = body.get('messages')
+    if (not isinstance(messages, list) or
+            not all(isinstance(m, (str, type(u''))) for m in messages)):
+        abort(400, '"messages" element must be a list of strings')
+
+    if len(messages) > app.config['MAX_BATCH_SIZE']:
+        abort(400, 'batch must not have more than %d messages' %
+              app.config['MAX_BATCH_SIZE'])
+
+    spans = _parse_spans(body)
+    strained = [_strain(message, spans) for message in messages]
+    urls = [url for _, _, message_urls, _ in strained for url in message_urls]
+    titles = _fetch_titles(urls, app.config['BATCH_FETCH_DEADLINE'])
+
+    results = [_strained(mentions, emoticons, message_urls, titles,
+                         message_spans)
+               for mentions, emoticons, message_urls, message_spans
+               in strained]
+    return _serialize({'results': results})
+
 
-    mentions = MessageStrainer.strain_mentions(message)
-    emoticons = MessageStrainer.strain_emoticons(message)
-    urls = MessageStrainer.strain_urls(message)
+@app.route('/ready', methods=['GET'])
+def get_ready():
+    """Returns whether the process is ready for traffic, e.g. for load
+    balancers' health checks: 200 if it is, 503 while titles are being
+    prewarmed.
+
+        Response Format: {'ready': <true or false>}
+    """
+
+    if not app.config['READY']:
+        return make_response(jsonify({'ready': False}), 503)
+    return jsonify({'ready': True})
+
+
+@app.route('/admin/profiling', methods=['GET', 'POST'])
+def profiling():
+    """Shows, or with POST changes, whether requests are profiled, for
+    requests from the host itself only.
+
+    The API expects a request body in the following JSON format, with
+    either element or both, to enable profiling at the given rate or
+    disable it.
+        Input format: {'enabled': <true or false>,
+                       'rate': <fraction of requests to profile>}
+
+    The API returns the settings, the directory profiles are written to
+    and the number of profiles written so far.
+        Response Format: {'enabled': <true or false>, 'rate': <rate>,
+                          'directory': '<path>', 'profiled': <count>}
+
+    Requests sent with the X-Profile header are profiled whatever the
+    rate, while profiling is enabled. Each worker process has its own
+    settings.
+    """
+
+    profiler = app.config['PROFILER']
+    if profiler is None:
+        abort(404, 'profiling is not set up, see --profile-dir')
+    if request.remote_addr not in LOCAL_ADDRESSES:
+        abort(403, 'profiling can only be changed from the host itself')
+
+    if request.method == 'POST':
+        body = _parse()
+        if not isinstance(body, dict):
+            abort(400, 'input JSON must be an object')
+        enabled = body.get('enabled', profiler.enabled)
+        rate = body.get('rate', profiler.rate)
+        if not isinstance(enabled, bool):
+            abort(400, '"enabled" element must be true or false')
+        if (isinstance(rate, bool) or
+                not isinstance(rate, (int, float)) or not 0 <= rate <= 1):
+            abort(400, '"rate" element must be a number from 0 to 1')
+        profiler.enabled = enabled
+        profiler.rate = rate
+
+    return jsonify({'enabled': profiler.enabled, 'rate': profiler.rate,
+                    'directory': profiler.directory,
+                    'profiled': profiler.profiled})
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Returns metrics of the API in Prometheus text format.
+
+    Metrics include a histogram of seconds spent in each stage of
+    handling requests ('strainer_stage_seconds', by stage: parse,
+    strain_all, strain_mentions, strain_emoticons, strain_urls,
+    fetch_title, fetch_connect, fetch_download, fetch_parse and
+    serialize), requests in flight, title fetches running and title
+    and response cache statistics.
+    """
+
+    return Response(metrics.REGISTRY.render(),
+                    mimetype='text/plain; version=0.0.4')
+
+
+def _parse():
+    """Returns the JSON body of the request, or None if it isn't JSON"""
+
+    start = time.time()
+    try:
+        return request.get_json()
+    finally:
+        PARSE.observe(time.time() - start)
+
+
+def _parse_spans(body):
+    """Returns whether the request asks for spans"""
+
+    spans = body.get('spans', False)
+    if not isinstance(spans, bool):
+        abort(400, '"spans" element must be true or false')
+    return spans
+
+
+def _strain(message, spans=False):
+    """Strains a message, up to MAX_RESULTS results of each kind
+
+    :return: mentions, emoticons and urls, and the spans of those found
+        by response key if spans are asked for, or None
+    :rtype: tuple
+    """
+
+    found = MessageStrainer.strain_all(
+        message, limit=app.config['MAX_RESULTS'], spans=spans)
+    if not spans:
+        return found + (None,)
+
+    strained = []
+    found_spans = {}
+    for key, results in zip(('mentions', 'emoticons', 'links'), found):
+        strained.append([text for text, _, _ in results])
+        if results:
+            found_spans[key] = [[start, end] for _, start, end in results]
+    return tuple(strained) + (found_spans,)
+
+
+def _serialize(resp):
+    """Returns a JSON response"""
+
+    start = time.time()
+    try:
+        return jsonify(resp)
+    finally:
+        SERIALIZE.observe(time.time() - start)
+
+
+def _serialize_stream(format_event, events):
+    """Yields each part of a streamed response as it's formatted"""
+
+    for event in events:
+        start = time.time()
+        part = format_event(event)
+        SERIALIZE.observe(time.time() - start)
+        yield part
+
+
+def _unique(urls):
+    """Returns URLs without duplicates, in the order they were first seen"""
+
+    unique_urls = []
+    seen = set()
+    for url in urls:
+        if url not in seen:
+            seen.add(url)
+            unique_urls.append(url)
+    return unique_urls
+
+
+def _fetch_titles(urls, deadline):
+    """Fetches titles of URLs, fetching each unique URL once
+
+    :return: titles by url, None for those not fetched by the deadline
+    :rtype: dict
+    """
+
+    unique_urls = _unique(urls)
+    if _fetches_backed_up():
+        return dict((url, TitleFetcher.cache.get(url)) for url in unique_urls)
+    titles = TitleFetcher.fetch_titles(unique_urls, deadline=deadline)
+    return dict(zip(unique_urls, titles))
+
+
+def _fetches_backed_up():
+    """Returns whether title fetches are backed up past MAX_FETCH_QUEUE
+    or MAX_FETCH_WAIT, in which case only cached titles are returned"""
+
+    backend = TitleFetcher.backend
+    max_queue = app.config['MAX_FETCH_QUEUE']
+    max_wait = app.config['MAX_FETCH_WAIT']
+    if ((max_queue is not None and backend.waiting() > max_queue) or
+            (max_wait is not None and backend.queue_wait.get() > max_wait)):
+        TITLES_SHED.inc()
+        return True
+    return False
+
+
+def _response_ttl(titles):
+    """Returns the seconds a response may be cached for, as long as the
+    titles of all its links are, and 0 if any of them timed out"""
+
+    ttl = app.config['RESPONSE_CACHE_TTL']
+    for url, title in titles.items():
+        if title is None:
+            return 0
+        ttl = min(ttl, TitleFetcher.cache.remaining(url))
+    return ttl
+
+
+def _stream(mentions, emoticons, urls, spans, deadline):
+    """Yields the parts of a streamed response for a strained message"""
+
+    yield _strained(mentions, emoticons, [], {}, spans)
+
+    unique_urls = _unique(urls)
+    if _fetches_backed_up():
+        titles = [TitleFetcher.cache.get(url) for url in unique_urls]
+        # (note): As when fetched, links without a title are sent last
+        for i in sorted(range(len(unique_urls)),
+                        key=lambda i: titles[i] is None):
+            yield {'link': _link(unique_urls[i], titles[i])}
+    else:
+        for i, title in TitleFetcher.iter_titles(unique_urls,
+                                                 deadline=deadline):
+            yield {'link': _link(unique_urls[i], title)}
+
+    yield {'done': True}
+
+
+def _link(url, title):
+    """Builds the response for a link, given its title or None"""
+
+    if title is None:
+        return {'url': url, 'title': u'', 'timed_out': True}
+    return {'url': url, 'title': title}
+
+
+def _strained(mentions, emoticons, urls, titles, spans=None):
+    """Builds the response for a strained message"""
 
     resp = {}
 
@@ -67,14 +601,12 @@ def strain():
         resp['emoticons'] = emoticons
 
     if urls:
-        titles = TitleFetcher.fetch_titles(urls)
-        links = []
-        for url, title in zip(urls, titles):
-            url_dict = {'url': url, 'title': title}
-            links.append(url_dict)
-        resp['links'] = links
-
-    return jsonify(resp)
+        resp['links'] = [_link(url, titles[url]) for url in urls]
+
+    if spans:
+        resp['spans'] = spans
+
+    return resp
 
 
 @app.errorhandler(Exception)
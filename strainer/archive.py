@@ -0,0 +1,261 @@
+import io
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+
+import eventlet
+import requests
+from requests import adapters
+from requests import exceptions as re_exceptions
+from requests.structures import CaseInsensitiveDict
+
+from database import ProcessConnection
+
+
+LOG = logging.getLogger(__name__)
+
+# (note): Headers not recorded, as bodies are recorded decoded and whole
+DROPPED_HEADERS = frozenset(['content-encoding', 'transfer-encoding'])
+
+
+class FetchArchive(object):
+    """Responses to title fetches, recorded to replay them offline
+
+    The latest response for each URL is kept in an SQLite database: its
+    status, headers and body, up to max_body_bytes, compressed, along with
+    the seconds it took to get the headers and to download the body.
+    Titles are near the top of pages (see TitleFetcher.max_title_bytes),
+    so the rest isn't kept.
+
+    Fetches are recorded and replayed by the adapter requests sends them
+    with, so everything else about them, e.g. limits on hosts, skipping
+    responses by their headers or parsing titles, is as with the network:
+
+        connections.use_transport(archive.recorder)
+        connections.use_transport(archive.replayer)
+
+    URLs are kept as requests sends them, e.g. with an empty path as '/'.
+    """
+
+    def __init__(self, path, max_body_bytes=256 * 1024):
+        """
+        :param path: path of the database file, created if missing
+        :type path: string
+        :param max_body_bytes: max. bytes of each body kept
+        :type max_body_bytes: int
+        """
+
+        self.path = path
+        self.max_body_bytes = max_body_bytes
+        self._db = ProcessConnection(path, setup=self._setup)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _setup(db):
+        db.execute('CREATE TABLE IF NOT EXISTS responses ('
+                   'url TEXT PRIMARY KEY, '
+                   'status INTEGER NOT NULL, '
+                   'headers TEXT NOT NULL, '
+                   'body BLOB NOT NULL, '
+                   'latency REAL NOT NULL, '
+                   'download REAL NOT NULL)')
+
+    def record(self, url, status, headers, body, latency, download=0.0):
+        """ Records the response to a fetch, replacing any for the URL
+
+        :param url: url fetched
+        :type url: string
+        :param status: status code of the response
+        :type status: int
+        :param headers: headers of the response
+        :type headers: dict
+        :param body: body of the response, decoded, cut to max_body_bytes
+        :type body: bytes
+        :param latency: seconds until the headers were received
+        :type latency: float
+        :param download: seconds it took to download the body
+        :type download: float
+        """
+
+        headers = dict((name, value) for name, value in headers.items()
+                       if name.lower() not in DROPPED_HEADERS)
+        row = (url, status, json.dumps(headers),
+               sqlite3.Binary(zlib.compress(body[:self.max_body_bytes])),
+               latency, download)
+        with self._lock:
+            self._db.get().execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                row)
+
+    def get(self, url):
+        """ Returns the response recorded for a URL
+
+        :param url: url to look up
+        :type url: string
+
+        :return: status, headers, body, latency and download seconds, or
+            None if the url isn't recorded
+        :rtype: tuple
+        """
+
+        with self._lock:
+            row = self._db.get().execute(
+                'SELECT status, headers, body, latency, download '
+                'FROM responses WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return None
+        status, headers, body, latency, download = row
+        return (status, json.loads(headers), zlib.decompress(body), latency,
+                download)
+
+    def urls(self):
+        """Returns the URLs recorded"""
+
+        with self._lock:
+            rows = self._db.get().execute(
+                'SELECT url FROM responses ORDER BY url').fetchall()
+        return [url for url, in rows]
+
+    def __len__(self):
+        with self._lock:
+            return self._db.get().execute(
+                'SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def recorder(self, adapter):
+        """Returns an adapter recording what adapter fetches into the
+        archive, as a transport for ConnectionPool.use_transport"""
+
+        return RecordingAdapter(adapter, self)
+
+    def replayer(self, adapter):
+        """Returns an adapter replaying fetches from the archive instead of
+        sending them with adapter, as a transport for
+        ConnectionPool.use_transport"""
+
+        return ReplayAdapter(self)
+
+    def close(self):
+        self._db.close()
+
+
+class RecordingAdapter(adapters.BaseAdapter):
+    """Sends requests with another adapter and records the responses
+
+    Each body is read up to the archive's max_body_bytes before the
+    response is returned, even if the title is seen sooner, so it's
+    replayed whole. A connection with more left to read is closed rather
+    than reused.
+    """
+
+    def __init__(self, adapter, archive):
+        """
+        :param adapter: adapter to send requests with
+        :type adapter: requests.adapters.BaseAdapter
+        :param archive: archive to record responses into
+        :type archive: FetchArchive
+        """
+
+        super(RecordingAdapter, self).__init__()
+        self.adapter = adapter
+        self.archive = archive
+
+    def send(self, request, **kwargs):
+        start = time.time()
+        resp = self.adapter.send(request, **kwargs)
+        latency = time.time() - start
+
+        start = time.time()
+        raw = resp.raw
+        body = raw.read(self.archive.max_body_bytes, decode_content=True)
+        download = time.time() - start
+        if len(body) < self.archive.max_body_bytes:
+            raw.release_conn()
+        else:
+            raw.close()
+
+        try:
+            self.archive.record(request.url, resp.status_code, resp.headers,
+                                body, latency, download)
+        except (sqlite3.Error, ValueError) as e:
+            # (note): ValueError for headers that aren't UTF-8
+            LOG.warning("Failed to record response of url: %s\n Error: %s" %
+                        (request.url, e))
+        resp.raw = io.BytesIO(body)
+        return resp
+
+    def close(self):
+        self.adapter.close()
+
+
+class ReplayAdapter(adapters.BaseAdapter):
+    """Answers requests with the responses recorded in an archive
+
+    Responses take as long as they did when recorded, times
+    latency_scale: 0 replays them at once, e.g. to benchmark parsing
+    alone. A response that took longer than the timeout of the request
+    raises a timeout once it's up, as it would have. URLs not in the
+    archive fail to connect.
+    """
+
+    def __init__(self, archive, latency_scale=1.0, sleep=eventlet.sleep):
+        """
+        :param archive: archive to replay responses from
+        :type archive: FetchArchive
+        :param latency_scale: factor of the recorded seconds to wait
+        :type latency_scale: float
+        :param sleep: waits for the given seconds; eventlet.sleep also
+            works in OS threads, each with a hub of its own
+        :type sleep: callable
+        """
+
+        super(ReplayAdapter, self).__init__()
+        self.archive = archive
+        self.latency_scale = latency_scale
+        self.sleep = sleep
+
+    def send(self, request, stream=False, timeout=None, **kwargs):
+        recorded = self.archive.get(request.url)
+        if recorded is None:
+            raise re_exceptions.ConnectionError(
+                "%s isn't in the archive" % request.url, request=request)
+        status, headers, body, latency, download = recorded
+
+        latency *= self.latency_scale
+        if isinstance(timeout, (int, float)) and latency > timeout:
+            self.sleep(timeout)
+            raise re_exceptions.ReadTimeout(
+                "Replayed response took longer than %ss" % timeout,
+                request=request)
+        if latency:
+            self.sleep(latency)
+
+        resp = requests.Response()
+        resp.status_code = status
+        resp.headers = CaseInsensitiveDict(headers)
+        resp.raw = ReplayedBody(body, download * self.latency_scale,
+                                self.sleep)
+        resp.url = request.url
+        resp.request = request
+        resp.connection = self
+        return resp
+
+    def close(self):
+        pass
+
+
+class ReplayedBody(io.BytesIO):
+    """A recorded body, read as slowly as it was downloaded"""
+
+    def __init__(self, body, seconds, sleep):
+        io.BytesIO.__init__(self, body)
+        self.per_byte = seconds / len(body) if body else 0
+        self.sleep = sleep
+
+    def read(self, size=-1):
+        chunk = io.BytesIO.read(self, size)
+        if chunk and self.per_byte:
+            self.sleep(len(chunk) * self.per_byte)
+        return chunk
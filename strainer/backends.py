@@ -0,0 +1,359 @@
+import logging
+import Queue
+import threading
+import time
+
+import eventlet
+from eventlet import event
+from eventlet import greenpool
+from eventlet import queue
+from eventlet import semaphore
+
+
+LOG = logging.getLogger(__name__)
+
+
+class RecentWait(object):
+    """The time fetches recently waited for a free slot in a pool
+
+    An exponentially weighted average of the waits, which also halves
+    every half_life seconds, so it falls back while nothing is spawned,
+    e.g. as titles aren't fetched while the pool is found to be busy.
+    """
+
+    def __init__(self, weight=0.2, half_life=1.0, clock=time.time):
+        """
+        :param weight: weight of each wait in the average
+        :type weight: float
+        :param half_life: seconds the average halves in
+        :type half_life: float
+        :param clock: returns the current time in seconds
+        :type clock: callable
+        """
+
+        self.weight = weight
+        self.half_life = half_life
+        self.clock = clock
+        self._value = 0.0
+        self._at = clock()
+
+    def observe(self, seconds):
+        """Records the time a fetch waited"""
+
+        now = self.clock()
+        self._value = (self._decayed(now) * (1 - self.weight) +
+                       seconds * self.weight)
+        self._at = now
+
+    def get(self):
+        """Returns the recent wait in seconds"""
+
+        return self._decayed(self.clock())
+
+    def _decayed(self, now):
+        return self._value * 0.5 ** (max(now - self._at, 0) /
+                                     self.half_life)
+
+    def clear(self):
+        """Forgets the waits"""
+
+        self._value = 0.0
+        self._at = self.clock()
+
+
+class GreenBackend(object):
+    """Runs title fetches in green threads
+
+    For processes whose sockets are monkey-patched by eventlet, as in
+    strainer/server.py. Fetches run in a GreenPool, and spawning one
+    waits while the pool is full. A timeout raises eventlet.Timeout in the
+    fetch and killing it raises GreenletExit, wherever the fetch is
+    waiting, so it stops at once either way.
+    """
+
+    name = 'eventlet'
+
+    Empty = queue.Empty
+
+    def __init__(self, size=1000):
+        """
+        :param size: max. number of fetches running at once
+        :type size: int
+        """
+
+        self.pool = greenpool.GreenPool(size=size)
+        self.queue_wait = RecentWait()
+
+    @property
+    def size(self):
+        return self.pool.size
+
+    def running(self):
+        """Returns the number of fetches running in the pool"""
+
+        return self.pool.running()
+
+    def waiting(self):
+        """Returns the number of fetches waiting to be spawned"""
+
+        return self.pool.waiting()
+
+    def spawn(self, func, *args):
+        """ Runs a fetch in the pool, waiting while the pool is full
+
+        :return: the fetch, to kill
+        :rtype: eventlet.greenthread.GreenThread
+        """
+
+        return self.pool.spawn(self._run, time.time(), func, *args)
+
+    def _run(self, spawned, func, *args):
+        self.queue_wait.observe(time.time() - spawned)
+        return func(*args)
+
+    def start(self, func, *args):
+        """ Runs a fetch outside the pool, e.g. one a fetch running in the
+        pool waits for
+
+        :return: the fetch, to kill
+        :rtype: eventlet.greenthread.GreenThread
+        """
+
+        return eventlet.spawn(func, *args)
+
+    def timeout(self, seconds, exception=None):
+        """ Returns a timeout for the running fetch, which goes off after
+        seconds unless it's cancelled
+
+        :param exception: raised when it goes off, the timeout itself if
+            None, or nothing if False, as with eventlet.Timeout
+        :rtype: eventlet.Timeout
+        """
+
+        return eventlet.Timeout(seconds, exception)
+
+    def queue(self):
+        """Returns a queue for fetches to put results in"""
+
+        return queue.Queue()
+
+    def semaphore(self, value):
+        """Returns a semaphore for fetches to wait on"""
+
+        return semaphore.Semaphore(value)
+
+    def event(self):
+        """Returns an event for fetches to wait on, with send and wait"""
+
+        return event.Event()
+
+
+class ThreadBackend(object):
+    """Runs title fetches in OS threads
+
+    For processes whose sockets aren't monkey-patched, e.g. scripts or
+    threaded servers embedding TitleFetcher. Fetches are queued for up to
+    `size` worker threads, started as needed, so spawning never waits.
+
+    Threads can't be interrupted: timeouts never go off, so fetches are
+    bound by socket timeouts instead (see TitleFetcher.timeout), and
+    killing a fetch only cancels it if it hasn't started yet. A fetch
+    already running is left to finish, and its title is still cached.
+
+    State shared by fetches and requests, e.g. that of TitleCache, Hosts
+    or metrics, is therefore changed under a threading.Lock. No lock is
+    held across anything that yields to another green thread, so with
+    GreenBackend they're never waited on, and cost little.
+    """
+
+    name = 'threads'
+
+    Empty = Queue.Empty
+
+    def __init__(self, size=100):
+        """
+        :param size: max. number of fetches running at once
+        :type size: int
+        """
+
+        self.size = size
+        self._tasks = Queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = 0
+        self._idle = 0
+        self._pending = 0
+        self._running = 0
+        self.queue_wait = RecentWait()
+
+    def running(self):
+        """Returns the number of fetches running in worker threads"""
+
+        return self._running
+
+    def waiting(self):
+        """Returns the number of fetches queued for a worker thread"""
+
+        return self._tasks.qsize()
+
+    def spawn(self, func, *args):
+        """ Queues a fetch for a worker thread, starting one if all of
+        them are busy and there are fewer than size
+
+        :return: the fetch, to kill
+        :rtype: Task
+        """
+
+        task = Task(func, args)
+        with self._lock:
+            self._pending += 1
+            start = (self._pending > self._idle and
+                     self._workers < self.size)
+            if start:
+                self._workers += 1
+        if start:
+            self._thread(self._work)
+        self._tasks.put(task)
+        return task
+
+    def start(self, func, *args):
+        """ Runs a fetch in a thread of its own, e.g. one a fetch running
+        in a worker thread waits for
+
+        :return: the fetch, to kill
+        :rtype: Task
+        """
+
+        task = Task(func, args)
+        self._thread(task.run)
+        return task
+
+    def _thread(self, target):
+        thread = threading.Thread(target=target)
+        # (note): Threads left running don't hold up the process exiting
+        thread.daemon = True
+        thread.start()
+
+    def _work(self):
+        while True:
+            with self._lock:
+                self._idle += 1
+            task = self._tasks.get()
+            with self._lock:
+                self._idle -= 1
+                self._pending -= 1
+                self._running += 1
+            self.queue_wait.observe(time.time() - task.spawned)
+            try:
+                task.run()
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+    def timeout(self, seconds, exception=None):
+        """ Returns a timeout for the running fetch, which never goes off
+
+        :rtype: NoTimeout
+        """
+
+        return NoTimeout()
+
+    def queue(self):
+        """Returns a queue for fetches to put results in"""
+
+        return Queue.Queue()
+
+    def semaphore(self, value):
+        """Returns a semaphore for fetches to wait on"""
+
+        return Semaphore(value)
+
+    def event(self):
+        """Returns an event for fetches to wait on, with send and wait"""
+
+        return Event()
+
+
+class Task(object):
+    """A fetch queued for or running in an OS thread"""
+
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+        self.killed = False
+        self.spawned = time.time()
+
+    def run(self):
+        if self.killed:
+            return
+        try:
+            self.func(*self.args)
+        except Exception as e:
+            # (note): Unlike green threads, nothing would report it
+            LOG.error("Fetch failed in thread: %s" % e)
+
+    def kill(self):
+        """Cancels the fetch, unless it's running already"""
+
+        self.killed = True
+
+
+class NoTimeout(object):
+    """A timeout that never goes off, for fetches that can't be
+    interrupted"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def cancel(self):
+        pass
+
+
+class Semaphore(object):
+    """A semaphore for OS threads, with a balance, as eventlet's has"""
+
+    def __init__(self, value):
+        self.balance = value
+        self._condition = threading.Condition(threading.Lock())
+
+    def acquire(self):
+        with self._condition:
+            while self.balance <= 0:
+                self._condition.wait()
+            self.balance -= 1
+
+    def release(self):
+        with self._condition:
+            self.balance += 1
+            self._condition.notify()
+
+    def __enter__(self):
+        self.acquire()
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class Event(object):
+    """An event for OS threads, sending a value, as eventlet's does"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._value = None
+
+    def send(self, value=None):
+        self._value = value
+        self._event.set()
+
+    def wait(self):
+        self._event.wait()
+        return self._value
+
+
+# (note): By name, as given to strainer/server.py
+BACKENDS = {
+    GreenBackend.name: GreenBackend,
+    ThreadBackend.name: ThreadBackend,
+}
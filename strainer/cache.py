@@ -0,0 +1,43 @@
+import time
+
+from lru import LRUCache
+
+
+class TitleCache(LRUCache):
+    """A bounded cache of URL titles
+
+    Entries expire after a TTL and the least recently used entry is evicted
+    when the cache is full. Empty titles, which are also what a failed fetch
+    gives, expire after a shorter negative TTL, so a dead link isn't fetched
+    again on every mention but is retried before long.
+
+    Hits, misses and evictions are counted to help with sizing the cache.
+    """
+
+    def __init__(self, max_size=1024, ttl=3600, negative_ttl=60,
+                 clock=time.time):
+        """
+        :param max_size: max. number of titles kept
+        :type max_size: int
+        :param ttl: seconds a title is kept for
+        :type ttl: int
+        :param negative_ttl: seconds an empty title is kept for
+        :type negative_ttl: int
+        :param clock: returns the current time in seconds
+        :type clock: callable
+        """
+
+        super(TitleCache, self).__init__(max_size, clock=clock)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+    def set(self, url, title):
+        """ Caches the title of a URL
+
+        :param url: url the title is for
+        :type url: string
+        :param title: title of the url, empty if there's none
+        :type title: string
+        """
+
+        self.put(url, title, self.ttl if title else self.negative_ttl)
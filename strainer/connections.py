@@ -0,0 +1,263 @@
+import socket
+import time
+
+from eventlet import semaphore
+import requests
+from requests import adapters
+from requests.compat import cookielib
+from requests.packages.urllib3 import connection
+from requests.packages.urllib3 import connectionpool
+from requests.packages.urllib3 import exceptions
+from requests.packages.urllib3 import poolmanager
+
+
+class ResolvingMixin(object):
+    """Connects to the addresses a Resolver gives for the host
+
+    Addresses are tried in order until one accepts the connection. The
+    host name is still used for the Host header and TLS.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.resolver = kwargs.pop('resolver', None)
+        super(ResolvingMixin, self).__init__(*args, **kwargs)
+
+    def _new_conn(self):
+        if self.resolver is None:
+            return super(ResolvingMixin, self)._new_conn()
+
+        name = self._dns_host
+        try:
+            addresses = self.resolver.resolve(name)
+        except socket.gaierror as e:
+            raise exceptions.NewConnectionError(
+                self, "Failed to establish a new connection: %s" % e)
+
+        error = None
+        try:
+            for address in addresses:
+                # (note): urllib3 connects to _dns_host
+                self._dns_host = address
+                try:
+                    return super(ResolvingMixin, self)._new_conn()
+                except (exceptions.ConnectTimeoutError,
+                        exceptions.NewConnectionError) as e:
+                    error = e
+        finally:
+            self._dns_host = name
+        raise error
+
+
+class ResolvingHTTPConnection(ResolvingMixin, connection.HTTPConnection):
+    pass
+
+
+class ResolvingHTTPSConnection(ResolvingMixin, connection.HTTPSConnection):
+    pass
+
+
+class IdleTimeoutMixin(object):
+    """Closes pooled connections that have been idle for too long
+
+    Servers drop idle keep-alive connections after a while, and a dropped
+    connection is only noticed when it's reused. Closing connections idle
+    for longer than idle_timeout also bounds how long sockets are held
+    for hosts that aren't linked to anymore.
+    """
+
+    idle_timeout = None
+
+    def _get_conn(self, timeout=None):
+        conn = super(IdleTimeoutMixin, self)._get_conn(timeout=timeout)
+        idle_since = getattr(conn, 'idle_since', None)
+        if (self.idle_timeout is not None and idle_since is not None and
+                time.time() - idle_since > self.idle_timeout):
+            # (note): A closed connection reconnects when it's next used
+            conn.close()
+        return conn
+
+    def _put_conn(self, conn):
+        if conn is not None:
+            conn.idle_since = time.time()
+        super(IdleTimeoutMixin, self)._put_conn(conn)
+
+
+class IdleTimeoutHTTPConnectionPool(IdleTimeoutMixin,
+                                    connectionpool.HTTPConnectionPool):
+
+    ConnectionCls = ResolvingHTTPConnection
+
+
+class IdleTimeoutHTTPSConnectionPool(IdleTimeoutMixin,
+                                     connectionpool.HTTPSConnectionPool):
+
+    ConnectionCls = ResolvingHTTPSConnection
+
+
+class IdleTimeoutPoolManager(poolmanager.PoolManager):
+    """A pool manager whose pools close idle connections, and resolve
+    host names with a Resolver if one is given"""
+
+    def __init__(self, idle_timeout=None, resolver=None, *args, **kwargs):
+        super(IdleTimeoutPoolManager, self).__init__(*args, **kwargs)
+        self.idle_timeout = idle_timeout
+        self.resolver = resolver
+        self.pool_classes_by_scheme = {
+            'http': IdleTimeoutHTTPConnectionPool,
+            'https': IdleTimeoutHTTPSConnectionPool,
+        }
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = super(IdleTimeoutPoolManager, self)._new_pool(
+            scheme, host, port, request_context=request_context)
+        pool.idle_timeout = self.idle_timeout
+        pool.conn_kw['resolver'] = self.resolver
+        return pool
+
+
+class PooledAdapter(adapters.HTTPAdapter):
+    """An HTTP adapter keeping idle connections open for a while"""
+
+    def __init__(self, idle_timeout=None, resolver=None, **kwargs):
+        # (note): HTTPAdapter sets up its pool manager in __init__, which
+        # needs the idle timeout and resolver
+        self.idle_timeout = idle_timeout
+        self.resolver = resolver
+        super(PooledAdapter, self).__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False,
+                         **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        self.poolmanager = IdleTimeoutPoolManager(
+            idle_timeout=self.idle_timeout, resolver=self.resolver,
+            num_pools=connections,
+            maxsize=maxsize, block=block, strict=True, **pool_kwargs)
+
+
+class ConnectionPool(object):
+    """A keep-alive connection pool shared by all fetches
+
+    Fetches go through a single requests session, so connections to the
+    same host are reused instead of paying for a TCP (and TLS) handshake
+    each time.
+
+    Connection pools in urllib3 use locks and queues from the threading
+    module, which eventlet doesn't patch here, so they must never block a
+    green thread. The pools are therefore non-blocking: a host with all
+    its connections in use gets a new one, which is closed after use
+    rather than kept. The total number of open connections is capped
+    with a green semaphore instead, which is to be held while a response
+    is being read:
+
+        with pool.semaphore:
+            resp = pool.session.get(url, stream=True)
+            ...
+            resp.close()
+
+    Host names are resolved with the given Resolver, if any, instead of
+    on every new connection. Requests can be sent through another
+    adapter than the pooled one, e.g. to record or replay them (see
+    FetchArchive), by giving a transport.
+    """
+
+    def __init__(self, max_connections=100, max_hosts=100,
+                 max_per_host=10, idle_timeout=30, resolver=None,
+                 semaphore=semaphore.Semaphore, transport=None):
+        """
+        :param max_connections: max. number of connections open at once
+        :type max_connections: int
+        :param max_hosts: max. number of hosts connections are kept for
+        :type max_hosts: int
+        :param max_per_host: max. number of connections kept per host
+        :type max_per_host: int
+        :param idle_timeout: seconds an unused connection is kept for
+        :type idle_timeout: int
+        :param resolver: resolves host names of new connections
+        :type resolver: Resolver
+        :param semaphore: returns the semaphore capping open connections,
+            given the cap, e.g. that of a fetch backend
+        :type semaphore: callable
+        :param transport: returns the adapter to send requests with,
+            given the pooled one, or None to send them with that
+        :type transport: callable
+        """
+
+        self.max_connections = max_connections
+        self.max_hosts = max_hosts
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.resolver = resolver
+        self.semaphore = semaphore(max_connections)
+        self.transport = transport
+        self.session = self._new_session()
+
+    def _new_session(self):
+        session = requests.Session()
+        # (note): Titles are fetched on behalf of many users, so cookies
+        # set by one page must not be sent along with other fetches.
+        session.cookies.set_policy(
+            cookielib.DefaultCookiePolicy(allowed_domains=[]))
+        adapter = PooledAdapter(idle_timeout=self.idle_timeout,
+                                resolver=self.resolver,
+                                pool_connections=self.max_hosts,
+                                pool_maxsize=self.max_per_host)
+        if self.transport is not None:
+            adapter = self.transport(adapter)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def connect(self, url, timeout=None):
+        """ Opens a connection to the host of a URL and pools it, so the
+        first fetch from the host doesn't wait for the handshake
+
+        :param url: url whose host to connect to
+        :type url: string
+        :param timeout: max. seconds to connect for, or None
+        :type timeout: float
+
+        :return: whether a connection was opened, i.e. none was pooled and
+            requests aren't sent through a transport
+        :rtype: bool
+        :raises urllib3.exceptions.HTTPError: if the host can't be
+            connected to
+        """
+
+        adapter = self.session.get_adapter(url)
+        if not isinstance(adapter, PooledAdapter):
+            return False
+        pool = adapter.poolmanager.connection_from_url(url)
+        conn = pool._get_conn()
+        try:
+            if conn.sock is not None:
+                return False
+            if timeout is not None:
+                conn.timeout = timeout
+            conn.connect()
+            return True
+        except BaseException:
+            conn.close()
+            raise
+        finally:
+            pool._put_conn(conn)
+
+    def close(self):
+        """Closes all pooled connections"""
+
+        self.session.close()
+        self.session = self._new_session()
+
+    def use_transport(self, transport):
+        """ Sends requests with the adapter transport returns from now on,
+        closing all pooled connections
+
+        :param transport: returns the adapter to send requests with,
+            given the pooled one, or None to send them with that
+        :type transport: callable
+        """
+
+        self.transport = transport
+        self.close()
+
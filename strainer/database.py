@@ -0,0 +1,49 @@
+import os
+import sqlite3
+
+
+class ProcessConnection(object):
+    """A connection to an SQLite database, opened by each process using it
+
+    A connection can't be used across a fork, so one opened before the
+    server forks its workers isn't used by them: each process opens its
+    own the first time it needs it.
+    """
+
+    def __init__(self, path, setup=None, **kwargs):
+        """
+        :param path: path of the database file, created if missing
+        :type path: string
+        :param setup: called with each new connection, e.g. to create
+            tables
+        :type setup: callable
+        :param kwargs: passed to sqlite3.connect
+        """
+
+        self.path = path
+        self.setup = setup
+        self.kwargs = dict(isolation_level=None, check_same_thread=False)
+        self.kwargs.update(kwargs)
+        self._db = None
+        self._pid = None
+
+    def get(self):
+        """ Returns the connection of this process, opening it if needed
+
+        :rtype: sqlite3.Connection
+        """
+
+        if self._db is None or self._pid != os.getpid():
+            db = sqlite3.connect(self.path, **self.kwargs)
+            if self.setup is not None:
+                self.setup(db)
+            self._db = db
+            self._pid = os.getpid()
+        return self._db
+
+    def close(self):
+        """Closes the connection, if this process opened it"""
+
+        if self._db is not None and self._pid == os.getpid():
+            self._db.close()
+        self._db = None
@@ -1,44 +1,258 @@
+import codecs
+import io
 import logging
+import socket
+import time
 
-import bs4
 import eventlet
-from eventlet import greenpool
 import requests
+from requests.compat import urlparse
 from requests import exceptions as re_exceptions
+from requests.packages.urllib3 import exceptions as urllib3_exceptions
+
+from archive import ReplayAdapter
+from backends import GreenBackend
+from cache import TitleCache
+from connections import ConnectionPool
+from flights import SingleFlight
+from hosts import Hosts
+import metrics
+from resolver import Resolver
+import tracing
+from urls import normalize_url
 
 
 LOG = logging.getLogger(__name__)
 
+# (note): Fetching a title is split into connecting (up to the response
+# headers), downloading the body and parsing it
+FETCH_TITLE = metrics.stage('fetch_title')
+FETCH_CONNECT = metrics.stage('fetch_connect')
+FETCH_DOWNLOAD = metrics.stage('fetch_download')
+FETCH_PARSE = metrics.stage('fetch_parse')
+REJECTED = metrics.REGISTRY.counter(
+    'strainer_fetch_rejected_total',
+    'Title fetches failed at once as the circuit breaker of the host was open')
+SKIPPED_HELP = 'Responses not read as their headers showed they have no title'
+HEDGED = metrics.REGISTRY.counter(
+    'strainer_fetch_hedged_total',
+    'Title fetches hedged with a second attempt as they were slow')
+HEDGE_WINS = metrics.REGISTRY.counter(
+    'strainer_fetch_hedge_wins_total',
+    'Hedged title fetches whose second attempt got the title first')
+# (note): By the header that showed the response has no title
+SKIPPED = {
+    'Content-Type': metrics.REGISTRY.counter(
+        'strainer_fetch_skipped_total', SKIPPED_HELP, reason='content_type'),
+    'Content-Length': metrics.REGISTRY.counter(
+        'strainer_fetch_skipped_total', SKIPPED_HELP,
+        reason='content_length'),
+}
+
 
 class TitleFetcher(object):
     """Fetches titles of URLs"""
 
-    pool = greenpool.GreenPool(size=1000)
+    # (note): Runs fetches, in green threads by default; see use_backend
+    backend = GreenBackend(size=1000)
+
+    # (note): The same few links tend to be pasted over and over, so
+    # titles are cached. Empty titles, e.g. of dead links, are cached for
+    # a shorter time.
+    cache = TitleCache(max_size=1024, ttl=3600, negative_ttl=60)
+
+    # (note): Optionally, titles are also kept in a TitleStore on disk
+    # shared by the server processes of a host, which outlives restarts
+    store = None
+
+    # (note): Responses are read in chunks of chunk_size bytes until the
+    # title has been seen, but no more than max_title_bytes. Titles are
+    # normally near the top of a page, so big pages or endless streams
+    # are cut short.
+    chunk_size = 8 * 1024
+
+    max_title_bytes = 256 * 1024
+
+    # (note): Only responses of these content types are read, so links to
+    # images, PDFs, archives or videos get an empty title without being
+    # downloaded. Responses without a content type are read.
+    content_types = frozenset(['text/html', 'application/xhtml+xml'])
+
+    # (note): Responses declaring a bigger content length aren't read
+    # either; set to None to read them
+    max_content_length = 10 * 1024 * 1024
+
+    # (note): A connection with the rest of a response left unread can't be
+    # reused. Up to max_drain_bytes are read to keep it, anything bigger
+    # isn't worth it.
+    max_drain_bytes = 64 * 1024
+
+    # (note): Seconds each read of the rest of a response may wait, once
+    # its title is found. A host slower than that to send it has its
+    # connection closed instead.
+    drain_timeout = 0.05
+
+    # (note): Keep-alive connections are shared by all green threads, so
+    # links to the same hosts don't pay for a new handshake each time.
+    # Host names are resolved once per TTL of their DNS answer, or once
+    # per 10 seconds if they don't resolve, rather than on every new
+    # connection.
+    connections = ConnectionPool(
+        max_connections=500, max_hosts=100, max_per_host=10,
+        idle_timeout=30,
+        resolver=Resolver(max_size=1024, max_ttl=3600, negative_ttl=10))
+
+    # (note): Max. seconds a fetch may take, including waiting for the
+    # host and reading and parsing the response. With backends that can't
+    # interrupt fetches, it bounds connecting and each read instead.
+    timeout = 5
+
+    # (note): Seconds a host may take to answer before a fetch killed
+    # while waiting for it, e.g. by a request's deadline, counts as its
+    # failure. Deadlines are shorter than the timeout, so otherwise a
+    # hanging host would never be seen to fail.
+    host_failure_after = 0.5
+
+    # (note): Fetches from a host are limited to as many as it has pooled
+    # connections, so a hanging host can't take up the whole pool. A host
+    # failing 5 times in a row within 30 seconds isn't fetched from for
+    # the next 30 seconds.
+    hosts = Hosts(max_concurrent=10, max_hosts=1000, failures=5, window=30,
+                  cooldown=30)
+
+    # (note): Optionally, a HedgePolicy to start a second attempt of
+    # fetches slower than most, taking whichever gets the title first
+    hedging = None
+
+    # (note): A link pasted into a busy room is strained by many requests
+    # at once, so concurrent fetches of the same URL are coalesced into
+    # one, which the others wait for
+    flights = SingleFlight()
 
     @classmethod
-    def fetch_titles(cls, urls):
+    def use_backend(cls, backend):
+        """ Runs fetches with the given backend from now on
+
+        Limits on fetches from hosts and on open connections, and
+        coalesced DNS lookups, wait with the semaphores and events of the
+        backend from now on too, so this is to be called on start up,
+        before anything is fetched.
+
+        :param backend: runs fetches
+        :type backend: GreenBackend or ThreadBackend
+        """
+
+        cls.backend = backend
+        cls.hosts.semaphore = backend.semaphore
+        cls.hosts.clear()
+        cls.flights.event = backend.event
+        cls.connections.semaphore = backend.semaphore(
+            cls.connections.max_connections)
+        if cls.connections.resolver is not None:
+            cls.connections.resolver.event = backend.event
+
+    @classmethod
+    def fetch_titles(cls, urls, deadline=None):
         """Fetch titles of given URLs
 
+        With a deadline, titles are fetched for no longer than that in all.
+        Fetches still running by then are killed, so nothing is left
+        running once the titles are returned.
+
         :param urls: list of urls to fetch titles for
         :type urls: list of string
+        :param deadline: max. seconds to wait for all titles, or None
+        :type deadline: float
 
-        :return: titles of all urls provided
+        :return: titles of all urls provided, None for those that weren't
+            fetched by the deadline
         :rtype: list of strings
         """
 
-        titles = cls.pool.imap(cls.fetch_title, urls)
-        return list(titles)
+        titles = [None] * len(urls)
+        for i, title in cls.iter_titles(urls, deadline=deadline):
+            titles[i] = title
+        return titles
 
     @classmethod
+    def iter_titles(cls, urls, deadline=None):
+        """Fetch titles of given URLs, yielding each as soon as it's fetched
+
+        Titles are fetched concurrently, and yielded in the order they're
+        fetched in. With a deadline, titles are fetched for no longer than
+        that in all. Fetches still running by then, or when the iterator
+        is closed, are killed, as far as the backend can.
+
+        :param urls: list of urls to fetch titles for
+        :type urls: list of string
+        :param deadline: max. seconds to wait for all titles, or None
+        :type deadline: float
+
+        :return: index of each url and its title, None for those that
+            weren't fetched by the deadline
+        :rtype: iterator of tuples
+        """
+
+        end = None if deadline is None else time.time() + deadline
+        request_id = tracing.get_request_id()
+        fetched = cls.backend.queue()
+        fetches = {}
+        unfetched = set(range(len(urls)))
+        try:
+            # (note): Spawning may wait while the pool is full, so it's
+            # bound by the deadline too. Nothing is yielded within the
+            # timeout, as it would go off wherever the caller is by then.
+            with cls.backend.timeout(deadline, False):
+                for i, url in enumerate(urls):
+                    fetches[i] = cls.backend.spawn(
+                        cls._fetch_into, fetched, i, url, request_id)
+
+            while fetches:
+                timeout = None if end is None else max(0, end - time.time())
+                try:
+                    i, title = fetched.get(timeout=timeout)
+                except cls.backend.Empty:
+                    break
+                del fetches[i]
+                unfetched.discard(i)
+                yield i, title
+        finally:
+            for fetch in fetches.values():
+                fetch.kill()
+
+        for i in sorted(unfetched):
+            yield i, None
+
+    @classmethod
+    def _fetch_into(cls, fetched, i, url, request_id=None):
+        """Fetch title of a URL into a queue, along with its index
+
+        The fetch logs under the ID of the request it's for. A fetch that
+        fails still puts an empty title, so it isn't waited for forever.
+        """
+
+        tracing.set_request_id(request_id)
+        title = u''
+        try:
+            title = cls.fetch_title(url)
+        finally:
+            fetched.put((i, title))
+
+    @classmethod
+    @metrics.timed(FETCH_TITLE)
     def fetch_title(cls, url):
         """ Fetch title of a given URL
 
-        The given URL is fetched and then parsed for title using
-        BeautifulSoup. If a title is not present or the given url
-        isn't valid, an empty string is returned.
+        The given URL is fetched and parsed for title as it is read, so
+        reading stops once the title has been seen. If a title is not
+        present or the given url isn't valid, an empty string is returned.
 
         To guard against slow URLs, a timeout is used to keep the
-        response of the api fairly consistent.
+        response of the api fairly consistent. Titles are cached, so a URL
+        is only fetched again once its cached title expires. With a store,
+        titles missing from the cache are looked up there before the URL
+        is fetched. A URL already being fetched, once normalized, isn't
+        fetched again; the title it gets is taken.
 
         :param url: url for which title needs to be fetched
         :type url: string
@@ -47,36 +261,473 @@ class TitleFetcher(object):
         :rtype: string
         """
 
-        # (note): possibility for adding a cache here
+        title = cls.cache.get(url)
+        if title is None and cls.store is not None:
+            title = cls.store.get(url)
+            if title is not None:
+                cls.cache.set(url, title)
+        if title is None:
+            title, coalesced = cls.flights.run(normalize_url(url),
+                                               cls._fetch_stored, url)
+            if coalesced:
+                # (note): The fetch waited for may have been for a URL
+                # differing from this one
+                cls.cache.set(url, title)
+        return title
+
+    @classmethod
+    def _fetch_stored(cls, url):
+        """Fetch title of a given URL, bypassing the cache, and keep it
+        in the cache and the store"""
+
+        title = cls._fetch_hedged(url)
+        cls.cache.set(url, title)
+        if cls.store is not None:
+            cls.store.set(url, title)
+        return title
+
+    @classmethod
+    def prewarm(cls, urls, deadline=None):
+        """ Fetch titles of URLs into the cache and the store, if any
+
+        URLs already cached or stored aren't fetched again.
+
+        :param urls: list of urls to fetch titles for
+        :type urls: list of string
+        :param deadline: max. seconds to fetch titles for, or None
+        :type deadline: float
+
+        :return: number of titles fetched by the deadline
+        :rtype: int
+        """
+
+        titles = cls.fetch_titles(urls, deadline=deadline)
+        return sum(1 for title in titles if title is not None)
+
+    @classmethod
+    def seed(cls, archive):
+        """ Cache the titles of the responses in a FetchArchive, read as
+        if they were fetched, e.g. on start up
+
+        Redirects aren't followed, so only the URLs of pages themselves
+        get their titles.
+
+        :param archive: archive of responses
+        :type archive: FetchArchive
+
+        :return: number of titles cached
+        :rtype: int
+        """
+
+        replayer = ReplayAdapter(archive, latency_scale=0)
+        seeded = 0
+        for url in archive.urls():
+            resp = replayer.send(requests.Request('GET', url).prepare())
+            if resp.is_redirect:
+                continue
+            cls.cache.set(url, cls._title_of(resp, url))
+            seeded += 1
+        return seeded
+
+    @classmethod
+    def warm_up(cls, urls=(), deadline=None, connect=False):
+        """ Loads the title parser and looks up the host names of URLs,
+        e.g. those about to be prewarmed, so the first fetches wait for
+        neither
+
+        With connect, a connection to each host is opened and pooled too,
+        so the first fetches don't wait for handshakes either. Processes
+        can't share connections, so this is only for those that don't
+        fork afterwards.
+
+        Hosts are warmed up concurrently, for no longer than the deadline
+        in all. Those still being looked up or connected to by then are
+        killed, as far as the backend can, so none is left for forked
+        processes to wait on.
+
+        :param urls: list of urls to warm up the hosts of
+        :type urls: list of string
+        :param deadline: max. seconds to warm up hosts for, or None
+        :type deadline: float
+        :param connect: whether to open connections to the hosts
+        :type connect: bool
+
+        :return: number of hosts warmed up by the deadline
+        :rtype: int
+        """
+
+        resp = requests.Response()
+        resp.raw = io.BytesIO(b'<html><head><title></title></head></html>')
+        cls._read_title(resp)
+
+        resolver = cls.connections.resolver
+        if resolver is None and not connect:
+            return 0
+        # (note): Maps each host to a url of it, to connect to
+        hosts = {}
+        for url in urls:
+            try:
+                parsed = urlparse(url)
+                if parsed.hostname:
+                    hosts.setdefault(parsed.hostname, url)
+            except ValueError:
+                pass
+
+        end = None if deadline is None else time.time() + deadline
+        warmed = cls.backend.queue()
+        running = {}
+        warmed_up = 0
+        try:
+            with cls.backend.timeout(deadline, False):
+                for name, url in hosts.items():
+                    running[name] = cls.backend.spawn(
+                        cls._warm_up_into, warmed, name,
+                        url if connect else None)
+
+            while running:
+                timeout = None if end is None else max(0, end - time.time())
+                try:
+                    del running[warmed.get(timeout=timeout)]
+                except cls.backend.Empty:
+                    break
+                warmed_up += 1
+        finally:
+            for host in running.values():
+                host.kill()
+        return warmed_up
+
+    @classmethod
+    def _warm_up_into(cls, warmed, name, url=None):
+        """Looks up a host name, and connects to the host of url if given,
+        then puts the name into a queue"""
+
+        resolver = cls.connections.resolver
+        try:
+            if resolver is not None:
+                resolver.resolve(name)
+            if url is not None:
+                cls.connections.connect(url, timeout=cls.timeout)
+        except socket.gaierror:
+            # (note): Cached as not resolving all the same
+            pass
+        except urllib3_exceptions.HTTPError as e:
+            LOG.debug("Failed to connect to %s: %s" % (name, e))
+        warmed.put(name)
+
+    @classmethod
+    def _fetch_hedged(cls, url):
+        """Fetch title of a given URL, bypassing the cache, and hedging
+        the fetch if it's slow
+
+        Attempts run outside the backend's pool. The first title found
+        is taken, and the other attempt is killed; an empty title is only
+        taken once both attempts are done.
+        """
+
+        if cls.hedging is None:
+            return cls._fetch_title(url)
+
+        start = time.time()
+        delay = cls.hedging.delay()
+        if delay is None:
+            title = cls._fetch_title(url)
+            cls.hedging.observe(time.time() - start)
+            return title
+
+        request_id = tracing.get_request_id()
+        attempted = cls.backend.queue()
+        attempts = [cls.backend.start(cls._attempt_into, attempted, 0, url,
+                                      request_id)]
+        try:
+            try:
+                attempt, title = attempted.get(timeout=delay)
+            except cls.backend.Empty:
+                attempt, title = None, None
+                if cls.hedging.allow():
+                    HEDGED.inc()
+                    LOG.debug("Hedging fetch slower than %.3fs: %s" %
+                              (delay, url))
+                    attempts.append(cls.backend.start(
+                        cls._attempt_into, attempted, 1, url, request_id))
+
+            done = 0 if attempt is None else 1
+            while not title and done < len(attempts):
+                attempt, title = attempted.get()
+                done += 1
+            if title and attempt == 1:
+                HEDGE_WINS.inc()
+            cls.hedging.observe(time.time() - start)
+            return title
+        finally:
+            for fetch in attempts:
+                fetch.kill()
+
+    @classmethod
+    def _attempt_into(cls, attempted, attempt, url, request_id=None):
+        """Fetch title of a URL into a queue, along with the attempt
+
+        As with _fetch_into, an attempt that fails puts an empty title.
+        """
+
+        tracing.set_request_id(request_id)
+        title = u''
+        try:
+            title = cls._fetch_title(url)
+        finally:
+            attempted.put((attempt, title))
+
+    @classmethod
+    def _fetch_title(cls, url):
+        """Fetch title of a given URL, bypassing the cache
+
+        Timeouts and connection errors count as failures of the host.
+        Fetches killed by a deadline only do if the host was waited on
+        for longer than host_failure_after, as the deadline may be much
+        shorter than the timeout.
+        """
+
+        host = cls.hosts.get(url)
+        if not host.breaker.allow():
+            REJECTED.inc()
+            LOG.debug("Circuit breaker of %s is open, not fetching url: %s" %
+                      (host.name, url))
+            return u''
+
+        # (note): A timeout bound fetch to guard against very slow
+        # fetches. As the response is streamed, this covers reading
+        # and parsing it too.
+        timeout = cls.backend.timeout(cls.timeout)
+        awaiting_host = False
+        answered = None
         try:
-            # (note): A timeout bound fetch to guard against very slow fetches
-            with eventlet.Timeout(5, False):
-                resp = requests.get(url)
-
-            if resp and resp.status_code == 200:
-                # (note): Instead of downloading the entire content here,
-                # we can stream the content and read only til the title
-                # tag appears.
-                # (note): Currently the above timeout is only used for
-                # fetching the URL. It can also be applied to account
-                # for the parsing time taken by BeautifulSoup.
-
-                soup = bs4.BeautifulSoup(
-                    resp.content.decode('utf-8', 'ignore'), "lxml")
-                if soup.title:
-                    return soup.title.text
+            # (note): The host's turn first, so fetches queued behind a
+            # busy host don't hold connections other hosts could use
+            with host.semaphore, cls.connections.semaphore:
+                awaiting_host = True
+                start = time.time()
+                resp = cls.connections.session.get(url, stream=True,
+                                                   timeout=cls.timeout)
+                FETCH_CONNECT.observe(time.time() - start)
+                awaiting_host = False
+                answered = True
+                try:
+                    title = cls._title_of(resp, url)
+                except BaseException:
+                    resp.close()
+                    raise
+                # (note): The fetch is done; the rest of the response is
+                # only read to keep the connection, bound by drain_timeout
+                timeout.cancel()
+                cls._close(resp)
+                return title
+        except eventlet.Timeout as t:
+            if t is not timeout:
+                raise
+            # (note): A timeout while the host is being waited on counts
+            # as its failure, not one while waiting for its turn or a
+            # free connection
+            if awaiting_host:
+                answered = False
+            msg = "Fetching url took longer than %ss: %s"
+            msg = msg % (cls.timeout, url)
+            LOG.debug(msg)
         except re_exceptions.Timeout as te:
             # (note): This could be a good candidate for re-tries
+            answered = False
             msg = "TIMEOUT occurred while fetching url: %s\n Error: %s"
             msg = msg % (url, te)
             LOG.debug(msg)
         except re_exceptions.ConnectionError as ce:
+            answered = False
             msg = "Unable to establish connection to url: %s\n Error: %s"
             msg = msg % (url, ce)
             LOG.debug(msg)
         except Exception as e:
+            # (note): e.g. invalid URLs, which say nothing about the host
             msg = "Unknown error occurred trying to fetch url: %s\n Error: %s"
             msg = msg % (url, e)
             LOG.debug(msg)
+        finally:
+            timeout.cancel()
+            if (answered is None and awaiting_host and
+                    time.time() - start > cls.host_failure_after):
+                answered = False
+            host.breaker.done(answered)
 
         return u''
+
+    @classmethod
+    def _title_of(cls, resp, url):
+        """ Read the title from a response to a fetch of a URL
+
+        :return: title of the page, or an empty string if there's none,
+            or the response isn't a page
+        :rtype: string
+        """
+
+        if not resp or resp.status_code != 200:
+            return u''
+        skipped = cls._skip(resp)
+        if skipped is not None:
+            SKIPPED[skipped].inc()
+            LOG.debug("Not reading url with %s: %s: %s" %
+                      (skipped, resp.headers[skipped], url))
+            return u''
+        return cls._read_title(resp)
+
+    @classmethod
+    def _skip(cls, resp):
+        """ Tell from the headers of a response whether it can't have a
+        title
+
+        :param resp: response, with the body not read yet
+        :type resp: requests.Response
+
+        :return: the header the response is not to be read because of,
+            Content-Type or Content-Length, or None to read it
+        :rtype: string
+        """
+
+        content_type = resp.headers.get('Content-Type')
+        if content_type:
+            mime_type = content_type.split(';', 1)[0].strip().lower()
+            if mime_type not in cls.content_types:
+                return 'Content-Type'
+
+        if cls.max_content_length is not None:
+            try:
+                length = int(resp.headers.get('Content-Length'))
+            except (TypeError, ValueError):
+                # (note): Missing or invalid, so the length isn't known
+                length = None
+            if length is not None and length > cls.max_content_length:
+                return 'Content-Length'
+        return None
+
+    @classmethod
+    def _close(cls, resp):
+        """ Close a response, returning its connection to the pool if the
+        rest of the response is small enough to be read, and arrives
+        within drain_timeout
+
+        :param resp: response to close
+        :type resp: requests.Response
+        """
+
+        remaining = getattr(resp.raw, 'length_remaining', None)
+        connection = getattr(resp.raw, '_connection', None)
+        sock = getattr(connection, 'sock', None)
+        if (sock is not None and remaining is not None and
+                remaining <= cls.max_drain_bytes):
+            try:
+                # (note): urllib3 sets the timeout again when the
+                # connection is reused, and releases it once the response
+                # is read to the end
+                sock.settimeout(cls.drain_timeout)
+                resp.raw.read(decode_content=False)
+            except Exception as e:
+                LOG.debug("Closing connection not drained: %s" % e)
+        resp.close()
+
+    @classmethod
+    def _read_title(cls, resp):
+        """ Read the title from a streamed response
+
+        :param resp: response to read from
+        :type resp: requests.Response
+
+        :return: title of the page, or an empty string if there's none
+        :rtype: string
+        """
+
+        # (note): Imported only here, so loading the fetcher doesn't load
+        # lxml until the first title is parsed, or it's warmed up
+        from lxml import etree
+
+        parser = etree.HTMLPullParser(events=('end',), tag='title')
+        decoder = codecs.getincrementaldecoder('utf-8')('ignore')
+        read = 0
+        # (note): Time spent waiting for chunks is downloading, the rest
+        # is parsing
+        start = mark = time.time()
+        download = 0.0
+        try:
+            for chunk in resp.iter_content(cls.chunk_size):
+                download += time.time() - mark
+                parser.feed(decoder.decode(chunk))
+                for _, title in parser.read_events():
+                    return u''.join(title.itertext())
+                read += len(chunk)
+                if read >= cls.max_title_bytes:
+                    break
+                mark = time.time()
+            else:
+                download += time.time() - mark
+
+            # (note): Closing the parser ends a title cut short by the end
+            # of the response or the byte limit
+            try:
+                parser.feed(decoder.decode(b'', True))
+                parser.close()
+            except etree.XMLSyntaxError:
+                # (note): Raised for empty responses
+                return u''
+            for _, title in parser.read_events():
+                return u''.join(title.itertext())
+            return u''
+        finally:
+            FETCH_DOWNLOAD.observe(download)
+            FETCH_PARSE.observe(time.time() - start - download)
+
+
+metrics.REGISTRY.gauge('strainer_fetch_pool_running',
+                       'Title fetches running in the pool of the backend',
+                       func=lambda: TitleFetcher.backend.running())
+metrics.REGISTRY.gauge('strainer_fetch_pool_size',
+                       'Max. title fetches running in the pool of the backend',
+                       func=lambda: TitleFetcher.backend.size)
+metrics.REGISTRY.gauge('strainer_fetch_pool_waiting',
+                       'Title fetches waiting for a free slot in the pool',
+                       func=lambda: TitleFetcher.backend.waiting())
+metrics.REGISTRY.gauge(
+    'strainer_fetch_queue_wait_seconds',
+    'Recent seconds title fetches waited for a free slot in the pool',
+    func=lambda: TitleFetcher.backend.queue_wait.get())
+metrics.REGISTRY.counter(
+    'strainer_fetch_coalesced_total',
+    'Title fetches that waited for a fetch of the same URL already running',
+    func=lambda: TitleFetcher.flights.coalesced)
+metrics.REGISTRY.gauge('strainer_title_cache_size', 'Titles cached',
+                       func=lambda: len(TitleFetcher.cache))
+metrics.REGISTRY.counter('strainer_title_cache_hits_total',
+                         'Titles found in the cache',
+                         func=lambda: TitleFetcher.cache.hits)
+metrics.REGISTRY.counter('strainer_title_cache_misses_total',
+                         'Titles not found in the cache',
+                         func=lambda: TitleFetcher.cache.misses)
+metrics.REGISTRY.counter('strainer_title_cache_evictions_total',
+                         'Titles evicted from the cache when it was full',
+                         func=lambda: TitleFetcher.cache.evictions)
+metrics.REGISTRY.gauge(
+    'strainer_hosts_circuit_open',
+    'Hosts whose circuit breaker is open or half-open',
+    func=lambda: len(TitleFetcher.hosts.states()))
+metrics.REGISTRY.counter('strainer_title_store_hits_total',
+                         'Titles found in the store',
+                         func=lambda: getattr(TitleFetcher.store, 'hits', 0))
+metrics.REGISTRY.counter(
+    'strainer_title_store_misses_total', 'Titles not found in the store',
+    func=lambda: getattr(TitleFetcher.store, 'misses', 0))
+metrics.REGISTRY.counter(
+    'strainer_title_store_errors_total', 'Errors reading or writing the store',
+    func=lambda: getattr(TitleFetcher.store, 'errors', 0))
+metrics.REGISTRY.counter(
+    'strainer_dns_hits_total', 'Host names resolved from the cache',
+    func=lambda: TitleFetcher.connections.resolver.hits)
+metrics.REGISTRY.counter(
+    'strainer_dns_misses_total', 'Host names looked up in DNS',
+    func=lambda: TitleFetcher.connections.resolver.misses)
+metrics.REGISTRY.counter(
+    'strainer_dns_coalesced_total',
+    'Host names resolved by waiting for a lookup already running',
+    func=lambda: TitleFetcher.connections.resolver.coalesced)
@@ -0,0 +1,71 @@
+import threading
+
+from eventlet import event
+
+
+# (note): Sent to waiting calls when the running call didn't finish
+_FAILED = object()
+
+
+class SingleFlight(object):
+    """Coalesces concurrent calls for the same key
+
+    The first call for a key runs, and calls for the same key made while
+    it's running wait for its result instead of running too. If the
+    running call doesn't finish, e.g. it's killed by a deadline, one of
+    the calls waiting runs in its place.
+    """
+
+    def __init__(self, event=event.Event):
+        """
+        :param event: returns the event a call sends its result to the
+            calls waiting for it with, e.g. that of a fetch backend
+        :type event: callable
+        """
+
+        self.event = event
+        # (note): Maps key to the event its running call sends
+        self._running = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._running)
+
+    def run(self, key, func, *args):
+        """ Calls func, unless a call for the same key is running already,
+        and returns the result of whichever call ran
+
+        :param key: what the call is for
+        :type key: hashable
+        :param func: called with args
+
+        :return: the result, and whether it's that of another call
+        :rtype: tuple
+        """
+
+        while True:
+            with self._lock:
+                running = self._running.get(key)
+                if running is None:
+                    done = self._running[key] = self.event()
+                else:
+                    self.coalesced += 1
+            if running is None:
+                break
+            result = running.wait()
+            if result is not _FAILED:
+                return result, True
+
+        try:
+            result = func(*args)
+        except BaseException:
+            with self._lock:
+                del self._running[key]
+            done.send(_FAILED)
+            raise
+
+        with self._lock:
+            del self._running[key]
+        done.send(result)
+        return result, False
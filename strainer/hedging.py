@@ -0,0 +1,105 @@
+import collections
+import threading
+
+
+class HedgePolicy(object):
+    """When to hedge a fetch, i.e. start a second attempt of it
+
+    A fetch that hasn't finished once the given percentile of recent
+    fetch times has passed is likely stuck, e.g. on a bad connection or
+    a slow backend of the site, and a second attempt is likely to finish
+    sooner. The delay is the percentile of the last `window` fetch times,
+    but no less than min_delay; fetches aren't hedged until min_samples
+    times have been observed.
+
+    Hedges are bounded by a budget: each fetch adds max_ratio to it and
+    each hedge takes one from it, so no more than about max_ratio of the
+    fetches are hedged, plus a burst of up to max_burst when the budget
+    is full. With a max_ratio of 0, fetches are never hedged.
+    """
+
+    # (note): Fetch times observed between computing the delay again, as
+    # it takes sorting the window
+    update_every = 50
+
+    def __init__(self, percentile=95, max_ratio=0.05, min_delay=0.01,
+                 window=1000, min_samples=100, max_burst=10):
+        """
+        :param percentile: percentile of fetch times to hedge after
+        :type percentile: float
+        :param max_ratio: max. fraction of fetches hedged
+        :type max_ratio: float
+        :param min_delay: min. seconds to hedge after
+        :type min_delay: float
+        :param window: number of recent fetch times kept
+        :type window: int
+        :param min_samples: fetch times observed before hedging
+        :type min_samples: int
+        :param max_burst: max. hedges in a row, when the budget is full
+        :type max_burst: int
+        """
+
+        self.percentile = percentile
+        self.max_ratio = max_ratio
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.max_burst = max_burst
+        self._times = collections.deque(maxlen=window)
+        self._observed = 0
+        self._delay = None
+        # (note): Counted in fetches, so it adds up exactly
+        self._budget = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        """Records the time a fetch took"""
+
+        with self._lock:
+            self._times.append(seconds)
+            self._observed += 1
+            if (self._observed >= self.min_samples and
+                    (self._delay is None or
+                     self._observed % self.update_every == 0)):
+                times = sorted(self._times)
+                index = int(len(times) * self.percentile / 100.0)
+                self._delay = max(times[min(index, len(times) - 1)],
+                                  self.min_delay)
+
+    def delay(self):
+        """ Returns the seconds after which to hedge a fetch, and adds it
+        to the budget
+
+        :return: seconds, or None if fetches aren't hedged (yet)
+        :rtype: float
+        """
+
+        if self.max_ratio <= 0:
+            return None
+        with self._lock:
+            self._budget = min(self._budget + 1,
+                               self.max_burst / self.max_ratio)
+            return self._delay
+
+    def allow(self):
+        """ Returns whether a fetch may be hedged now, taking it from the
+        budget if so
+
+        :rtype: bool
+        """
+
+        if self.max_ratio <= 0:
+            return False
+        cost = 1 / self.max_ratio
+        with self._lock:
+            if self._budget < cost:
+                return False
+            self._budget -= cost
+            return True
+
+    def clear(self):
+        """Forgets the fetch times and the budget"""
+
+        self._times.clear()
+        self._observed = 0
+        self._delay = None
+        self._budget = 0
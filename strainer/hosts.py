@@ -0,0 +1,223 @@
+import collections
+import logging
+import threading
+import time
+
+from eventlet import semaphore
+from requests.compat import urlparse
+
+
+LOG = logging.getLogger(__name__)
+
+
+class CircuitBreaker(object):
+    """Stops fetches from a host that keeps failing, for a while
+
+    The breaker is closed while the host answers. After `failures`
+    failures in a row within `window` seconds it opens, and fetches from
+    the host fail at once. After `cooldown` seconds it's half-open: a
+    single fetch is let through to try the host again, which closes the
+    breaker if the host answers or opens it again if it fails.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failures=5, window=30, cooldown=30,
+                 clock=time.time):
+        """
+        :param name: what the breaker is for, e.g. a host, for logging
+        :type name: string
+        :param failures: failures in a row that open the breaker
+        :type failures: int
+        :param window: seconds the failures must happen within
+        :type window: int
+        :param cooldown: seconds the breaker stays open for
+        :type cooldown: int
+        :param clock: returns the current time in seconds
+        :type clock: callable
+        """
+
+        self.name = name
+        self.failures = failures
+        self.window = window
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = self.CLOSED
+        self._failed_at = collections.deque()
+        self._opened_at = None
+        self._trying = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """ Returns whether a fetch may go ahead
+
+        Every fetch allowed must be followed by a call to done.
+
+        :rtype: bool
+        """
+
+        if self.state == self.CLOSED:
+            return True
+        with self._lock:
+            if self.state == self.OPEN:
+                if self.clock() - self._opened_at < self.cooldown:
+                    return False
+                self.state = self.HALF_OPEN
+            # (note): Half-open, so only one fetch tries the host at a time
+            if self._trying:
+                return False
+            self._trying = True
+            return True
+
+    def done(self, answered):
+        """ Records how an allowed fetch went
+
+        :param answered: whether the host answered, or None if it's not
+            known, e.g. the fetch failed for another reason
+        :type answered: bool
+        """
+
+        with self._lock:
+            self._trying = False
+            if answered:
+                if self.state != self.CLOSED:
+                    LOG.info("Closing circuit breaker of %s" % self.name)
+                self.state = self.CLOSED
+                self._failed_at.clear()
+            elif answered is not None:
+                self._failed()
+
+    def _failed(self):
+        now = self.clock()
+        if self.state == self.HALF_OPEN:
+            self._open(now)
+            return
+
+        self._failed_at.append(now)
+        while self._failed_at[0] <= now - self.window:
+            self._failed_at.popleft()
+        if len(self._failed_at) >= self.failures:
+            self._open(now)
+
+    def _open(self, now):
+        LOG.warning("Opening circuit breaker of %s for %ss" %
+                    (self.name, self.cooldown))
+        self.state = self.OPEN
+        self._opened_at = now
+        self._failed_at.clear()
+
+
+class Host(object):
+    """Limit on concurrent fetches from a host, and its circuit breaker"""
+
+    def __init__(self, name, max_concurrent, semaphore=semaphore.Semaphore,
+                 **breaker_kwargs):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.semaphore = semaphore(max_concurrent)
+        self.breaker = CircuitBreaker(name, **breaker_kwargs)
+
+    def idle(self):
+        """Returns whether the host can be forgotten"""
+
+        return (self.semaphore.balance == self.max_concurrent and
+                self.breaker.state == CircuitBreaker.CLOSED)
+
+
+class Hosts(object):
+    """The hosts titles are fetched from
+
+    Each host gets its own limit on concurrent fetches, so a host that
+    hangs holds no more than that many green threads, and a circuit
+    breaker, so once it's found to be failing, fetches from it fail at
+    once. Up to max_hosts hosts are kept; the least recently used idle
+    ones are forgotten beyond that.
+    """
+
+    def __init__(self, max_concurrent=10, max_hosts=1000, failures=5,
+                 window=30, cooldown=30, clock=time.time,
+                 semaphore=semaphore.Semaphore):
+        """
+        :param max_concurrent: max. concurrent fetches from a host
+        :type max_concurrent: int
+        :param max_hosts: max. number of hosts kept
+        :type max_hosts: int
+        :param failures: failures in a row that open a host's breaker
+        :type failures: int
+        :param window: seconds the failures must happen within
+        :type window: int
+        :param cooldown: seconds a host's breaker stays open for
+        :type cooldown: int
+        :param clock: returns the current time in seconds
+        :type clock: callable
+        :param semaphore: returns the semaphore limiting fetches from a
+            host, given the limit, e.g. that of a fetch backend
+        :type semaphore: callable
+        """
+
+        self.max_concurrent = max_concurrent
+        self.max_hosts = max_hosts
+        self.semaphore = semaphore
+        self.breaker_kwargs = {'failures': failures, 'window': window,
+                               'cooldown': cooldown, 'clock': clock}
+        # (note): Least recently used first
+        self._hosts = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._hosts)
+
+    def get(self, url):
+        """ Returns the host of a URL
+
+        :param url: url to fetch
+        :type url: string
+        :rtype: Host
+        """
+
+        name = ''
+        try:
+            parsed = urlparse(url)
+            name = parsed.hostname or ''
+            if parsed.port:
+                name += ':%d' % parsed.port
+        except ValueError:
+            # (note): Raised for invalid IPv6 addresses or ports
+            pass
+
+        with self._lock:
+            host = self._hosts.pop(name, None)
+            if host is None:
+                host = Host(name, self.max_concurrent,
+                            semaphore=self.semaphore, **self.breaker_kwargs)
+                self._forget_idle()
+            self._hosts[name] = host
+            return host
+
+    def _forget_idle(self):
+        if len(self._hosts) < self.max_hosts:
+            return
+        for name, host in self._hosts.items():
+            if host.idle():
+                del self._hosts[name]
+                return
+
+    def clear(self):
+        """Forgets all hosts"""
+
+        with self._lock:
+            self._hosts.clear()
+
+    def states(self):
+        """ Returns the states of breakers that aren't closed
+
+        :return: state by host
+        :rtype: dict
+        """
+
+        with self._lock:
+            return dict((name, host.breaker.state)
+                        for name, host in self._hosts.items()
+                        if host.breaker.state != CircuitBreaker.CLOSED)
@@ -0,0 +1,128 @@
+import collections
+import threading
+import time
+
+
+class LRUCache(object):
+    """A bounded cache whose entries expire, evicting the least recently
+    used
+
+    Each entry is kept for the TTL it's put with. Entries weigh 1 each,
+    or what weigh returns for their value, and the least recently used
+    ones are evicted while the total weight would be over max_weight.
+
+    Hits, misses and evictions are counted to help with sizing the cache.
+    """
+
+    def __init__(self, max_weight, clock=time.time, weigh=None):
+        """
+        :param max_weight: max. total weight of the entries kept
+        :type max_weight: int
+        :param clock: returns the current time in seconds
+        :type clock: callable
+        :param weigh: returns the weight of a value, if not 1
+        :type weigh: callable
+        """
+
+        self.max_weight = max_weight
+        self.clock = clock
+        self.weigh = weigh
+        # (note): Maps key to (value, expiry time, weight), least recently
+        # used first
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """ Returns the value of a key, or None if it isn't cached
+
+        :param key: key to look up
+        :type key: hashable
+        """
+
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry[1] <= self.clock():
+                self.weight -= entry[2]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+
+            # (note): Re-inserting marks the entry as the most recently
+            # used
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def remaining(self, key):
+        """ Returns the seconds the value of a key is kept for
+
+        Unlike get, this isn't counted as a hit or miss, and doesn't mark
+        the value as used.
+
+        :param key: key to look up
+        :type key: hashable
+
+        :return: seconds, 0 if the key isn't cached
+        :rtype: float
+        """
+
+        entry = self._entries.get(key)
+        if entry is None:
+            return 0
+        return max(entry[1] - self.clock(), 0)
+
+    def put(self, key, value, ttl):
+        """ Caches the value of a key
+
+        :param key: key the value is for
+        :type key: hashable
+        :param value: value to cache
+        :param ttl: seconds the value is kept for, nothing is kept if it's
+            0 or less
+        :type ttl: float
+        """
+
+        weight = 1 if self.weigh is None else self.weigh(value)
+        if ttl <= 0 or weight > self.max_weight:
+            return
+
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.weight -= entry[2]
+            while self._entries and self.weight + weight > self.max_weight:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.weight -= evicted
+                self.evictions += 1
+            self._entries[key] = (value, self.clock() + ttl, weight)
+            self.weight += weight
+
+    def clear(self):
+        """Removes all entries and resets the counters"""
+
+        with self._lock:
+            self._entries.clear()
+            self.weight = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """ Returns the counters of the cache
+
+        :return: hits, misses, evictions and current size
+        :rtype: dict
+        """
+
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries)}
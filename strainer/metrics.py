@@ -0,0 +1,195 @@
+import bisect
+import collections
+import functools
+import threading
+import time
+
+
+# (note): Upper bounds in seconds, from tens of microseconds for straining
+# short messages up to the timeouts of title fetches
+BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+           0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1, 2.5, 5, 10)
+
+
+class Histogram(object):
+    """Counts observed values in buckets, as a Prometheus histogram
+
+    Observing a value is a bisect and a few additions, so it's cheap
+    enough to be done several times per request.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        """
+        :param buckets: upper bounds of the buckets, in increasing order
+        :type buckets: tuple of floats
+        """
+
+        self.buckets = tuple(buckets)
+        # (note): The last count is for values above the last bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.sum += value
+            self.count += 1
+
+    def samples(self, name, labels):
+        """Yields the samples of the histogram as (name, labels, value)"""
+
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield name + '_bucket', labels + (('le', _number(bound)),), \
+                cumulative
+        yield name + '_bucket', labels + (('le', '+Inf'),), self.count
+        yield name + '_sum', labels, self.sum
+        yield name + '_count', labels, self.count
+
+
+class Gauge(object):
+    """A value that goes up and down, or is read from a function"""
+
+    def __init__(self, func=None):
+        """
+        :param func: returns the value when it's read, if given
+        :type func: callable
+        """
+
+        self.func = func
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def get(self):
+        return self.value if self.func is None else self.func()
+
+    def samples(self, name, labels):
+        yield name, labels, self.get()
+
+
+class Counter(Gauge):
+    """A value that only goes up, or is read from a function"""
+
+    def dec(self, amount=1):
+        raise ValueError('counters can only go up')
+
+
+class Registry(object):
+    """Metrics by name and labels, rendered in Prometheus text format"""
+
+    TYPES = {Histogram: 'histogram', Gauge: 'gauge', Counter: 'counter'}
+
+    def __init__(self):
+        # (note): Maps name to (metric class, help, metrics by labels)
+        self._families = collections.OrderedDict()
+
+    def histogram(self, name, help, buckets=BUCKETS, **labels):
+        """Returns the histogram of a name and labels, creating it once"""
+
+        return self._get(Histogram, name, help, labels,
+                         lambda: Histogram(buckets))
+
+    def gauge(self, name, help, func=None, **labels):
+        """Returns the gauge of a name and labels, creating it once"""
+
+        return self._get(Gauge, name, help, labels, lambda: Gauge(func))
+
+    def counter(self, name, help, func=None, **labels):
+        """Returns the counter of a name and labels, creating it once"""
+
+        return self._get(Counter, name, help, labels, lambda: Counter(func))
+
+    def _get(self, cls, name, help, labels, create):
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = (cls, help,
+                                             collections.OrderedDict())
+        elif family[0] is not cls:
+            raise ValueError('%s is already a %s' %
+                             (name, self.TYPES[family[0]]))
+
+        key = tuple(sorted(labels.items()))
+        metric = family[2].get(key)
+        if metric is None:
+            metric = family[2][key] = create()
+        return metric
+
+    def render(self):
+        """ Renders all metrics in Prometheus text format
+
+        :return: metrics, one sample per line
+        :rtype: string
+        """
+
+        lines = []
+        for name, (cls, help, metrics) in self._families.items():
+            lines.append('# HELP %s %s' % (name, help))
+            lines.append('# TYPE %s %s' % (name, self.TYPES[cls]))
+            for labels, metric in metrics.items():
+                for sample, sample_labels, value in metric.samples(name,
+                                                                   labels):
+                    lines.append('%s%s %s' % (sample, _labels(sample_labels),
+                                              _number(value)))
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (key, str(value).replace('\\', r'\\')
+                     .replace('"', r'\"').replace('\n', r'\n'))
+        for key, value in labels)
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+REGISTRY = Registry()
+
+
+def stage(name):
+    """ Returns the histogram of seconds spent in a stage of handling
+    requests, e.g. parsing them or fetching titles
+
+    :param name: name of the stage
+    :type name: string
+    :rtype: Histogram
+    """
+
+    return REGISTRY.histogram(
+        'strainer_stage_seconds',
+        'Seconds spent in each stage of handling requests',
+        stage=name)
+
+
+def timed(histogram):
+    """Decorates a function to observe the seconds each call takes"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.time() - start)
+        wrapper.__wrapped__ = func
+        return wrapper
+    return decorator
@@ -0,0 +1,256 @@
+import errno
+import logging
+import os
+import signal
+import time
+
+import eventlet
+from eventlet import event
+from eventlet import hubs
+from eventlet import wsgi
+from werkzeug.wsgi import ClosingIterator
+
+
+LOG = logging.getLogger(__name__)
+
+
+class PreforkServer(object):
+    """Serves a WSGI app from several worker processes
+
+    The listening socket is opened before the workers are forked, so they
+    all inherit it and accept connections from it; the kernel hands each
+    connection to one of them. Each worker runs its own eventlet server,
+    so straining and parsing titles use as many cores as there are
+    workers.
+
+    The supervising process restarts workers that exit. On SIGTERM or
+    SIGINT, it asks the workers to stop: they stop accepting connections
+    and finish the requests they're handling, but are killed if they take
+    longer than graceful_timeout. A worker can be drained on its own the
+    same way, by sending it SIGTERM; it's then replaced.
+    """
+
+    # (note): A worker exiting sooner than min_uptime seconds after it
+    # started is likely to crash again, so it's restarted after a delay
+    # that doubles each time, up to max_restart_delay seconds
+    min_uptime = 1
+
+    max_restart_delay = 10
+
+    # (note): Seconds between checks for exited workers
+    poll_interval = 0.1
+
+    # (note): Seconds between checks by workers that the supervisor is
+    # still running, so they don't outlive it if it's killed
+    supervisor_check_interval = 1
+
+    def __init__(self, sock, app, workers, graceful_timeout=10,
+                 max_size=1024, on_start=None, **server_kwargs):
+        """
+        :param sock: listening socket, e.g. from eventlet.listen
+        :type sock: socket
+        :param app: WSGI app to serve
+        :type app: callable
+        :param workers: number of worker processes
+        :type workers: int
+        :param graceful_timeout: max. seconds workers finish requests for
+            when stopping
+        :type graceful_timeout: float
+        :param max_size: max. concurrent connections of each worker
+        :type max_size: int
+        :param on_start: called in each worker with its index, 0 to
+            workers - 1, once it's started
+        :type on_start: callable
+        :param server_kwargs: passed on to eventlet.wsgi.server
+        """
+
+        self.sock = sock
+        self.app = app
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.max_size = max_size
+        self.on_start = on_start
+        self.server_kwargs = server_kwargs
+        self.stopping = False
+        # (note): Maps pid of each running worker to (index, start time)
+        self._running = {}
+        self._restart_at = {}
+        self._restart_delay = {}
+
+    def run(self):
+        """Runs the workers until SIGTERM or SIGINT, then stops them"""
+
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        LOG.info("Starting %d workers" % self.workers)
+
+        stop_by = None
+        while True:
+            if self.stopping and stop_by is None:
+                LOG.info("Stopping workers")
+                stop_by = time.time() + self.graceful_timeout
+                self._signal_all(signal.SIGTERM)
+
+            self._reap()
+
+            if self.stopping:
+                if not self._running:
+                    break
+                if time.time() > stop_by:
+                    LOG.warning("Killing %d workers still running" %
+                                len(self._running))
+                    self._signal_all(signal.SIGKILL)
+            else:
+                self._start_missing()
+
+            time.sleep(self.poll_interval)
+        LOG.info("Workers stopped")
+
+    def _stop(self, signum, frame):
+        # (note): Only sets a flag, as the main loop may be anywhere
+        self.stopping = True
+
+    def _signal_all(self, signum):
+        for pid in self._running:
+            try:
+                os.kill(pid, signum)
+            except OSError as e:
+                if e.errno != errno.ESRCH:
+                    raise
+
+    def _reap(self):
+        """Forgets workers that exited, scheduling their restart"""
+
+        while self._running:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                if e.errno == errno.ECHILD:
+                    self._running.clear()
+                    return
+                raise
+            if not pid:
+                return
+            if pid not in self._running:
+                continue
+
+            index, started = self._running.pop(pid)
+            if self.stopping:
+                continue
+
+            delay = 0
+            if time.time() - started < self.min_uptime:
+                delay = min(self._restart_delay.get(index, 0.5) * 2,
+                            self.max_restart_delay)
+            self._restart_delay[index] = delay
+            self._restart_at[index] = time.time() + delay
+            LOG.warning("Worker %d (pid %d) exited with status %d, "
+                        "restarting in %gs" % (index, pid, status, delay))
+
+    def _start_missing(self):
+        running = set(index for index, _ in self._running.values())
+        for index in range(self.workers):
+            if (index not in running and
+                    self._restart_at.get(index, 0) <= time.time()):
+                self._spawn(index)
+
+    def _spawn(self, index):
+        pid = os.fork()
+        if pid:
+            self._running[pid] = (index, time.time())
+            return
+
+        status = 0
+        try:
+            self._serve(index)
+        except BaseException:
+            LOG.exception("Worker %d failed" % index)
+            status = 1
+        finally:
+            # (note): Never returns into the supervisor's loop
+            os._exit(status)
+
+    def _serve(self, index):
+        """Runs the eventlet server in a worker until it's stopped"""
+
+        # (note): The supervisor's handlers and hub don't belong here
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        hubs.use_hub()
+
+        supervisor = os.getppid()
+        worker = _Worker(self.sock, self.app)
+        server = eventlet.spawn(wsgi.server, worker, worker.wsgi_app,
+                                max_size=self.max_size, **self.server_kwargs)
+
+        def drain():
+            worker.draining = True
+            while worker.requests:
+                eventlet.sleep(self.poll_interval)
+            # (note): The server stops on SystemExit, closing idle
+            # keep-alive connections
+            server.kill(SystemExit)
+
+        def stop(signum, frame):
+            # (note): Drains from a green thread of its own rather than
+            # wherever the signal arrived
+            hubs.get_hub().schedule_call_global(0, eventlet.spawn_n, drain)
+
+        def watch_supervisor():
+            while os.getppid() == supervisor:
+                eventlet.sleep(self.supervisor_check_interval)
+            LOG.warning("Supervisor exited, stopping worker %d" % index)
+            drain()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        eventlet.spawn_n(watch_supervisor)
+        LOG.info("Worker %d (pid %d) started" % (index, os.getpid()))
+        if self.on_start is not None:
+            self.on_start(index)
+        server.wait()
+
+
+class _Worker(object):
+    """The listening socket of a worker, which stops accepting connections
+    when the worker drains, and its app, which counts the requests being
+    handled
+    """
+
+    # (note): eventlet's server closes all connections when it stops, even
+    # those still handling a request, so a worker only stops it once it's
+    # done with them
+
+    def __init__(self, sock, app):
+        self.sock = sock
+        self.app = app
+        self.draining = False
+        self.requests = 0
+        self._parked = event.Event()
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+    def accept(self):
+        if not self.draining:
+            conn, addr = self.sock.accept()
+            if not self.draining:
+                return conn, addr
+            # (note): Accepted as draining began
+            conn.close()
+        # (note): Waits until the server is stopped
+        self._parked.wait()
+
+    def wsgi_app(self, environ, start_response):
+        self.requests += 1
+        try:
+            return ClosingIterator(self.app(environ, start_response),
+                                   self._done)
+        except Exception:
+            self._done()
+            raise
+
+    def _done(self):
+        self.requests -= 1
@@ -0,0 +1,129 @@
+import cProfile
+import logging
+import os
+import random
+import time
+
+import greenlet
+
+
+LOG = logging.getLogger(__name__)
+
+
+class Profiler(object):
+    """Profiles a fraction of requests with cProfile, into a directory
+
+    While enabled, requests are profiled at random at the given rate, or
+    when they ask with the X-Profile header. A profile only runs while a
+    green thread working on its request does (the one handling it or its
+    title fetches, by request ID), so other requests' work doesn't end up
+    in it. Time spent waiting, e.g. on the network, is left out, but the
+    wall time of the request is in the name of its profile file, next to
+    its ID.
+
+    Profiles are written in pstats format, as `<ms since epoch>-<request
+    ID>-<wall ms>.pstats`, and only the newest max_files are kept. Loading
+    them with `python -m pstats` shows where the time went.
+
+    (note): With the thread backend, only the thread handling the request
+    is profiled, not its title fetches in worker threads.
+    """
+
+    # (note): WSGI name of the X-Profile header
+    header = 'HTTP_X_PROFILE'
+
+    suffix = '.pstats'
+
+    def __init__(self, directory, rate=0.0, enabled=False, max_files=100):
+        """
+        :param directory: directory to write profiles to
+        :type directory: string
+        :param rate: fraction of requests profiled while enabled
+        :type rate: float
+        :param enabled: whether requests are profiled at all
+        :type enabled: bool
+        :param max_files: max. number of profiles kept in the directory
+        :type max_files: int
+        """
+
+        self.directory = directory
+        self.rate = rate
+        self.enabled = enabled
+        self.max_files = max_files
+        self.profiled = 0
+        # (note): Maps request ID to the profile of requests being profiled
+        self._active = {}
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def start(self, environ, request_id):
+        """ Starts profiling a request, if it's to be profiled
+
+        :param environ: WSGI environment of the request
+        :type environ: dict
+        :param request_id: ID of the request, as set for its green thread
+        :type request_id: string
+
+        :return: the profile, to stop once the request is done, or None
+        :rtype: cProfile.Profile
+        """
+
+        if not self.enabled or request_id in self._active:
+            return None
+        if not environ.get(self.header) and random.random() >= self.rate:
+            return None
+
+        profile = cProfile.Profile()
+        profile.request_id = request_id
+        profile.started = time.time()
+        if not self._active:
+            greenlet.settrace(self._switched)
+        self._active[request_id] = profile
+        profile.enable()
+        return profile
+
+    def stop(self, profile):
+        """ Stops profiling a request and writes its profile
+
+        :param profile: as start returned it
+        :type profile: cProfile.Profile
+        """
+
+        profile.disable()
+        wall = time.time() - profile.started
+        del self._active[profile.request_id]
+        if not self._active:
+            greenlet.settrace(None)
+
+        name = '%013d-%s-%dms%s' % (time.time() * 1000, profile.request_id,
+                                    wall * 1000, self.suffix)
+        try:
+            profile.dump_stats(os.path.join(self.directory, name))
+            self._prune()
+        except (IOError, OSError) as e:
+            LOG.warning("Failed to write profile %s: %s" % (name, e))
+            return
+        self.profiled += 1
+
+    def _prune(self):
+        """Removes the oldest profiles past max_files"""
+
+        names = sorted(name for name in os.listdir(self.directory)
+                       if name.endswith(self.suffix))
+        for name in names[:max(len(names) - self.max_files, 0)]:
+            os.remove(os.path.join(self.directory, name))
+
+    def _switched(self, event, args):
+        """Runs the profile of the request a green thread switched to works
+        on, if it's profiled, instead of the one it switched from"""
+
+        if event not in ('switch', 'throw'):
+            return
+        origin, target = args
+        left = self._active.get(getattr(origin, 'request_id', None))
+        entered = self._active.get(getattr(target, 'request_id', None))
+        if left is not entered:
+            if left is not None:
+                left.disable()
+            if entered is not None:
+                entered.enable()
@@ -0,0 +1,167 @@
+import logging
+import socket
+import threading
+import time
+
+from eventlet import event
+from eventlet.support import greendns
+
+from lru import LRUCache
+
+
+LOG = logging.getLogger(__name__)
+
+
+def lookup_dns(name, proxy=None):
+    """ Looks up the addresses of a host name with eventlet's green DNS
+    resolver, which also reads the hosts file
+
+    :param name: host name to look up
+    :type name: string
+    :param proxy: resolver to query instead of the default one
+    :type proxy: eventlet.support.greendns.ResolverProxy
+
+    :return: addresses, IPv4 ones first, and seconds they're valid for
+    :rtype: tuple
+    :raises socket.gaierror: if the name has no addresses
+    """
+
+    addresses = []
+    ttls = []
+    for family in (socket.AF_INET, socket.AF_INET6):
+        answer = greendns.resolve(name, family, raises=False, _proxy=proxy)
+        if answer.rrset is None:
+            continue
+        addresses.extend(rdata.address for rdata in answer.rrset)
+        ttls.append(answer.rrset.ttl)
+
+    if not addresses:
+        raise greendns.EAI_NODATA_ERROR
+    return addresses, min(ttls)
+
+
+class Resolver(object):
+    """A bounded cache of DNS lookups
+
+    Addresses are kept for as long as the TTL of the DNS answer says, but
+    no longer than max_ttl. Names that fail to resolve are kept for a
+    short negative TTL, so a dead link isn't looked up again on every
+    mention. Concurrent lookups of the same name are coalesced: the first
+    one queries DNS and the others wait for its answer. The least recently
+    used name is evicted when the cache is full.
+    """
+
+    def __init__(self, max_size=1024, max_ttl=3600, negative_ttl=10,
+                 lookup=lookup_dns, clock=time.time, event=event.Event):
+        """
+        :param max_size: max. number of names kept
+        :type max_size: int
+        :param max_ttl: max. seconds addresses are kept for
+        :type max_ttl: int
+        :param negative_ttl: seconds a failed lookup is kept for
+        :type negative_ttl: int
+        :param lookup: returns the addresses of a name and their TTL, or
+            raises socket.gaierror, as lookup_dns
+        :type lookup: callable
+        :param clock: returns the current time in seconds
+        :type clock: callable
+        :param event: returns the event a lookup sends its answer to
+            coalesced lookups with, e.g. that of a fetch backend
+        :type event: callable
+        """
+
+        self.max_ttl = max_ttl
+        self.negative_ttl = negative_ttl
+        self.lookup = lookup
+        self.event = event
+        # (note): Maps name to addresses or the error looking it up gave
+        self._names = LRUCache(max_size, clock=clock)
+        # (note): Never held while looking up
+        self._lock = threading.Lock()
+        # (note): Maps name to the event its running lookup sends
+        self._lookups = {}
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._names)
+
+    @property
+    def hits(self):
+        return self._names.hits
+
+    @property
+    def evictions(self):
+        return self._names.evictions
+
+    def resolve(self, name):
+        """ Returns the addresses of a host name
+
+        :param name: host name or IP address
+        :type name: string
+
+        :return: addresses to connect to, in order
+        :rtype: list
+        :raises socket.gaierror: if the name has no addresses
+        """
+
+        if _is_address(name):
+            return [name]
+
+        result = self._names.get(name)
+        while result is None:
+            with self._lock:
+                running = self._lookups.get(name)
+                if running is None:
+                    self.misses += 1
+                    done = self._lookups[name] = self.event()
+                else:
+                    self.coalesced += 1
+            if running is None:
+                result = self._lookup(name, done)
+            else:
+                result = running.wait()
+
+        if isinstance(result, socket.gaierror):
+            raise result
+        return result
+
+    def _lookup(self, name, done):
+        try:
+            addresses, ttl = self.lookup(name)
+            result = list(addresses)
+            ttl = min(ttl, self.max_ttl)
+        except socket.gaierror as e:
+            LOG.debug("Failed to resolve %s: %s" % (name, e))
+            result = e
+            ttl = self.negative_ttl
+        except BaseException:
+            # (note): e.g. the lookup was killed; the green threads
+            # waiting for it look the name up again themselves
+            with self._lock:
+                del self._lookups[name]
+            done.send(None)
+            raise
+
+        with self._lock:
+            del self._lookups[name]
+            self._names.put(name, result, ttl)
+        done.send(result)
+        return result
+
+    def clear(self):
+        """Removes all names and resets the counters"""
+
+        self._names.clear()
+        self.misses = 0
+        self.coalesced = 0
+
+
+def _is_address(name):
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            socket.inet_pton(family, name)
+            return True
+        except (socket.error, ValueError):
+            pass
+    return False
@@ -0,0 +1,85 @@
+import hashlib
+import time
+
+from lru import LRUCache
+
+
+class ResponseCache(LRUCache):
+    """A cache of serialized responses, by message
+
+    Bots and integrations post the same messages over and over, so the
+    whole response to a message is kept, and a repeated message is
+    answered without straining it, fetching titles or serializing the
+    response again. Messages are kept by their SHA-1 hash rather than
+    their text, as they can be long.
+
+    Each response is kept for the TTL it's set with, which is up to the
+    caller, e.g. as long as the titles of its links are cached for. The
+    size of the responses kept is capped at max_bytes; the least recently
+    used responses are evicted beyond that.
+    """
+
+    # (note): Bytes counted for each response besides its body, for the
+    # key, the entry and the list of entries
+    overhead = 200
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, clock=time.time):
+        """
+        :param max_bytes: max. bytes of responses kept
+        :type max_bytes: int
+        :param clock: returns the current time in seconds
+        :type clock: callable
+        """
+
+        super(ResponseCache, self).__init__(max_bytes, clock=clock,
+                                            weigh=self._size)
+
+    @property
+    def max_bytes(self):
+        return self.max_weight
+
+    @property
+    def bytes(self):
+        return self.weight
+
+    @staticmethod
+    def key(message):
+        """ Returns the key of a message
+
+        :param message: chat message
+        :type message: string
+        :rtype: string
+        """
+
+        if isinstance(message, type(u'')):
+            message = message.encode('utf-8')
+        return hashlib.sha1(message).digest()
+
+    def get(self, message):
+        """ Returns the cached response to a message, or None
+
+        :param message: chat message
+        :type message: string
+
+        :return: serialized response
+        :rtype: bytes
+        """
+
+        return super(ResponseCache, self).get(self.key(message))
+
+    def set(self, message, body, ttl):
+        """ Caches the response to a message
+
+        :param message: chat message
+        :type message: string
+        :param body: serialized response
+        :type body: bytes
+        :param ttl: seconds the response is kept for, nothing is kept if
+            it's 0 or less
+        :type ttl: float
+        """
+
+        self.put(self.key(message), body, ttl)
+
+    def _size(self, body):
+        return len(body) + self.overhead
@@ -1,26 +1,205 @@
 #! /usr/bin/env python
 
+import argparse
 import logging
 
 import eventlet
 from eventlet import wsgi
+from werkzeug import serving
 
 from api import app as strainer_app
-
-eventlet.monkey_patch(all=False, socket=True)
+from api import warm_up
+from archive import FetchArchive
+from backends import BACKENDS
+from backends import GreenBackend
+from fetcher import TitleFetcher
+from hedging import HedgePolicy
+from prefork import PreforkServer
+from profiling import Profiler
+from responses import ResponseCache
+from store import TitleStore
+import tracing
 
 log_format = ('[%(asctime)s: %(levelname)s: %(name)s: %(pathname)s: '
-              '%(lineno)d] %(message)s')
+              '%(lineno)d: %(request_id)s] %(message)s')
 logging.basicConfig(filename='/tmp/strainer.log',
                     level=logging.DEBUG,
                     format=log_format)
+# (note): Log lines carry the ID of the request they're logged for
+for handler in logging.getLogger().handlers:
+    handler.addFilter(tracing.RequestIdFilter())
 LOG = logging.getLogger('strainer.server')
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs the Strainer API')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--backend', choices=sorted(BACKENDS),
+                        default=GreenBackend.name,
+                        help='run title fetches in green threads of an '
+                             'eventlet server, or in OS threads of a '
+                             'threaded server (default: eventlet)')
+    parser.add_argument('--title-store', metavar='PATH',
+                        help='keep titles in an SQLite database at PATH, '
+                             'shared by the processes of the host')
+    archive = parser.add_mutually_exclusive_group()
+    archive.add_argument('--record', metavar='PATH',
+                         help='record fetched responses into an archive at '
+                              'PATH')
+    archive.add_argument('--replay', metavar='PATH',
+                         help='answer fetches with the responses recorded '
+                              'in the archive at PATH, as slowly as they '
+                              'were, instead of the network')
+    parser.add_argument('--seed', metavar='PATH',
+                        help='cache the titles of the responses recorded '
+                             'in the archive at PATH on start up')
+    parser.add_argument('--prewarm', metavar='FILE',
+                        help='fetch titles of the URLs in FILE, one per '
+                             'line, on start up: in the background, or '
+                             'before forking --workers')
+    parser.add_argument('--warm-up', action='store_true',
+                        help='strain a message, load the title parser, '
+                             'look up the hosts of --prewarm URLs and, '
+                             'without --workers, connect to them before '
+                             'accepting requests')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of worker processes, e.g. one per '
+                             'core (default: 1, in this process)')
+    parser.add_argument('--graceful-timeout', type=float, default=10,
+                        help='max. seconds workers finish requests for '
+                             'when stopping (default: 10)')
+    parser.add_argument('--hedge-percentile', type=float, metavar='P',
+                        help='start a second attempt of title fetches '
+                             'slower than the P-th percentile of recent '
+                             'fetches (default: off)')
+    parser.add_argument('--hedge-ratio', type=float, default=0.05,
+                        help='max. fraction of title fetches hedged '
+                             '(default: 0.05)')
+    parser.add_argument('--response-cache-mb', type=float, default=0,
+                        help='cache up to this many MB of responses to '
+                             'repeated messages (default: 0, off)')
+    parser.add_argument('--max-results', type=int, metavar='N',
+                        help='return no more than N mentions, emoticons '
+                             'and links per message, each (default: all)')
+    parser.add_argument('--max-in-flight', type=int, metavar='N',
+                        help='answer requests 503 while more than N are in '
+                             'flight (default: no limit)')
+    parser.add_argument('--retry-after', type=int, default=1,
+                        metavar='SECONDS',
+                        help='Retry-After of requests answered 503 '
+                             '(default: 1)')
+    parser.add_argument('--max-fetch-queue', type=int, metavar='N',
+                        help='return only cached titles while more than N '
+                             'title fetches wait for the pool '
+                             '(default: no limit)')
+    parser.add_argument('--max-fetch-wait', type=float, metavar='SECONDS',
+                        help='return only cached titles while title '
+                             'fetches recently waited for the pool longer '
+                             'than this (default: no limit)')
+    parser.add_argument('--profile-dir', metavar='PATH',
+                        help='allow profiling requests into PATH, turned '
+                             'on and off at /admin/profiling')
+    parser.add_argument('--profile-rate', type=float, default=0,
+                        help='profile this fraction of requests from the '
+                             'start (default: 0, off until turned on)')
+    parser.add_argument('--profile-max-files', type=int, default=100,
+                        help='keep only the newest profiles (default: 100)')
+    args = parser.parse_args()
+    green = args.backend == GreenBackend.name
+    if args.workers > 1 and not green:
+        parser.error('--workers needs the %s backend' % GreenBackend.name)
+
+    if green:
+        eventlet.monkey_patch(all=False, socket=True)
+    else:
+        TitleFetcher.use_backend(BACKENDS[args.backend]())
+
+    if args.max_results is not None:
+        strainer_app.config['MAX_RESULTS'] = args.max_results
+
+    strainer_app.config['MAX_IN_FLIGHT'] = args.max_in_flight
+    strainer_app.config['RETRY_AFTER'] = args.retry_after
+    strainer_app.config['MAX_FETCH_QUEUE'] = args.max_fetch_queue
+    strainer_app.config['MAX_FETCH_WAIT'] = args.max_fetch_wait
+
+    if args.response_cache_mb > 0:
+        strainer_app.config['RESPONSE_CACHE'] = ResponseCache(
+            max_bytes=int(args.response_cache_mb * 1024 * 1024))
+
+    if args.profile_dir:
+        strainer_app.config['PROFILER'] = Profiler(
+            args.profile_dir, rate=args.profile_rate,
+            enabled=args.profile_rate > 0,
+            max_files=args.profile_max_files)
+
+    if args.hedge_percentile:
+        TitleFetcher.hedging = HedgePolicy(percentile=args.hedge_percentile,
+                                           max_ratio=args.hedge_ratio)
+
+    if args.title_store:
+        TitleFetcher.store = TitleStore(args.title_store)
+
+    if args.record:
+        TitleFetcher.connections.use_transport(
+            FetchArchive(args.record).recorder)
+    elif args.replay:
+        TitleFetcher.connections.use_transport(
+            FetchArchive(args.replay).replayer)
+
+    if args.seed:
+        LOG.info("Seeded %d titles" %
+                 TitleFetcher.seed(FetchArchive(args.seed)))
+
+    urls = []
+    if args.prewarm:
+        with open(args.prewarm) as f:
+            urls = [line.strip() for line in f if line.strip()]
+
+    if args.warm_up:
+        # (note): Before workers are forked, so they all start warm.
+        # They can't share connections, so only a single process opens
+        # them.
+        LOG.info("Warmed up in %.3fs" %
+                 warm_up(urls, connect=args.workers <= 1))
+
+    def prewarm():
+        LOG.info("Prewarming titles of %d URLs" % len(urls))
+        strainer_app.config['READY'] = False
+
+        def run():
+            try:
+                TitleFetcher.prewarm(urls)
+            finally:
+                strainer_app.config['READY'] = True
+                LOG.info("Prewarmed titles, ready")
+        TitleFetcher.backend.start(run)
+
     # (note): Max. concurrency is 1024 by default.
     # This can also be controlled by using a custom pool of threads.
     # This will allow the concurrency to remain under control, which
     # is one way to defend DDoS attacks
     LOG.info("Server starting up")
-    wsgi.server(eventlet.listen(('', 5000)), strainer_app, max_size=1024)
+    if not green:
+        # (note): A thread per request, as waiting for titles blocks it
+        if urls:
+            prewarm()
+        serving.make_server('', args.port, strainer_app,
+                            threaded=True).serve_forever()
+    elif args.workers > 1:
+        if urls:
+            # (note): Before workers are forked, so they all start with
+            # the titles cached, and are ready once they start
+            LOG.info("Prewarming titles of %d URLs" % len(urls))
+            TitleFetcher.prewarm(urls)
+            # (note): Workers can't share the pooled connections
+            TitleFetcher.connections.close()
+            LOG.info("Prewarmed titles")
+        sock = eventlet.listen(('', args.port))
+        PreforkServer(sock, strainer_app, args.workers,
+                      graceful_timeout=args.graceful_timeout,
+                      max_size=1024).run()
+    else:
+        sock = eventlet.listen(('', args.port))
+        if urls:
+            prewarm()
+        wsgi.server(sock, strainer_app, max_size=1024)
     LOG.info("Server terminating")
@@ -0,0 +1,150 @@
+import logging
+import sqlite3
+import time
+
+from database import ProcessConnection
+
+
+LOG = logging.getLogger(__name__)
+
+
+class TitleStore(object):
+    """A title cache on disk, shared by the server processes of a host
+
+    Titles are kept in an SQLite database in WAL mode, so any number of
+    processes can read it while one writes. Titles outlive restarts, so
+    a new or restarted process starts with the titles the others fetched.
+
+    As with TitleCache, titles expire after a TTL, and empty titles after
+    a shorter negative TTL. Reads don't write, so they don't contend with
+    other processes; instead of the least recently used, the titles
+    closest to expiring are evicted once the store is full. The size is
+    checked every prune_every writes, so the store may briefly hold up to
+    that many titles more than max_size.
+
+    The store is a cache, so errors, e.g. the database being locked for
+    longer than the busy timeout, are logged and treated as misses.
+    """
+
+    # (note): Writes between removing expired titles and evicting the
+    # titles over max_size
+    prune_every = 64
+
+    # (note): Seconds to wait for a lock held by another process
+    busy_timeout = 0.1
+
+    def __init__(self, path, max_size=100000, ttl=3600, negative_ttl=60,
+                 clock=time.time):
+        """
+        :param path: path of the database file, created if missing
+        :type path: string
+        :param max_size: max. number of titles kept
+        :type max_size: int
+        :param ttl: seconds a title is kept for
+        :type ttl: int
+        :param negative_ttl: seconds an empty title is kept for
+        :type negative_ttl: int
+        :param clock: returns the current time in seconds
+        :type clock: callable
+        """
+
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._writes = 0
+        self._db = ProcessConnection(path, setup=self._setup,
+                                     timeout=self.busy_timeout)
+
+    @staticmethod
+    def _setup(db):
+        db.execute('PRAGMA journal_mode=WAL')
+        # (note): Losing the last few titles on a power cut is fine for a
+        # cache, and saves a sync per write
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.execute('CREATE TABLE IF NOT EXISTS titles ('
+                   'url TEXT PRIMARY KEY, '
+                   'title TEXT NOT NULL, '
+                   'expires REAL NOT NULL)')
+        db.execute('CREATE INDEX IF NOT EXISTS titles_expires '
+                   'ON titles (expires)')
+
+    def get(self, url):
+        """ Returns the stored title of a URL, or None if it isn't stored
+
+        :param url: url to look up
+        :type url: string
+
+        :return: title of the url
+        :rtype: string
+        """
+
+        try:
+            row = self._db.get().execute(
+                'SELECT title FROM titles WHERE url = ? AND expires > ?',
+                (url, self.clock())).fetchone()
+        except sqlite3.Error as e:
+            self._error('reading', url, e)
+            row = None
+
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def set(self, url, title):
+        """ Stores the title of a URL
+
+        :param url: url the title is for
+        :type url: string
+        :param title: title of the url, empty if there's none
+        :type title: string
+        """
+
+        if self.max_size <= 0:
+            return
+
+        ttl = self.ttl if title else self.negative_ttl
+        try:
+            db = self._db.get()
+            db.execute('INSERT OR REPLACE INTO titles VALUES (?, ?, ?)',
+                       (url, title, self.clock() + ttl))
+            self._writes += 1
+            if self._writes % self.prune_every == 0:
+                self._prune(db)
+        except sqlite3.Error as e:
+            self._error('writing', url, e)
+
+    def _prune(self, db):
+        """Removes expired titles, then those closest to expiring over
+        max_size"""
+
+        db.execute('DELETE FROM titles WHERE expires <= ?', (self.clock(),))
+        db.execute('DELETE FROM titles WHERE url IN ('
+                   'SELECT url FROM titles ORDER BY expires DESC '
+                   'LIMIT -1 OFFSET ?)', (self.max_size,))
+
+    def _error(self, action, url, e):
+        self.errors += 1
+        LOG.debug('Error %s title store %s for url: %s\n Error: %s' %
+                  (action, self.path, url, e))
+
+    def __len__(self):
+        return self._db.get().execute(
+            'SELECT COUNT(*) FROM titles').fetchone()[0]
+
+    def clear(self):
+        """Removes all titles and resets the counters"""
+
+        self._db.get().execute('DELETE FROM titles')
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def close(self):
+        self._db.close()
@@ -1,6 +1,9 @@
+import itertools
+import multiprocessing
 import re
 
-import util
+import metrics
+from urls import URLFinder
 
 
 class MessageStrainer(object):
@@ -12,9 +15,32 @@ class MessageStrainer(object):
     # (note): This assumes that mentions can occur in the middle of a word
     re_mentions = re.compile(r'@(\w+)')
 
-    re_url = re.compile(util.WEB_URL_REGEX)
+    # (note): A single cheap regex for walking a message once. It stops at
+    # every '@', '(', '.' and ':' and captures a mention or emoticon where
+    # there is one. URLs are only looked for around a '.' or ':'.
+    re_all = re.compile(r'[@(.:](?:(?<=@)(\w+)|(?<=\()(\w{1,15})(?=\)))?')
+
+    # (note): No mention, emoticon or URL has whitespace in it, and none
+    # depend on more than the character before or after them. Splitting
+    # a message after a whitespace character therefore gives chunks that
+    # can be strained on their own, with the same results.
+    re_whitespace = re.compile(r'[ \t\n\r\f\v]')
+
+    # (note): Messages longer than parallel_threshold characters, like
+    # pasted logs, are split into chunks of about parallel_chunk_size and
+    # strained on a pool of processes, each using a core of its own. None
+    # turns this off. The pool has a process per core unless processes
+    # is set.
+    parallel_threshold = 256 * 1024
+
+    parallel_chunk_size = 64 * 1024
+
+    processes = None
+
+    _process_pool = None
 
     @classmethod
+    @metrics.timed(metrics.stage('strain_mentions'))
     def strain_mentions(cls, message):
         """ Returns all mentions in a chat message
 
@@ -28,6 +54,7 @@ class MessageStrainer(object):
         return cls.re_mentions.findall(message)
 
     @classmethod
+    @metrics.timed(metrics.stage('strain_urls'))
     def strain_urls(cls, message):
         """ Returns all emoticons used in a chat message
 
@@ -38,9 +65,10 @@ class MessageStrainer(object):
         :rtype: list of strings
         """
 
-        return cls.re_url.findall(message)
+        return URLFinder.find_urls(message)
 
     @classmethod
+    @metrics.timed(metrics.stage('strain_emoticons'))
     def strain_emoticons(cls, message):
         """ Returns all emoticons used in a chat message
 
@@ -52,3 +80,232 @@ class MessageStrainer(object):
         """
 
         return cls.re_emoticons.findall(message)
+
+    @classmethod
+    def iter_mentions(cls, message, limit=None):
+        """ Yields mentions in a chat message, as they're found
+
+        :param message: the chat string to find mentions in
+        :type message: string
+        :param limit: max. number of mentions, or None for all
+        :type limit: int
+
+        :return: each mention, and the start and end of it in the
+            message, '@' included
+        :rtype: iterator of tuples
+        """
+
+        for match in itertools.islice(cls.re_mentions.finditer(message),
+                                      limit):
+            yield match.group(1), match.start(), match.end()
+
+    @classmethod
+    def iter_emoticons(cls, message, limit=None):
+        """ Yields emoticons in a chat message, as they're found
+
+        :param message: the chat string to find emoticons in
+        :type message: string
+        :param limit: max. number of emoticons, or None for all
+        :type limit: int
+
+        :return: each emoticon, and the start and end of it in the
+            message, parentheses included
+        :rtype: iterator of tuples
+        """
+
+        for match in itertools.islice(cls.re_emoticons.finditer(message),
+                                      limit):
+            yield match.group(1), match.start(), match.end()
+
+    @classmethod
+    def iter_urls(cls, message, limit=None):
+        """ Yields URLs in a chat message, as they're found
+
+        :param message: the chat string to find urls in
+        :type message: string
+        :param limit: max. number of urls, or None for all
+        :type limit: int
+
+        :return: each url, and the start and end of it in the message
+        :rtype: iterator of tuples
+        """
+
+        for start, end in itertools.islice(URLFinder.iter_urls(message),
+                                           limit):
+            yield message[start:end], start, end
+
+    @classmethod
+    def iter_all(cls, message):
+        """ Yields mentions, emoticons and URLs in a chat message, in the
+        order they're found in, walking the message once
+
+        :param message: the chat string to strain
+        :type message: string
+
+        :return: 'mentions', 'emoticons' or 'urls', and each match with
+            its start and end, as given by iter_mentions, iter_emoticons
+            and iter_urls
+        :rtype: iterator of tuples
+        """
+
+        url_finder = URLFinder(message)
+        for match in cls.re_all.finditer(message):
+            mention, emoticon = match.groups()
+            if mention is not None:
+                yield 'mentions', mention, match.start(), match.end()
+            elif emoticon is not None:
+                # (note): The closing parenthesis is only looked ahead at
+                yield 'emoticons', emoticon, match.start(), match.end() + 1
+            elif (match.group() in '.:' and
+                  match.start() >= url_finder.scanned):
+                for start, end in url_finder.match_at(match.start()):
+                    yield 'urls', message[start:end], start, end
+
+    @classmethod
+    @metrics.timed(metrics.stage('strain_all'))
+    def strain_all(cls, message, limit=None, spans=False):
+        """ Returns all mentions, emoticons and URLs in a chat message
+
+        This is equivalent to calling strain_mentions, strain_emoticons
+        and strain_urls, but the message is walked only once. Very long
+        messages are strained in parallel, unless a limit or spans are
+        asked for.
+
+        With a limit, no more than that many mentions, emoticons and URLs
+        are returned each, and the message is scanned for each only until
+        there are that many.
+
+        :param message: the chat string to strain
+        :type message: string
+        :param limit: max. number of results of each kind, or None for all
+        :type limit: int
+        :param spans: whether to return the start and end of each result,
+            as iter_all does
+        :type spans: bool
+
+        :return: lists of all mentions, emoticons and urls, as strings or
+            with spans, as (string, start, end)
+        :rtype: tuple of three lists
+        """
+
+        if limit is not None or spans:
+            return cls._strain_limited(message, limit, spans)
+        if (cls.parallel_threshold is not None and
+                len(message) > cls.parallel_threshold):
+            return cls.strain_parallel(message)
+        return cls._strain_all(message)
+
+    @classmethod
+    def strain_parallel(cls, message):
+        """ Returns all mentions, emoticons and URLs in a chat message,
+        straining chunks of it on a pool of processes
+
+        :param message: the chat string to strain
+        :type message: string
+
+        :return: lists of all mentions, emoticons and urls
+        :rtype: tuple of three lists of strings
+        """
+
+        # (note): Imported only here, so straining alone doesn't load
+        # eventlet
+        from eventlet import tpool
+
+        chunks = cls.split(message, cls.parallel_chunk_size)
+        process_pool = cls._get_process_pool()
+        # (note): Waits for the processes on a thread, so other green
+        # threads aren't blocked meanwhile
+        results = tpool.execute(process_pool.map, _strain_chunk, chunks)
+
+        mentions = []
+        emoticons = []
+        urls = []
+        for chunk_mentions, chunk_emoticons, chunk_urls in results:
+            mentions.extend(chunk_mentions)
+            emoticons.extend(chunk_emoticons)
+            urls.extend(chunk_urls)
+        return mentions, emoticons, urls
+
+    @classmethod
+    def split(cls, message, size):
+        """ Splits a message into chunks that can be strained on their own
+
+        Each chunk is cut after the first whitespace character from size
+        characters on, so chunks may be longer than size if there's a long
+        run of characters without whitespace.
+
+        :param message: the chat string to split
+        :type message: string
+        :param size: number of characters to cut chunks at
+        :type size: int
+
+        :return: chunks of the message
+        :rtype: list of strings
+        """
+
+        chunks = []
+        start = 0
+        while len(message) - start > size:
+            match = cls.re_whitespace.search(message, start + size)
+            if not match:
+                break
+            chunks.append(message[start:match.end()])
+            start = match.end()
+        chunks.append(message[start:])
+        return chunks
+
+    @classmethod
+    def _get_process_pool(cls):
+        if cls._process_pool is None:
+            cls._process_pool = multiprocessing.Pool(cls.processes)
+        return cls._process_pool
+
+    @classmethod
+    def _strain_all(cls, message):
+        """Strains a message in a single pass"""
+
+        mentions = []
+        emoticons = []
+        urls = []
+        url_finder = URLFinder(message)
+
+        for match in cls.re_all.finditer(message):
+            mention, emoticon = match.groups()
+            if mention is not None:
+                mentions.append(mention)
+            elif emoticon is not None:
+                emoticons.append(emoticon)
+            elif (match.group() in '.:' and
+                  match.start() >= url_finder.scanned):
+                for start, end in url_finder.match_at(match.start()):
+                    urls.append(message[start:end])
+
+        return mentions, emoticons, urls
+
+    @classmethod
+    def _strain_limited(cls, message, limit, spans):
+        """Strains a message up to limit results of each kind, with spans
+        if asked for"""
+
+        if limit is None:
+            found = {'mentions': [], 'emoticons': [], 'urls': []}
+            for kind, text, start, end in cls.iter_all(message):
+                found[kind].append((text, start, end))
+            results = found['mentions'], found['emoticons'], found['urls']
+        else:
+            # (note): Each kind is found separately, so each stops as soon
+            # as it has enough, rather than walking the message until all
+            # of them have
+            results = (list(cls.iter_mentions(message, limit)),
+                       list(cls.iter_emoticons(message, limit)),
+                       list(cls.iter_urls(message, limit)))
+
+        if spans:
+            return results
+        return tuple([text for text, _, _ in kind] for kind in results)
+
+
+def _strain_chunk(chunk):
+    # (note): Functions run on a process pool must be picklable, which
+    # class methods aren't in Python 2
+    return MessageStrainer._strain_all(chunk)
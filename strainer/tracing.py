@@ -0,0 +1,81 @@
+import binascii
+import itertools
+import logging
+import os
+import re
+
+import greenlet
+
+
+# (note): IDs given by clients are only kept if they're short and plain,
+# so they can't garble the log lines they end up in
+VALID_REQUEST_ID = re.compile(r'^[\w.\-]{1,64}\Z')
+
+_pid = None
+
+_prefix = None
+
+_counter = itertools.count(1)
+
+
+def new_request_id():
+    """ Generates a request ID
+
+    IDs are a random prefix, made again in each process, and a counter,
+    which is much cheaper than a UUID and still unique across the
+    processes of a server.
+
+    :rtype: string
+    """
+
+    global _pid, _prefix
+    if os.getpid() != _pid:
+        _pid = os.getpid()
+        _prefix = binascii.hexlify(os.urandom(6)).decode('ascii') + '-'
+    return _prefix + str(next(_counter))
+
+
+def valid_request_id(request_id):
+    return bool(request_id and VALID_REQUEST_ID.match(request_id))
+
+
+def get_request_id():
+    """Returns the ID of the request the current green thread works on"""
+
+    return getattr(greenlet.getcurrent(), 'request_id', None)
+
+
+def set_request_id(request_id):
+    """Sets the ID of the request the current green thread works on"""
+
+    # (note): It's kept on the green thread itself, which is much cheaper
+    # than a green thread local
+    greenlet.getcurrent().request_id = request_id
+
+
+def start_request(request_id=None):
+    """ Sets the ID of the request the current green thread starts on:
+    the one the client sent, if it's valid, or a new one
+
+    (note): valid_request_id and set_request_id in one call, as it's made
+    for every request
+
+    :param request_id: ID the client sent, or None
+    :type request_id: string
+
+    :return: ID of the request
+    :rtype: string
+    """
+
+    if request_id is None or not VALID_REQUEST_ID.match(request_id):
+        request_id = new_request_id()
+    greenlet.getcurrent().request_id = request_id
+    return request_id
+
+
+class RequestIdFilter(logging.Filter):
+    """Adds the current request ID to log records as 'request_id'"""
+
+    def filter(self, record):
+        record.request_id = get_request_id() or '-'
+        return True
@@ -0,0 +1,443 @@
+import re
+
+# (note): Not from requests.compat, so finding URLs doesn't load requests
+from urlparse import urlsplit
+from urlparse import urlunparse
+
+import util
+
+
+# (note): Ports left out of normalized URLs, by scheme
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+class URLFinder(object):
+    """Finds URLs in a chat message in time linear to its length
+
+    This finds the same URLs as util.WEB_URL_REGEX. The regex backtracks
+    over its nested quantifiers and TLD alternations at every word of a
+    message, which gets very slow on inputs like long runs of dots or
+    parentheses. Instead, URLs are only looked for around a '.' or ':',
+    within the run of URL_RUN_CHARS there, and a top-level domain is a set
+    lookup. Each character of the message is looked at a bounded number of
+    times.
+    """
+
+    re_trigger = re.compile(r'[.:]')
+
+    re_run = re.compile(r'[a-z0-9.\-]*', re.IGNORECASE)
+
+    re_label = re.compile(r'[.\-]')
+
+    re_chain = re.compile(r'[a-z0-9]+(?:[.\-][a-z0-9]+)*$', re.IGNORECASE)
+
+    re_word = re.compile(r'\w')
+
+    re_scheme_next = re.compile(r'[/a-z0-9%]', re.IGNORECASE)
+
+    # (note): The following are the pieces of util.WEB_URL_REGEX matching
+    # the path after the scheme or the domain name.
+    re_path_chars = re.compile(r'[^\s()<>{}\[\]]*')
+
+    re_nested_parens = re.compile(r'\([^\s()]*?\([^\s()]+\)[^\s()]*?\)')
+
+    re_final_char = re.compile(util.URL_FINAL_CHAR)
+
+    re_non_space = re.compile(r'\S*')
+
+    re_space = re.compile(r'\s')
+
+    def __init__(self, message):
+        self.message = message
+        # (note): URLs don't overlap, so nothing before this position is
+        # looked at again
+        self.scanned = 0
+        self._path_ends = {}
+        # (note): Start and end of the last token looked for, so a token
+        # with many URLs in it is only scanned to its end once
+        self._token = (0, 0)
+
+    @classmethod
+    def find_urls(cls, message):
+        """ Returns all URLs in a chat message
+
+        :param message: the chat string to find urls in
+        :type message: string
+
+        :return: list of all urls
+        :rtype: list of strings
+        """
+
+        return [message[start:end] for start, end in cls.iter_urls(message)]
+
+    @classmethod
+    def iter_urls(cls, message):
+        """ Yields the spans of URLs in a chat message, as they're found
+
+        :param message: the chat string to find urls in
+        :type message: string
+
+        :return: (start, end) spans of the urls
+        :rtype: iterator of tuples of ints
+        """
+
+        finder = cls(message)
+        for match in cls.re_trigger.finditer(message):
+            if match.start() >= finder.scanned:
+                for span in finder.match_at(match.start()):
+                    yield span
+
+    def match_at(self, pos):
+        """ Finds URLs starting in the run of URL characters around pos
+
+        Positions must be given in increasing order.
+
+        :param pos: position of a '.' or ':' in the message
+        :type pos: int
+
+        :return: (start, end) spans of the urls found
+        :rtype: list of tuples of ints
+        """
+
+        message = self.message
+        if pos < self.scanned:
+            return []
+
+        start = pos
+        while (start > self.scanned and
+               message[start - 1] in util.URL_RUN_CHARS):
+            start -= 1
+        end = self.re_run.match(message, pos).end()
+        self.scanned = end
+
+        run = message[start:end]
+        if not self._may_contain_url(run, message[end:end + 1]):
+            return []
+
+        boundary = self._is_boundary(start)
+        dot, domain_end = self._domain_end(run, start, end)
+        spans = None
+        if (boundary and message[start - 1:start] != '@' and
+                self.re_chain.match(message, start, end)):
+            spans = self._match_chain(run, start, end, dot, domain_end)
+        if spans is None:
+            spans = self._match_labels(run, start, end, boundary, dot,
+                                       domain_end)
+        if spans:
+            self.scanned = max(end, spans[-1][1])
+        return spans
+
+    def _match_chain(self, run, start, end, dot, domain_end):
+        """Finds a URL in a run like 'www.example.com'
+
+        When the run is a single chain of labels with a word boundary at
+        its start, a URL that ends the run can only start at its start.
+
+        :return: spans of the URLs, or None if the run needs a closer look
+        :rtype: list of tuples of ints
+        """
+
+        url_end = None
+        if self.message[end:end + 1] == ':' and run.lower() in ('http',
+                                                                'https'):
+            url_end = self._match_scheme(end)
+        if not url_end and dot is not None and start < dot:
+            url_end = domain_end
+        if not url_end:
+            url_end = self._bare_domain_end(start, end, end)[1]
+        if url_end and url_end >= end:
+            return [(start, url_end)]
+        return None
+
+    def _match_labels(self, run, start, end, boundary, dot, domain_end):
+        """Finds URLs starting anywhere in a run"""
+
+        message = self.message
+        # (note): The run is split into labels at each separator, e.g.
+        # 'www.example.com' into ['www', 'example', 'com']. Labels may be
+        # empty, e.g. in 'example..com'.
+        labels = self.re_label.split(run)
+        offsets = []
+        offset = start
+        for i, label in enumerate(labels):
+            offsets.append(offset)
+            offset += len(label) + 1
+
+        spans = []
+        last = len(labels) - 1
+        chain_end = -1
+        # (note): Try each position a URL may start at, in order, the same
+        # way the alternatives of the regex are tried. Only the start of
+        # the run needs a proper look for a word boundary; after that,
+        # labels start after a separator and a separator follows a label
+        # or another separator.
+        for i, label in enumerate(labels):
+            sep_pos = offsets[i] - 1
+            if i and sep_pos >= start and (labels[i - 1] if i > 1 or
+                                           labels[0] else boundary):
+                # (note): A URL may start at a separator following a word
+                # character, only with a domain name and a path.
+                if dot is not None and sep_pos < dot:
+                    spans.append((sep_pos, domain_end))
+                    break
+            if not label or offsets[i] < start or not (i or boundary):
+                continue
+
+            url_end = None
+            if (i == last and message[end:end + 1] == ':' and
+                    label.lower() in ('http', 'https')):
+                url_end = self._match_scheme(end)
+            if not url_end and dot is not None and offsets[i] < dot:
+                url_end = domain_end
+            if not url_end and message[sep_pos:offsets[i]] != '@':
+                if i > chain_end:
+                    chain_end = i
+                    while chain_end < last and labels[chain_end + 1]:
+                        chain_end += 1
+                    tld, bare_end = self._bare_domain_end(
+                        offsets[i], offsets[chain_end] +
+                        len(labels[chain_end]), end)
+                if tld > offsets[i]:
+                    url_end = bare_end
+            if url_end:
+                spans.append((offsets[i], url_end))
+                if url_end >= end:
+                    break
+                start = url_end
+        return spans
+
+    @staticmethod
+    def _may_contain_url(run, next_char):
+        """Tells if a URL can start within a run of URL_RUN_CHARS
+
+        A URL either starts with a scheme or has a top-level domain after
+        a separator, both of which are cheap to look for. False positives
+        are fine, the run is looked at closely afterwards.
+        """
+
+        run = run.lower()
+        if next_char == ':' and run.endswith(('http', 'https')):
+            return True
+        labels = run.replace('-', '.').split('.')
+        return not util.TLDS.isdisjoint(labels[1:])
+
+    def _is_boundary(self, pos):
+        """Tells if there is a word boundary (regex '\\b') at pos"""
+
+        before = pos > 0 and self.re_word.match(self.message, pos - 1)
+        after = self.re_word.match(self.message, pos)
+        return bool(before) != bool(after)
+
+    def _domain_end(self, run, start, end):
+        """Returns the end of a URL like 'example.com/path' in the run
+
+        Such a URL ends the run in a top-level domain followed by '/' and
+        a path. It can start anywhere in the run before the last '.', so
+        this is the same for every start and is worked out once.
+
+        :return: position of the last '.' and the end of the URL, or Nones
+        :rtype: tuple of ints
+        """
+
+        if self.message[end:end + 1] != '/':
+            return None, None
+        sep = max(run.rfind('.'), run.rfind('-'))
+        if (sep < 0 or run[sep] != '.' or
+                run[sep + 1:].lower() not in util.TLDS):
+            return None, None
+        path_end = self._match_path(end + 1)
+        if not path_end:
+            return None, None
+        return start + sep, path_end
+
+    def _match_scheme(self, end):
+        """Returns the end of a URL like 'http://example.com' or None
+
+        :param end: position of the ':' following the scheme
+        :type end: int
+        """
+
+        if not self.re_scheme_next.match(self.message, end + 1):
+            return None
+        return self._match_path(end + 2)
+
+    def _bare_domain_end(self, first, last, end):
+        """Returns the last top-level domain in a chain of labels
+
+        This is the longest URL like 'www.example.com' in the chain
+        message[first:last], for any start before the returned position.
+
+        :return: position of the '.' before the top-level domain (-1 if
+            there's none) and the end of the URL
+        :rtype: tuple of ints
+        """
+
+        message = self.message
+        label_end = last
+        while True:
+            sep = max(message.rfind('.', first, label_end),
+                      message.rfind('-', first, label_end))
+            if sep < 0:
+                return -1, None
+            if (message[sep] == '.' and
+                    message[sep + 1:label_end].lower() in util.TLDS):
+                if label_end < end:
+                    # (note): followed by a separator
+                    return sep, label_end
+                next_char = message[end:end + 1]
+                if next_char == '/':
+                    if message[end + 1:end + 2] == '@':
+                        return sep, end
+                    return sep, end + 1
+                if next_char != '@' and not (
+                        next_char and self.re_word.match(next_char)):
+                    return sep, end
+            label_end = sep
+
+    def _match_path(self, start):
+        """Returns the end of a URL whose path starts at start, or None
+
+        The path is one or more runs of non-space characters or groups in
+        parentheses, followed by one more such group or a character that
+        isn't punctuation.
+        """
+
+        message = self.message
+        run_end = self.re_path_chars.match(message, start).end()
+        if message[run_end:run_end + 1] == '(':
+            return self._match_path_with_parens(start)
+
+        # (note): Without parentheses, the path is the longest run of path
+        # characters that ends in a character allowed at the end of a URL.
+        pos = run_end
+        while pos > start + 1:
+            if self.re_final_char.match(message, pos - 1):
+                return pos
+            pos -= 1
+        return None
+
+    def _match_path_with_parens(self, start):
+        """Returns the end of a path with parentheses, or None
+
+        Groups in parentheses can be matched in several ways by the regex,
+        and which one it ends up with depends on the order it backtracks
+        in. To get the same result without backtracking, this works out
+        where the regex would end the URL from every position of the
+        token (the run of non-space characters) the path is in, right to
+        left, so each position is only looked at once.
+        """
+
+        token_end = self._token_end(start)
+        if (token_end not in self._path_ends or
+                self._path_ends[token_end][0] > start):
+            self._path_ends[token_end] = self._path_ends_in_token(start,
+                                                                  token_end)
+        first, ends = self._path_ends[token_end]
+        # (note): The path must have at least one part before its end.
+        return ends[start - first][1]
+
+    def _token_end(self, start):
+        """Returns the end of the token (run of non-space characters) that
+        start is in"""
+
+        first, end = self._token
+        if not first <= start < end:
+            end = self.re_non_space.match(self.message, start).end()
+            self._token = (start, end)
+        return end
+
+    def _path_ends_in_token(self, first, token_end):
+        """Works out where a path ends from every position of a token
+
+        :return: the first position and, for each position from there, the
+            end of the URL when the path continues there after one of its
+            parts, and when the path starts there
+        :rtype: tuple of int and list of tuples
+        """
+
+        message = self.message
+        size = token_end - first
+        # (note): ends[i] is (continued, started) for position first + i
+        ends = [(None, None)] * (size + 1)
+        # (note): The first ')' from a position, and the first one after
+        # which the path can be continued.
+        next_close = [None] * (size + 2)
+        next_good_close = [None] * (size + 2)
+        run_best = None
+        for i in range(size - 1, -1, -1):
+            pos = first + i
+            char = message[pos]
+            if message[pos + 1:pos + 2] == ')':
+                next_close[i + 1] = pos + 1
+                if ends[i + 2][0] is not None:
+                    next_good_close[i + 1] = pos + 1
+                else:
+                    next_good_close[i + 1] = next_good_close[i + 2]
+            else:
+                next_close[i + 1] = next_close[i + 2]
+                next_good_close[i + 1] = next_good_close[i + 2]
+
+            part_end = None
+            final_end = None
+            if char == '(':
+                run_best = None
+                nested = self.re_nested_parens.match(message, pos)
+                if nested and ends[nested.end() - first][0] is not None:
+                    part_end = ends[nested.end() - first][0]
+                elif next_good_close[i + 2] is not None:
+                    close = next_good_close[i + 2]
+                    part_end = ends[close + 1 - first][0]
+                if nested:
+                    final_end = nested.end()
+                elif next_close[i + 2] is not None:
+                    final_end = next_close[i + 2] + 1
+            elif char not in ')<>{}[]':
+                # (note): The regex takes the longest run of path characters
+                # it can continue after.
+                following = message[pos + 1:pos + 2]
+                if following in ('', '(', ')', '<', '>', '{', '}', '[',
+                                 ']') or self.re_space.match(following):
+                    run_best = None
+                if run_best is None and ends[i + 1][0] is not None:
+                    run_best = i + 1
+                if run_best is not None:
+                    part_end = ends[run_best][0]
+                if self.re_final_char.match(message, pos):
+                    final_end = pos + 1
+            else:
+                run_best = None
+            ends[i] = (part_end if part_end is not None else final_end,
+                       part_end)
+        return first, ends
+
+
+def normalize_url(url):
+    """ Returns a URL without differences that don't change what it's
+    fetched from: the case of the scheme and host name, a default port,
+    an empty path and the fragment
+
+    :param url: url to normalize
+    :type url: string
+
+    :return: the normalized url, or the url as is if it has no host
+    :rtype: string
+    """
+
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        # (note): Raised for invalid ports or IPv6 addresses
+        return url
+    if not parts.netloc:
+        return url
+
+    scheme = parts.scheme.lower()
+    host = parts.hostname or ''
+    if ':' in host:
+        host = '[%s]' % host
+    if port is not None and port != DEFAULT_PORTS.get(scheme):
+        host += ':%d' % port
+    userinfo, at, _ = parts.netloc.rpartition('@')
+    return urlunparse((scheme, userinfo + at + host, parts.path or '/', '',
+                       parts.query, ''))
@@ -1,11 +1,21 @@
+import os
+import shutil
+import tempfile
+import time
 import unittest
 
+import requests_mock
+
 try:
     import simplejson as json
 except ImportError:
     import json
 
 from strainer import api as strainer_api
+from strainer.fetcher import TitleFetcher
+from strainer import metrics
+from strainer.profiling import Profiler
+from strainer.responses import ResponseCache
 
 
 class TestStrainerAPI(unittest.TestCase):
@@ -153,6 +163,250 @@ class TestStrainerAPI(unittest.TestCase):
                    }
         self.assertDictEqual(expected, actual)
 
+    def test_strainer_URLs_timed_out(self):
+        message = 'Is this up yet? http://very.slow'
+        body = json.dumps({'message': message})
+        kwargs = {'data': body,
+                  'content_type': 'application/json'}
+
+        deadline = strainer_api.app.config['FETCH_DEADLINE']
+        strainer_api.app.config['FETCH_DEADLINE'] = 0
+        try:
+            resp = self.app.post('/strainers', **kwargs)
+        finally:
+            strainer_api.app.config['FETCH_DEADLINE'] = deadline
+
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual('application/json', resp.content_type)
+        actual = json.loads(resp.data)
+        expected = {
+                      "links": [
+                        {
+                          "url": "http://very.slow",
+                          "title": "",
+                          "timed_out": True
+                        }
+                      ]
+                   }
+        self.assertDictEqual(expected, actual)
+
+    def test_strainer_streamed_ndjson(self):
+        message = '@bob (success) http://streamed.link http://streamed.link'
+        body = json.dumps({'message': message})
+        kwargs = {'data': body,
+                  'content_type': 'application/json',
+                  'headers': {'Accept': 'application/x-ndjson'}}
+
+        TitleFetcher.cache.clear()
+        with requests_mock.mock() as mock:
+            mock.get('http://streamed.link', text='<title>Streamed</title>')
+            resp = self.app.post('/strainers', **kwargs)
+            actual = [json.loads(line) for line in resp.data.splitlines()]
+
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual('application/x-ndjson', resp.content_type)
+        expected = [
+                     {"mentions": ["bob"], "emoticons": ["success"]},
+                     {
+                       "link": {"url": "http://streamed.link",
+                                "title": "Streamed"}
+                     },
+                     {"done": True}
+                   ]
+        self.assertEqual(expected, actual)
+
+    def test_strainer_streamed_event_stream(self):
+        message = '@chris you around?'
+        body = json.dumps({'message': message})
+        kwargs = {'data': body,
+                  'content_type': 'application/json',
+                  'headers': {'Accept': 'text/event-stream'}}
+
+        resp = self.app.post('/strainers', **kwargs)
+
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual('text/event-stream', resp.mimetype)
+        events = resp.data.decode('utf-8').split('\n\n')
+        self.assertEqual('', events.pop())
+        actual = [json.loads(event[len('data: '):]) for event in events]
+        self.assertEqual([{"mentions": ["chris"]}, {"done": True}], actual)
+
+    def test_strainer_spans(self):
+        message = '@bob (coffee) http://titled.link @ann'
+        body = json.dumps({'message': message, 'spans': True})
+        kwargs = {'data': body,
+                  'content_type': 'application/json'}
+
+        TitleFetcher.cache.clear()
+        with requests_mock.mock() as mock:
+            mock.get('http://titled.link', text='<title>Titled</title>')
+            resp = self.app.post('/strainers', **kwargs)
+
+        self.assertEqual(200, resp.status_code)
+        actual = json.loads(resp.data)
+        self.assertEqual(["bob", "ann"], actual['mentions'])
+        expected = {
+                     "mentions": [[0, 4], [33, 37]],
+                     "emoticons": [[5, 13]],
+                     "links": [[14, 32]]
+                   }
+        self.assertDictEqual(expected, actual['spans'])
+
+    def test_strainer_spans_invalid(self):
+        body = json.dumps({'message': '@bob', 'spans': 'yes'})
+        kwargs = {'data': body,
+                  'content_type': 'application/json'}
+
+        resp = self.app.post('/strainers', **kwargs)
+
+        self.assertEqual(400, resp.status_code)
+        self.assertEqual('application/json', resp.content_type)
+
+    def test_strainer_max_results(self):
+        message = '@a @b @c (x) (y) (z) @d'
+        body = json.dumps({'messages': [message], 'spans': True})
+        kwargs = {'data': body,
+                  'content_type': 'application/json'}
+
+        strainer_api.app.config['MAX_RESULTS'] = 2
+        try:
+            resp = self.app.post('/strainers/batch', **kwargs)
+        finally:
+            strainer_api.app.config['MAX_RESULTS'] = None
+
+        self.assertEqual(200, resp.status_code)
+        expected = {
+                     "results": [
+                       {
+                         "mentions": ["a", "b"],
+                         "emoticons": ["x", "y"],
+                         "spans": {
+                           "mentions": [[0, 2], [3, 5]],
+                           "emoticons": [[9, 12], [13, 16]]
+                         }
+                       }
+                     ]
+                   }
+        self.assertDictEqual(expected, json.loads(resp.data))
+
+    def test_strainer_shed_in_flight(self):
+        body = json.dumps({'message': '@chris you around?'})
+        kwargs = {'data': body,
+                  'content_type': 'application/json'}
+
+        # (note): The request itself is in flight
+        strainer_api.app.config['MAX_IN_FLIGHT'] = 0
+        strainer_api.app.config['RETRY_AFTER'] = 3
+        try:
+            resp = self.app.post('/strainers', **kwargs)
+            metrics_resp = self.app.get('/metrics')
+        finally:
+            strainer_api.app.config['MAX_IN_FLIGHT'] = None
+            strainer_api.app.config['RETRY_AFTER'] = 1
+
+        self.assertEqual(503, resp.status_code)
+        self.assertEqual('3', resp.headers['Retry-After'])
+        self.assertIn('error', json.loads(resp.data))
+        self.assertEqual(200, metrics_resp.status_code)
+        self.assertIn('strainer_requests_shed_total 1', metrics_resp.data)
+
+    def test_strainer_cached_titles_while_fetches_backed_up(self):
+        message = '@chris http://cached.link http://uncached.link'
+        body = json.dumps({'message': message})
+        kwargs = {'data': body,
+                  'content_type': 'application/json'}
+        TitleFetcher.cache.set('http://cached.link', u'Cached')
+
+        strainer_api.app.config['MAX_FETCH_WAIT'] = 0.5
+        TitleFetcher.backend.queue_wait.observe(10)
+        try:
+            with requests_mock.mock() as mock:
+                resp = self.app.post('/strainers', **kwargs)
+        finally:
+            strainer_api.app.config['MAX_FETCH_WAIT'] = None
+            TitleFetcher.backend.queue_wait.clear()
+            TitleFetcher.cache.clear()
+
+        self.assertEqual(200, resp.status_code)
+        self.assertFalse(mock.called)
+        expected = {
+                     "mentions": ["chris"],
+                     "links": [
+                       {
+                         "url": "http://cached.link",
+                         "title": "Cached"
+                       },
+                       {
+                         "url": "http://uncached.link",
+                         "title": "",
+                         "timed_out": True
+                       }
+                     ]
+                   }
+        self.assertDictEqual(expected, json.loads(resp.data))
+
+    def test_strainer_ready(self):
+        resp = self.app.get('/ready')
+        self.assertEqual(200, resp.status_code)
+        self.assertDictEqual({'ready': True}, json.loads(resp.data))
+
+        strainer_api.app.config['READY'] = False
+        try:
+            resp = self.app.get('/ready')
+        finally:
+            strainer_api.app.config['READY'] = True
+        self.assertEqual(503, resp.status_code)
+        self.assertDictEqual({'ready': False}, json.loads(resp.data))
+
+    def test_strainer_warm_up(self):
+        in_flight = strainer_api.IN_FLIGHT.get()
+        with requests_mock.mock() as mock:
+            took = strainer_api.warm_up()
+        self.assertGreater(took, 0)
+        self.assertFalse(mock.called)
+        self.assertEqual(in_flight, strainer_api.IN_FLIGHT.get())
+
+    def test_strainer_profiling_not_set_up(self):
+        resp = self.app.get('/admin/profiling')
+        self.assertEqual(404, resp.status_code)
+
+    def test_strainer_profiling(self):
+        directory = tempfile.mkdtemp()
+        strainer_api.app.config['PROFILER'] = Profiler(directory)
+        # (note): Buffering closes the response, as a server would
+        kwargs = {'data': json.dumps({'message': '@chris (coffee)'}),
+                  'content_type': 'application/json',
+                  'headers': {'X-Profile': '1'},
+                  'buffered': True}
+        try:
+            self.app.post('/strainers', **kwargs)
+            self.assertEqual([], os.listdir(directory))
+
+            resp = self.app.post('/admin/profiling',
+                                 data=json.dumps({'enabled': True}),
+                                 content_type='application/json')
+            self.assertEqual(200, resp.status_code)
+            self.assertDictEqual({'enabled': True, 'rate': 0,
+                                  'directory': directory, 'profiled': 0},
+                                 json.loads(resp.data))
+
+            self.app.post('/strainers', **kwargs)
+            self.assertEqual(1, len(os.listdir(directory)))
+            resp = self.app.get('/admin/profiling')
+            self.assertEqual(1, json.loads(resp.data)['profiled'])
+
+            resp = self.app.post('/admin/profiling',
+                                 data=json.dumps({'rate': 2}),
+                                 content_type='application/json')
+            self.assertEqual(400, resp.status_code)
+
+            resp = self.app.get('/admin/profiling',
+                                environ_base={'REMOTE_ADDR': '10.0.0.1'})
+            self.assertEqual(403, resp.status_code)
+        finally:
+            strainer_api.app.config['PROFILER'] = None
+            shutil.rmtree(directory)
+
     def test_strainer_all_included(self):
         message = ('@bob @john (success) such a cool feature; '
                    'https://twitter.com/jdorfman/status/430511497475670016')
@@ -180,3 +434,215 @@ class TestStrainerAPI(unittest.TestCase):
                     ]
                    }
         self.assertDictEqual(expected, actual)
+
+    def test_strainer_batch(self):
+        messages = ['@chris you around?',
+                    'Good morning! (megusta) (coffee)',
+                    'nothing to see here',
+                    '@bob http://dup.link (success)',
+                    'again http://dup.link and http://other.link']
+        body = json.dumps({'messages': messages})
+        kwargs = {'data': body,
+                  'content_type': 'application/json'}
+
+        TitleFetcher.cache.clear()
+        with requests_mock.mock() as mock:
+            mock.get('http://dup.link', text='<title>Dup</title>')
+            mock.get('http://other.link', text='<title>Other</title>')
+            resp = self.app.post('/strainers/batch', **kwargs)
+            # (note): Each unique link is only fetched once
+            self.assertEqual(2, mock.call_count)
+
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual('application/json', resp.content_type)
+        actual = json.loads(resp.data)
+        expected = {
+                      "results": [
+                        {"mentions": ["chris"]},
+                        {"emoticons": ["megusta", "coffee"]},
+                        {},
+                        {
+                          "mentions": ["bob"],
+                          "emoticons": ["success"],
+                          "links": [
+                            {"url": "http://dup.link", "title": "Dup"}
+                          ]
+                        },
+                        {
+                          "links": [
+                            {"url": "http://dup.link", "title": "Dup"},
+                            {"url": "http://other.link", "title": "Other"}
+                          ]
+                        }
+                      ]
+                   }
+        self.assertDictEqual(expected, actual)
+
+    def test_strainer_batch_empty(self):
+        body = json.dumps({'messages': []})
+        kwargs = {'data': body,
+                  'content_type': 'application/json'}
+
+        resp = self.app.post('/strainers/batch', **kwargs)
+
+        self.assertEqual(200, resp.status_code)
+        self.assertDictEqual({'results': []}, json.loads(resp.data))
+
+    def test_strainer_batch_invalid_body(self):
+        for body in [{'message': 'hi'}, {'messages': 'hi'},
+                     {'messages': ['hi', 42]}]:
+            kwargs = {'data': json.dumps(body),
+                      'content_type': 'application/json'}
+
+            resp = self.app.post('/strainers/batch', **kwargs)
+
+            self.assertEqual(400, resp.status_code)
+            self.assertEqual('application/json', resp.content_type)
+
+    def test_strainer_batch_too_big(self):
+        max_size = strainer_api.app.config['MAX_BATCH_SIZE']
+        body = json.dumps({'messages': ['hi'] * (max_size + 1)})
+        kwargs = {'data': body,
+                  'content_type': 'application/json'}
+
+        resp = self.app.post('/strainers/batch', **kwargs)
+
+        self.assertEqual(400, resp.status_code)
+        self.assertEqual('application/json', resp.content_type)
+
+    def _post_cached(self, messages, headers=None):
+        """Posts messages with a response cache, returning the responses
+        and the cache"""
+
+        responses = ResponseCache()
+        strainer_api.app.config['RESPONSE_CACHE'] = responses
+        try:
+            with requests_mock.mock() as mock:
+                mock.get('http://titled.link', text='<title>Titled</title>')
+                mock.get('http://dead.link', status_code=404)
+                resps = [self.app.post('/strainers',
+                                       data=json.dumps({'message': message}),
+                                       content_type='application/json',
+                                       headers=headers or {})
+                         for message in messages]
+        finally:
+            strainer_api.app.config['RESPONSE_CACHE'] = None
+        return resps, responses
+
+    def _expires_in(self, responses, message):
+        return responses._entries[ResponseCache.key(message)][1] - time.time()
+
+    def test_strainer_response_cache(self):
+        message = '@bob (coffee) http://titled.link'
+        strained = metrics.stage('strain_all').count
+        serialized = metrics.stage('serialize').count
+
+        TitleFetcher.cache.clear()
+        (first, second), responses = self._post_cached([message, message])
+
+        self.assertEqual(200, second.status_code)
+        self.assertEqual('application/json', second.content_type)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(1, responses.hits)
+        # (note): The second message isn't strained nor serialized again
+        self.assertEqual(strained + 1, metrics.stage('strain_all').count)
+        self.assertEqual(serialized + 1, metrics.stage('serialize').count)
+
+    def test_strainer_response_cache_ttl(self):
+        no_links = '@bob'
+        titled = 'http://titled.link'
+        dead = 'http://titled.link http://dead.link'
+
+        TitleFetcher.cache.clear()
+        _, responses = self._post_cached([no_links, titled, dead])
+
+        self.assertAlmostEqual(strainer_api.app.config['RESPONSE_CACHE_TTL'],
+                               self._expires_in(responses, no_links),
+                               delta=1)
+        self.assertAlmostEqual(TitleFetcher.cache.ttl,
+                               self._expires_in(responses, titled), delta=1)
+        self.assertAlmostEqual(TitleFetcher.cache.negative_ttl,
+                               self._expires_in(responses, dead), delta=1)
+
+    def test_strainer_response_cache_skips_timed_out(self):
+        deadline = strainer_api.app.config['FETCH_DEADLINE']
+        strainer_api.app.config['FETCH_DEADLINE'] = 0
+        TitleFetcher.cache.clear()
+        try:
+            _, responses = self._post_cached(['http://titled.link'])
+        finally:
+            strainer_api.app.config['FETCH_DEADLINE'] = deadline
+
+        self.assertEqual(0, len(responses))
+
+    def test_strainer_response_cache_skips_streams(self):
+        message = '@bob'
+        headers = {'Accept': 'application/x-ndjson'}
+
+        (resp,), responses = self._post_cached([message], headers=headers)
+
+        self.assertEqual('application/x-ndjson', resp.content_type)
+        self.assertEqual(0, len(responses))
+
+    def test_strainer_request_id(self):
+        body = json.dumps({'message': '@chris you around?'})
+        kwargs = {'data': body,
+                  'content_type': 'application/json'}
+
+        resp = self.app.post('/strainers', **kwargs)
+        other = self.app.post('/strainers', **kwargs)
+
+        self.assertTrue(resp.headers['X-Request-ID'])
+        self.assertNotEqual(resp.headers['X-Request-ID'],
+                            other.headers['X-Request-ID'])
+
+    def test_strainer_request_id_from_client(self):
+        body = json.dumps({'message': '@chris you around?'})
+        kwargs = {'data': body,
+                  'content_type': 'application/json',
+                  'headers': {'X-Request-ID': 'abc-123'}}
+
+        resp = self.app.post('/strainers', **kwargs)
+
+        self.assertEqual('abc-123', resp.headers['X-Request-ID'])
+
+    def test_strainer_invalid_request_id_from_client(self):
+        body = json.dumps({'message': '@chris you around?'})
+        for request_id in ('abc 123', 'abc\n'):
+            # (note): The test client won't send newlines in headers
+            kwargs = {'data': body,
+                      'content_type': 'application/json',
+                      'environ_overrides': {'HTTP_X_REQUEST_ID': request_id}}
+
+            resp = self.app.post('/strainers', **kwargs)
+
+            self.assertEqual(200, resp.status_code)
+            self.assertNotEqual(request_id, resp.headers['X-Request-ID'])
+
+    def test_metrics(self):
+        body = json.dumps({'message': '@chris http://metrics.link'})
+        # (note): Buffering closes the response, as a server would
+        kwargs = {'data': body,
+                  'content_type': 'application/json',
+                  'buffered': True}
+
+        TitleFetcher.cache.clear()
+        with requests_mock.mock() as mock:
+            mock.get('http://metrics.link', text='<title>Metrics</title>')
+            self.app.post('/strainers', **kwargs)
+
+        resp = self.app.get('/metrics')
+
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual('text/plain', resp.mimetype)
+        lines = resp.data.decode('utf-8').splitlines()
+        self.assertIn('# TYPE strainer_stage_seconds histogram', lines)
+        samples = dict(line.rsplit(' ', 1) for line in lines
+                       if not line.startswith('#'))
+        for stage in ('parse', 'strain_all', 'fetch_title', 'fetch_connect',
+                      'fetch_download', 'fetch_parse', 'serialize'):
+            count = 'strainer_stage_seconds_count{stage="%s"}' % stage
+            self.assertTrue(int(samples[count]) >= 1)
+        self.assertTrue(int(samples['strainer_request_seconds_count']) >= 1)
+        self.assertTrue(int(samples['strainer_requests_in_flight']) >= 1)
+        self.assertEqual('0', samples['strainer_fetch_pool_running'])
@@ -0,0 +1,143 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import requests_mock
+
+from strainer.archive import FetchArchive
+from strainer.archive import RecordingAdapter
+from strainer.archive import ReplayAdapter
+from strainer.connections import ConnectionPool
+from strainer.fetcher import TitleFetcher
+from strainer.hosts import Hosts
+
+
+class TestFetchArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.archive = FetchArchive(os.path.join(self.directory, 'a.db'),
+                                    max_body_bytes=10)
+
+    def tearDown(self):
+        self.archive.close()
+        shutil.rmtree(self.directory)
+
+    def test_archive_record(self):
+        self.archive.record('http://a.link/', 200,
+                            {'Content-Type': 'text/html',
+                             'Content-Encoding': 'gzip'},
+                            b'<title>A</title>', 0.5, 0.1)
+
+        self.assertEqual((200, {'Content-Type': 'text/html'},
+                          b'<title>A</', 0.5, 0.1),
+                         self.archive.get('http://a.link/'))
+        self.assertIsNone(self.archive.get('http://b.link/'))
+
+    def test_archive_keeps_latest(self):
+        self.archive.record('http://b.link/', 200, {}, b'b', 0)
+        self.archive.record('http://a.link/', 200, {}, b'old', 0)
+        self.archive.record('http://a.link/', 404, {}, b'new', 0)
+
+        self.assertEqual(404, self.archive.get('http://a.link/')[0])
+        self.assertEqual(['http://a.link/', 'http://b.link/'],
+                         self.archive.urls())
+        self.assertEqual(2, len(self.archive))
+
+
+class ArchivedFetcher(TitleFetcher):
+
+    hosts = Hosts()
+
+    connections = ConnectionPool()
+
+
+class TestFetcherArchive(unittest.TestCase):
+
+    def setUp(self):
+        TitleFetcher.cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.archive = FetchArchive(os.path.join(self.directory, 'a.db'))
+
+    def tearDown(self):
+        ArchivedFetcher.connections.use_transport(None)
+        self.archive.close()
+        shutil.rmtree(self.directory)
+
+    def record(self, mock):
+        # (note): requests_mock's adapter stands in for the network
+        ArchivedFetcher.connections.use_transport(
+            lambda adapter: RecordingAdapter(mock, self.archive))
+        return ArchivedFetcher.fetch_titles(
+            ['http://page.link/', 'http://moved.link/', 'http://image.link/'])
+
+    def mock(self):
+        mock = requests_mock.Adapter()
+        mock.register_uri('GET', 'http://page.link/',
+                          text='<title>Page</title>')
+        mock.register_uri('GET', 'http://moved.link/', status_code=301,
+                          headers={'Location': 'http://page.link/?moved'})
+        mock.register_uri('GET', 'http://page.link/?moved',
+                          text='<title>Moved</title>')
+        mock.register_uri('GET', 'http://image.link/', content=b'GIF89a',
+                          headers={'Content-Type': 'image/gif'})
+        return mock
+
+    def test_fetcher_record(self):
+        self.assertEqual([u'Page', u'Moved', u''], self.record(self.mock()))
+        self.assertEqual(['http://image.link/', 'http://moved.link/',
+                          'http://page.link/', 'http://page.link/?moved'],
+                         self.archive.urls())
+        status, headers, body, _, _ = self.archive.get('http://page.link/')
+        self.assertEqual(200, status)
+        self.assertEqual(b'<title>Page</title>', body)
+
+    def test_fetcher_replay(self):
+        self.record(self.mock())
+        TitleFetcher.cache.clear()
+
+        ArchivedFetcher.connections.use_transport(self.archive.replayer)
+        titles = ArchivedFetcher.fetch_titles(
+            ['http://page.link/', 'http://moved.link/', 'http://image.link/',
+             'http://unrecorded.link/'])
+
+        self.assertEqual([u'Page', u'Moved', u'', u''], titles)
+
+    def test_fetcher_replay_latency(self):
+        self.archive.record('http://slow.link/', 200, {},
+                            b'<title>Slow</title>', 0.2)
+        ArchivedFetcher.connections.use_transport(self.archive.replayer)
+
+        start = time.time()
+        self.assertEqual(u'Slow',
+                         ArchivedFetcher.fetch_title('http://slow.link/'))
+        self.assertGreaterEqual(time.time() - start, 0.2)
+
+        TitleFetcher.cache.clear()
+        ArchivedFetcher.connections.use_transport(
+            lambda adapter: ReplayAdapter(self.archive, latency_scale=0))
+        start = time.time()
+        self.assertEqual(u'Slow',
+                         ArchivedFetcher.fetch_title('http://slow.link/'))
+        self.assertLess(time.time() - start, 0.1)
+
+    def test_fetcher_replay_timeout(self):
+        self.archive.record('http://hung.link/', 200, {},
+                            b'<title>Hung</title>', 10)
+        adapter = ReplayAdapter(self.archive, sleep=lambda seconds: None)
+        ArchivedFetcher.connections.use_transport(lambda _: adapter)
+
+        self.assertEqual(u'', ArchivedFetcher.fetch_title('http://hung.link/'))
+
+    def test_fetcher_seed(self):
+        self.record(self.mock())
+        TitleFetcher.cache.clear()
+
+        self.assertEqual(3, ArchivedFetcher.seed(self.archive))
+        self.assertEqual(u'Page', TitleFetcher.cache.get('http://page.link/'))
+        self.assertEqual(u'Moved',
+                         TitleFetcher.cache.get('http://page.link/?moved'))
+        self.assertEqual(u'', TitleFetcher.cache.get('http://image.link/'))
+        self.assertIsNone(TitleFetcher.cache.get('http://moved.link/'))
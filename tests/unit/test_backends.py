@@ -0,0 +1,196 @@
+import threading
+import time
+import unittest
+
+import eventlet
+import requests_mock
+
+from strainer import backends
+from strainer.backends import GreenBackend
+from strainer.backends import RecentWait
+from strainer.backends import ThreadBackend
+from strainer.connections import ConnectionPool
+from strainer.fetcher import TitleFetcher
+from strainer.hosts import Hosts
+from strainer.resolver import Resolver
+
+
+class TestThreadBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = ThreadBackend(size=2)
+        self.done = self.backend.queue()
+
+    def test_backend_runs_fetches_concurrently(self):
+        start = time.time()
+        for i in range(2):
+            self.backend.spawn(lambda i: (time.sleep(0.1),
+                                          self.done.put(i)), i)
+        self.assertEqual(set([0, 1]),
+                         set([self.done.get(timeout=1) for _ in range(2)]))
+        self.assertLess(time.time() - start, 0.19)
+
+    def test_backend_bounded_by_size(self):
+        running = [0]
+        most = [0]
+        lock = threading.Lock()
+
+        def fetch(i):
+            with lock:
+                running[0] += 1
+                most[0] = max(most[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+            self.done.put(i)
+
+        for i in range(6):
+            self.backend.spawn(fetch, i)
+        self.assertEqual(range(6),
+                         sorted(self.done.get(timeout=1) for _ in range(6)))
+        self.assertEqual(2, most[0])
+
+    def test_backend_kill_cancels_queued_fetch(self):
+        release = threading.Event()
+        for i in range(2):
+            self.backend.spawn(lambda i: (release.wait(), self.done.put(i)),
+                               i)
+        queued = self.backend.spawn(self.done.put, 'killed')
+        queued.kill()
+        release.set()
+        self.assertEqual(set([0, 1]),
+                         set([self.done.get(timeout=1) for _ in range(2)]))
+        self.backend.spawn(self.done.put, 2)
+        self.assertEqual(2, self.done.get(timeout=1))
+
+    def test_backend_semaphore(self):
+        semaphore = self.backend.semaphore(1)
+        with semaphore:
+            self.assertEqual(0, semaphore.balance)
+            self.backend.spawn(lambda: (semaphore.acquire(),
+                                        self.done.put('acquired')))
+            with self.assertRaises(ThreadBackend.Empty):
+                self.done.get(timeout=0.05)
+        self.assertEqual('acquired', self.done.get(timeout=1))
+
+    def test_backend_event(self):
+        sent = self.backend.event()
+        self.backend.start(sent.send, 'answer')
+        self.assertEqual('answer', sent.wait())
+
+    def test_backend_tracks_queued_fetches(self):
+        release = threading.Event()
+        for i in range(3):
+            self.backend.spawn(lambda i: (release.wait(), self.done.put(i)),
+                               i)
+        time.sleep(0.05)
+        self.assertEqual(1, self.backend.waiting())
+        release.set()
+        self.assertEqual(range(3),
+                         sorted(self.done.get(timeout=1) for _ in range(3)))
+        self.assertEqual(0, self.backend.waiting())
+        self.assertGreater(self.backend.queue_wait.get(), 0.01)
+
+
+class TestGreenBackend(unittest.TestCase):
+
+    def test_backend_tracks_fetches_waiting(self):
+        backend = GreenBackend(size=1)
+        backend.spawn(eventlet.sleep, 0.05)
+        waiting = eventlet.spawn(backend.spawn, eventlet.sleep, 0)
+        eventlet.sleep(0)
+        self.assertEqual(1, backend.waiting())
+        waiting.wait().wait()
+        self.assertEqual(0, backend.waiting())
+        self.assertGreater(backend.queue_wait.get(), 0.005)
+
+
+class TestRecentWait(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.wait = RecentWait(weight=0.5, half_life=1,
+                               clock=lambda: self.now)
+
+    def test_recent_wait_averages_waits(self):
+        self.wait.observe(4)
+        self.assertEqual(2, self.wait.get())
+        self.wait.observe(0)
+        self.assertEqual(1, self.wait.get())
+
+    def test_recent_wait_decays(self):
+        self.wait.observe(4)
+        self.now = 2
+        self.assertEqual(0.5, self.wait.get())
+        self.wait.observe(1.5)
+        self.assertEqual(1, self.wait.get())
+
+    def test_recent_wait_clear(self):
+        self.wait.observe(4)
+        self.wait.clear()
+        self.assertEqual(0, self.wait.get())
+
+
+class ThreadedFetcher(TitleFetcher):
+
+    backend = ThreadBackend(size=10)
+
+    hosts = Hosts(semaphore=backend.semaphore)
+
+    connections = ConnectionPool(semaphore=backend.semaphore)
+
+
+class TestThreadedFetcher(unittest.TestCase):
+
+    def setUp(self):
+        TitleFetcher.cache.clear()
+
+    def page(self, delay):
+        def callback(request, context):
+            time.sleep(delay)
+            return '<title>%s</title>' % request.query
+        return callback
+
+    def test_fetcher_titles_in_threads(self):
+        urls = ['http://threaded.link/?%d' % i for i in range(5)]
+        with requests_mock.mock() as mock:
+            mock.get('http://threaded.link/', text=self.page(0.1))
+            start = time.time()
+            actual = ThreadedFetcher.fetch_titles(urls)
+        self.assertLess(time.time() - start, 0.4)
+        self.assertEqual([u'%d' % i for i in range(5)], actual)
+
+    def test_fetcher_titles_deadline_in_threads(self):
+        with requests_mock.mock() as mock:
+            mock.get('http://fast.link/', text=self.page(0))
+            mock.get('http://slow.link/', text=self.page(0.3))
+            actual = ThreadedFetcher.fetch_titles(
+                ['http://fast.link/?a', 'http://slow.link/?b'], deadline=0.1)
+            self.assertEqual([u'a', None], actual)
+            # (note): The slow fetch is left to finish, and its title is
+            # cached
+            time.sleep(0.4)
+        self.assertEqual(u'b',
+                         TitleFetcher.cache.get('http://slow.link/?b'))
+
+
+class SwitchedFetcher(TitleFetcher):
+
+    hosts = Hosts()
+
+    connections = ConnectionPool(resolver=Resolver())
+
+
+class TestUseBackend(unittest.TestCase):
+
+    def test_use_backend(self):
+        backend = ThreadBackend()
+        SwitchedFetcher.use_backend(backend)
+        self.assertIs(backend, SwitchedFetcher.backend)
+        self.assertIsInstance(SwitchedFetcher.connections.semaphore,
+                              backends.Semaphore)
+        host = SwitchedFetcher.hosts.get('http://switched.link')
+        self.assertIsInstance(host.semaphore, backends.Semaphore)
+        self.assertIsInstance(SwitchedFetcher.connections.resolver.event(),
+                              backends.Event)
+        self.assertIsInstance(TitleFetcher.backend, GreenBackend)
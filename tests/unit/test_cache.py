@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from strainer.cache import TitleCache
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTitleCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = TitleCache(max_size=2, ttl=60, negative_ttl=10,
+                                clock=self.clock)
+
+    def test_cache_hit(self):
+        self.cache.set('http://a.com', u'A')
+        self.assertEqual(u'A', self.cache.get('http://a.com'))
+        self.assertEqual(1, self.cache.hits)
+        self.assertEqual(0, self.cache.misses)
+
+    def test_cache_miss(self):
+        self.assertIsNone(self.cache.get('http://a.com'))
+        self.assertEqual(0, self.cache.hits)
+        self.assertEqual(1, self.cache.misses)
+
+    def test_cache_empty_title_is_a_hit(self):
+        self.cache.set('http://dead.link', u'')
+        self.assertEqual(u'', self.cache.get('http://dead.link'))
+        self.assertEqual(1, self.cache.hits)
+
+    def test_cache_ttl(self):
+        self.cache.set('http://a.com', u'A')
+        self.clock.now += 59
+        self.assertEqual(u'A', self.cache.get('http://a.com'))
+        self.clock.now += 1
+        self.assertIsNone(self.cache.get('http://a.com'))
+        self.assertEqual(0, len(self.cache))
+
+    def test_cache_negative_ttl(self):
+        self.cache.set('http://dead.link', u'')
+        self.clock.now += 10
+        self.assertIsNone(self.cache.get('http://dead.link'))
+
+    def test_cache_evicts_least_recently_used(self):
+        self.cache.set('http://a.com', u'A')
+        self.cache.set('http://b.com', u'B')
+        self.cache.get('http://a.com')
+        self.cache.set('http://c.com', u'C')
+        self.assertIsNone(self.cache.get('http://b.com'))
+        self.assertEqual(u'A', self.cache.get('http://a.com'))
+        self.assertEqual(u'C', self.cache.get('http://c.com'))
+        self.assertEqual(1, self.cache.evictions)
+
+    def test_cache_set_existing_url_does_not_evict(self):
+        self.cache.set('http://a.com', u'A')
+        self.cache.set('http://b.com', u'B')
+        self.cache.set('http://a.com', u'A2')
+        self.assertEqual(0, self.cache.evictions)
+        self.assertEqual(u'A2', self.cache.get('http://a.com'))
+
+    def test_cache_disabled(self):
+        cache = TitleCache(max_size=0)
+        cache.set('http://a.com', u'A')
+        self.assertIsNone(cache.get('http://a.com'))
+
+    def test_cache_stats(self):
+        self.cache.set('http://a.com', u'A')
+        self.cache.get('http://a.com')
+        self.cache.get('http://b.com')
+        expected = {'hits': 1, 'misses': 1, 'evictions': 0, 'size': 1}
+        self.assertEqual(expected, self.cache.stats())
+        self.cache.clear()
+        expected = {'hits': 0, 'misses': 0, 'evictions': 0, 'size': 0}
+        self.assertEqual(expected, self.cache.stats())
+
+    def test_cache_remaining(self):
+        self.cache.set('http://a.com', u'A')
+        self.cache.set('http://dead.link', u'')
+        self.clock.now += 5
+        self.assertEqual(55, self.cache.remaining('http://a.com'))
+        self.assertEqual(5, self.cache.remaining('http://dead.link'))
+        self.assertEqual(0, self.cache.remaining('http://b.com'))
+        self.clock.now += 10
+        self.assertEqual(0, self.cache.remaining('http://dead.link'))
+        self.assertEqual(0, self.cache.hits + self.cache.misses)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+import time
+import unittest
+
+import requests_mock
+
+from strainer.connections import ConnectionPool
+from strainer.connections import IdleTimeoutHTTPConnectionPool
+
+
+class FakeConnection(object):
+
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def _pool(self):
+        pool = IdleTimeoutHTTPConnectionPool('localhost')
+        pool.idle_timeout = 30
+        # (note): Takes the free slot of the pool, so a connection can be
+        # put back
+        pool._get_conn()
+        return pool
+
+    def test_idle_connection_is_reused(self):
+        pool = self._pool()
+        conn = FakeConnection()
+        pool._put_conn(conn)
+        self.assertIs(conn, pool._get_conn())
+        self.assertFalse(conn.closed)
+
+    def test_idle_timeout_closes_connection(self):
+        pool = self._pool()
+        conn = FakeConnection()
+        pool._put_conn(conn)
+        conn.idle_since = time.time() - 31
+        self.assertIs(conn, pool._get_conn())
+        self.assertTrue(conn.closed)
+
+    def test_pool_settings(self):
+        connections = ConnectionPool(max_hosts=5, max_per_host=2,
+                                     idle_timeout=10)
+        adapter = connections.session.get_adapter('https://example.com')
+        self.assertEqual(10, adapter.poolmanager.idle_timeout)
+        pool = adapter.poolmanager.connection_from_url('https://example.com')
+        self.assertEqual(10, pool.idle_timeout)
+        self.assertEqual(2, pool.pool.maxsize)
+        self.assertFalse(pool.block)
+
+    def test_cookies_are_not_kept(self):
+        connections = ConnectionPool()
+        with requests_mock.mock() as mock:
+            mock.get('http://cookie.jar', text='<title>Cookies</title>',
+                     headers={'Set-Cookie': 'session=1234'})
+            connections.session.get('http://cookie.jar')
+        self.assertEqual(0, len(connections.session.cookies))
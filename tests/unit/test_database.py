@@ -0,0 +1,32 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from strainer.database import ProcessConnection
+
+
+class TestProcessConnection(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.connection = ProcessConnection(
+            os.path.join(self.directory, 'a.db'),
+            setup=lambda db: db.execute('CREATE TABLE IF NOT EXISTS t '
+                                        '(x INTEGER)'))
+
+    def tearDown(self):
+        self.connection.close()
+        shutil.rmtree(self.directory)
+
+    def test_connection_opened_once(self):
+        db = self.connection.get()
+        db.execute('INSERT INTO t VALUES (1)')
+        self.assertIs(db, self.connection.get())
+
+    def test_connection_per_process(self):
+        db = self.connection.get()
+        # (note): As if the process had forked since
+        self.connection._pid = -1
+        self.assertIsNot(db, self.connection.get())
+        db.close()
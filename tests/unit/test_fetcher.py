@@ -1,14 +1,66 @@
 # -*- coding: utf-8 -*-
 
+import BaseHTTPServer
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
 import unittest
 
+import eventlet
 import requests_mock
+from requests import exceptions as re_exceptions
 
+from strainer.backends import GreenBackend
+from strainer.backends import ThreadBackend
+from strainer.connections import ConnectionPool
+from strainer.fetcher import HEDGE_WINS
+from strainer.fetcher import HEDGED
+from strainer.fetcher import SKIPPED
 from strainer.fetcher import TitleFetcher
+from strainer.flights import SingleFlight
+from strainer.hedging import HedgePolicy
+from strainer.hosts import Hosts
+from strainer.resolver import Resolver
+from strainer.store import TitleStore
+
+
+class CountingBody(io.BytesIO):
+
+    bytes_read = 0
+
+    def read(self, *args, **kwargs):
+        data = super(CountingBody, self).read(*args, **kwargs)
+        self.bytes_read += len(data)
+        return data
+
+
+class SmallChunkFetcher(TitleFetcher):
+
+    chunk_size = 3
+
+
+class SlowFetcher(TitleFetcher):
+
+    backend = GreenBackend()
+
+    @classmethod
+    def fetch_title(cls, url):
+        if 'slow' in url:
+            eventlet.sleep(10)
+        elif 'late' in url:
+            eventlet.sleep(0.05)
+        return url.upper()
 
 
 class TestFetcher(unittest.TestCase):
 
+    def setUp(self):
+        TitleFetcher.cache.clear()
+        TitleFetcher.hosts.clear()
+
     def test_fetcher_happy(self):
         with requests_mock.mock() as mock:
             mock.get('http://mail.google.com', text='<title>Gmail</title>')
@@ -44,4 +96,632 @@ class TestFetcher(unittest.TestCase):
             actual = TitleFetcher.fetch_title('http://unicode.chars')
             self.assertEqual(u'Unicode® character table', actual)
 
+    def test_fetcher_title_split_across_chunks(self):
+        with requests_mock.mock() as mock:
+            mock_html = u'<html><head><title>Chunked ® title</title></head>'
+            mock.get('http://chunked.title', text=mock_html)
+            actual = SmallChunkFetcher.fetch_title('http://chunked.title')
+            self.assertEqual(u'Chunked ® title', actual)
+
+    def test_fetcher_stops_reading_after_title(self):
+        with requests_mock.mock() as mock:
+            body = CountingBody(b'<title>Big page</title>' + b'x' * 10 ** 7)
+            mock.get('http://big.page', body=body)
+            actual = TitleFetcher.fetch_title('http://big.page')
+            self.assertEqual(u'Big page', actual)
+            self.assertLess(body.bytes_read, 10 ** 6)
+            self.assertTrue(body.closed)
+
+    def test_fetcher_stops_reading_at_byte_limit(self):
+        with requests_mock.mock() as mock:
+            padding = b'<p>' + b'x' * TitleFetcher.max_title_bytes
+            body = CountingBody(padding + b'<title>Late</title>' + padding)
+            mock.get('http://late.title', body=body)
+            actual = TitleFetcher.fetch_title('http://late.title')
+            self.assertEqual(u'', actual)
+            self.assertLess(body.bytes_read, len(padding) * 2)
+
+    def test_fetcher_title_cut_short(self):
+        with requests_mock.mock() as mock:
+            mock.get('http://cut.short', text='<title>Cut sho')
+            actual = TitleFetcher.fetch_title('http://cut.short')
+            self.assertEqual(u'Cut sho', actual)
+
+    def test_fetcher_empty_response(self):
+        with requests_mock.mock() as mock:
+            mock.get('http://empty.response', text='')
+            actual = TitleFetcher.fetch_title('http://empty.response')
+            self.assertEqual(u'', actual)
+
+    def test_fetcher_skips_other_content_types(self):
+        skipped = SKIPPED['Content-Type'].get()
+        with requests_mock.mock() as mock:
+            body = CountingBody(b'\x89PNG' + b'x' * 10 ** 6)
+            mock.get('http://image.link', body=body,
+                     headers={'Content-Type': 'image/png'})
+            actual = TitleFetcher.fetch_title('http://image.link')
+            self.assertEqual(u'', actual)
+            self.assertEqual(0, body.bytes_read)
+            self.assertTrue(body.closed)
+        self.assertEqual(skipped + 1, SKIPPED['Content-Type'].get())
+
+    def test_fetcher_reads_html_content_types(self):
+        with requests_mock.mock() as mock:
+            for i, content_type in enumerate([
+                    'text/html; charset=UTF-8', 'TEXT/HTML',
+                    'application/xhtml+xml']):
+                mock.get('http://html.link/%d' % i,
+                         text='<title>Page</title>',
+                         headers={'Content-Type': content_type})
+                actual = TitleFetcher.fetch_title('http://html.link/%d' % i)
+                self.assertEqual(u'Page', actual)
+
+    def test_fetcher_configured_content_types(self):
+        class TextFetcher(TitleFetcher):
+            content_types = frozenset(['text/plain'])
+
+        with requests_mock.mock() as mock:
+            mock.get('http://text.link', text='<title>Text</title>',
+                     headers={'Content-Type': 'text/plain'})
+            mock.get('http://html.link', text='<title>Page</title>',
+                     headers={'Content-Type': 'text/html'})
+            self.assertEqual(u'Text',
+                             TextFetcher.fetch_title('http://text.link'))
+            self.assertEqual(u'', TextFetcher.fetch_title('http://html.link'))
+
+    def test_fetcher_skips_big_content_length(self):
+        skipped = SKIPPED['Content-Length'].get()
+        with requests_mock.mock() as mock:
+            body = CountingBody(b'<title>Huge</title>')
+            length = TitleFetcher.max_content_length + 1
+            mock.get('http://huge.link', body=body,
+                     headers={'Content-Type': 'text/html',
+                              'Content-Length': str(length)})
+            actual = TitleFetcher.fetch_title('http://huge.link')
+            self.assertEqual(u'', actual)
+            self.assertEqual(0, body.bytes_read)
+        self.assertEqual(skipped + 1, SKIPPED['Content-Length'].get())
+
+    def test_fetcher_reads_invalid_content_length(self):
+        with requests_mock.mock() as mock:
+            mock.get('http://invalid.length', text='<title>Page</title>',
+                     headers={'Content-Length': 'many'})
+            actual = TitleFetcher.fetch_title('http://invalid.length')
+            self.assertEqual(u'Page', actual)
+
+    def test_fetcher_caches_title(self):
+        with requests_mock.mock() as mock:
+            mock.get('http://cached.title', text='<title>Cached</title>')
+            TitleFetcher.fetch_title('http://cached.title')
+            actual = TitleFetcher.fetch_title('http://cached.title')
+            self.assertEqual(u'Cached', actual)
+            self.assertEqual(1, mock.call_count)
+
+    def test_fetcher_caches_failure(self):
+        with requests_mock.mock() as mock:
+            mock.get('http://dead.link', status_code=404)
+            TitleFetcher.fetch_title('http://dead.link')
+            actual = TitleFetcher.fetch_title('http://dead.link')
+            self.assertEqual(u'', actual)
+            self.assertEqual(1, mock.call_count)
+
+    def test_fetcher_titles(self):
+        urls = ['http://fast.one', 'http://fast.two']
+        actual = SlowFetcher.fetch_titles(urls)
+        self.assertEqual(['HTTP://FAST.ONE', 'HTTP://FAST.TWO'], actual)
+
+    def test_fetcher_titles_deadline(self):
+        urls = ['http://fast.one', 'http://slow.one', 'http://fast.two']
+        start = time.time()
+        actual = SlowFetcher.fetch_titles(urls, deadline=0.1)
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(['HTTP://FAST.ONE', None, 'HTTP://FAST.TWO'],
+                         actual)
+        # (note): Fetches not done by the deadline are killed
+        self.assertEqual(0, SlowFetcher.backend.running())
+
+    def test_fetcher_titles_failed_fetch(self):
+        class BrokenFetcher(SlowFetcher):
+            @classmethod
+            def fetch_title(cls, url):
+                if 'broken' in url:
+                    raise ValueError(url)
+                return super(BrokenFetcher, cls).fetch_title(url)
+
+        titles = BrokenFetcher.fetch_titles(['http://broken.link',
+                                             'http://a.link'])
+        self.assertEqual([u'', 'HTTP://A.LINK'], titles)
+
+    def test_fetcher_iter_titles_in_completion_order(self):
+        urls = ['http://late.one', 'http://fast.one']
+        actual = list(SlowFetcher.iter_titles(urls))
+        self.assertEqual([(1, 'HTTP://FAST.ONE'), (0, 'HTTP://LATE.ONE')],
+                         actual)
+
+    def test_fetcher_iter_titles_deadline(self):
+        urls = ['http://slow.one', 'http://late.one', 'http://fast.one']
+        actual = list(SlowFetcher.iter_titles(urls, deadline=0.5))
+        expected = [(2, 'HTTP://FAST.ONE'), (1, 'HTTP://LATE.ONE'),
+                    (0, None)]
+        self.assertEqual(expected, actual)
+        self.assertEqual(0, SlowFetcher.backend.running())
+
+    def test_fetcher_iter_titles_closed(self):
+        urls = ['http://fast.one', 'http://slow.one']
+        titles = SlowFetcher.iter_titles(urls)
+        self.assertEqual((0, 'HTTP://FAST.ONE'), next(titles))
+        titles.close()
+        self.assertEqual(0, SlowFetcher.backend.running())
+
     # (note): There should be tests here for testing the timeout
+
+
+class StoredFetcher(TitleFetcher):
+
+    store = None
+
+
+class TestFetcherStore(unittest.TestCase):
+
+    def setUp(self):
+        TitleFetcher.cache.clear()
+        self.dir = tempfile.mkdtemp()
+        StoredFetcher.store = TitleStore(os.path.join(self.dir, 'titles.db'))
+
+    def tearDown(self):
+        StoredFetcher.store.close()
+        StoredFetcher.store = None
+        shutil.rmtree(self.dir)
+
+    def test_fetcher_stores_title(self):
+        with requests_mock.mock() as mock:
+            mock.get('http://stored.link', text='<title>Stored</title>')
+            StoredFetcher.fetch_title('http://stored.link')
+        self.assertEqual(u'Stored',
+                         StoredFetcher.store.get('http://stored.link'))
+
+    def test_fetcher_checks_store_first(self):
+        StoredFetcher.store.set('http://stored.link', u'Stored')
+        with requests_mock.mock() as mock:
+            actual = StoredFetcher.fetch_title('http://stored.link')
+            self.assertFalse(mock.called)
+        self.assertEqual(u'Stored', actual)
+        # (note): Stored titles are cached too
+        self.assertEqual(u'Stored',
+                         TitleFetcher.cache.get('http://stored.link'))
+
+    def test_fetcher_prewarm(self):
+        with requests_mock.mock() as mock:
+            mock.get('http://a.link', text='<title>A</title>')
+            mock.get('http://b.link', text='<title>B</title>')
+            fetched = StoredFetcher.prewarm(['http://a.link', 'http://b.link'])
+        self.assertEqual(2, fetched)
+        TitleFetcher.cache.clear()
+        self.assertEqual(u'A', StoredFetcher.store.get('http://a.link'))
+        self.assertEqual(u'B', StoredFetcher.store.get('http://b.link'))
+
+
+class LimitedFetcher(TitleFetcher):
+
+    backend = GreenBackend()
+
+    hosts = Hosts(max_concurrent=2, failures=3, window=30, cooldown=30)
+
+
+class TestFetcherHosts(unittest.TestCase):
+
+    def setUp(self):
+        TitleFetcher.cache.clear()
+        LimitedFetcher.hosts.clear()
+
+    def test_fetcher_limits_fetches_per_host(self):
+        fetching = {'a.link': 0, 'b.link': 0}
+        most = dict(fetching)
+
+        def slow_page(request, context):
+            fetching[request.netloc] += 1
+            most[request.netloc] = max(most[request.netloc],
+                                       fetching[request.netloc])
+            eventlet.sleep(0.01)
+            fetching[request.netloc] -= 1
+            return '<title>%s</title>' % request.path
+
+        urls = ['http://a.link/%d' % i for i in range(6)]
+        urls += ['http://b.link/%d' % i for i in range(2)]
+        with requests_mock.mock() as mock:
+            mock.get(requests_mock.ANY, text=slow_page)
+            titles = LimitedFetcher.fetch_titles(urls)
+
+        self.assertEqual([u'/%d' % i for i in range(6)] + [u'/0', u'/1'],
+                         titles)
+        self.assertEqual({'a.link': 2, 'b.link': 2}, most)
+
+    def test_fetcher_busy_host_does_not_delay_others(self):
+        class PooledFetcher(LimitedFetcher):
+            connections = ConnectionPool(max_connections=5)
+
+        served = {}
+
+        def page(request, context):
+            if request.netloc == 'busy.link':
+                eventlet.sleep(0.2)
+            else:
+                served[request.netloc] = time.time()
+            return '<title>%s</title>' % request.netloc
+
+        urls = ['http://busy.link/%d' % i for i in range(10)]
+        urls.append('http://idle.link/')
+        with requests_mock.mock() as mock:
+            mock.get(requests_mock.ANY, text=page)
+            start = time.time()
+            titles = PooledFetcher.fetch_titles(urls)
+
+        self.assertEqual(u'idle.link', titles[-1])
+        self.assertLess(served['idle.link'] - start, 0.1)
+
+    def test_fetcher_fails_fast_once_host_fails(self):
+        with requests_mock.mock() as mock:
+            mock.get('http://down.link/', exc=re_exceptions.ConnectTimeout)
+            mock.get('http://up.link/', text='<title>Up</title>')
+            for i in range(3):
+                LimitedFetcher.fetch_title('http://down.link/?%d' % i)
+            self.assertEqual(3, mock.call_count)
+
+            start = time.time()
+            actual = LimitedFetcher.fetch_title('http://down.link/?3')
+            self.assertTrue(time.time() - start < 0.01)
+            self.assertEqual(u'', actual)
+            self.assertEqual(3, mock.call_count)
+            self.assertEqual({'down.link': 'open'},
+                             LimitedFetcher.hosts.states())
+
+            # (note): Other hosts are fetched from as before
+            actual = LimitedFetcher.fetch_title('http://up.link/')
+            self.assertEqual(u'Up', actual)
+
+    def test_fetcher_hanging_host_fails_by_deadline(self):
+        class QuickFetcher(LimitedFetcher):
+            host_failure_after = 0.01
+
+        def hang(request, context):
+            eventlet.sleep(10)
+
+        with requests_mock.mock() as mock:
+            mock.get('http://hanging.link/', text=hang)
+            for i in range(3):
+                titles = QuickFetcher.fetch_titles(
+                    ['http://hanging.link/?%d' % i], deadline=0.05)
+                self.assertEqual([None], titles)
+        self.assertEqual({'hanging.link': 'open'},
+                         LimitedFetcher.hosts.states())
+
+    def test_fetcher_http_errors_are_answers(self):
+        with requests_mock.mock() as mock:
+            mock.get('http://error.link/', status_code=500)
+            for i in range(5):
+                LimitedFetcher.fetch_title('http://error.link/?%d' % i)
+            self.assertEqual(5, mock.call_count)
+        self.assertEqual({}, LimitedFetcher.hosts.states())
+
+    def test_fetcher_host_timeouts_fail(self):
+        class QuickFetcher(LimitedFetcher):
+            timeout = 0.01
+
+        def hang(request, context):
+            eventlet.sleep(10)
+
+        with requests_mock.mock() as mock:
+            mock.get('http://hanging.link/', text=hang)
+            for i in range(3):
+                actual = QuickFetcher.fetch_title(
+                    'http://hanging.link/?%d' % i)
+                self.assertEqual(u'', actual)
+        self.assertEqual({'hanging.link': 'open'},
+                         LimitedFetcher.hosts.states())
+
+    def test_fetcher_deadlines_are_not_failures(self):
+        def slow_page(request, context):
+            eventlet.sleep(0.1)
+            return '<title>Slow</title>'
+
+        with requests_mock.mock() as mock:
+            mock.get('http://slow.link/', text=slow_page)
+            for i in range(5):
+                titles = LimitedFetcher.fetch_titles(
+                    ['http://slow.link/?%d' % i], deadline=0.01)
+                self.assertEqual([None], titles)
+            self.assertEqual({}, LimitedFetcher.hosts.states())
+            actual = LimitedFetcher.fetch_title('http://slow.link/')
+            self.assertEqual(u'Slow', actual)
+
+
+class HedgedFetcher(TitleFetcher):
+
+    hosts = Hosts()
+
+    hedging = HedgePolicy(percentile=50, max_ratio=0.5, min_delay=0.01,
+                          min_samples=1, max_burst=1)
+
+
+class TestFetcherHedging(unittest.TestCase):
+
+    def setUp(self):
+        TitleFetcher.cache.clear()
+        HedgedFetcher.hedging.clear()
+        # (note): Fetches take 10ms, so they're hedged after 10ms, and
+        # the budget allows a hedge
+        HedgedFetcher.hedging.observe(0.01)
+        HedgedFetcher.hedging.delay()
+        self.fetches = []
+
+    def page(self, delays):
+        """Returns a callback answering the n-th fetch after delays[n]"""
+
+        def callback(request, context):
+            attempt = len(self.fetches)
+            self.fetches.append(attempt)
+            try:
+                eventlet.sleep(delays[attempt])
+            except eventlet.greenlet.GreenletExit:
+                self.fetches[attempt] = 'killed'
+                raise
+            return '<title>Attempt %d</title>' % attempt
+        return callback
+
+    def test_fetcher_not_hedged_when_fast(self):
+        with requests_mock.mock() as mock:
+            mock.get('http://fast.link', text=self.page([0]))
+            actual = HedgedFetcher.fetch_title('http://fast.link')
+        self.assertEqual(u'Attempt 0', actual)
+        self.assertEqual([0], self.fetches)
+
+    def test_fetcher_hedges_slow_fetch(self):
+        hedges = HEDGED.get()
+        wins = HEDGE_WINS.get()
+        with requests_mock.mock() as mock:
+            mock.get('http://stuck.link', text=self.page([10, 0]))
+            start = time.time()
+            actual = HedgedFetcher.fetch_title('http://stuck.link')
+            self.assertLess(time.time() - start, 1)
+            eventlet.sleep(0)
+        self.assertEqual(u'Attempt 1', actual)
+        # (note): The stuck attempt is killed
+        self.assertEqual(['killed', 1], self.fetches)
+        self.assertEqual(hedges + 1, HEDGED.get())
+        self.assertEqual(wins + 1, HEDGE_WINS.get())
+
+    def test_fetcher_first_attempt_wins(self):
+        with requests_mock.mock() as mock:
+            mock.get('http://slow.link', text=self.page([0.02, 10]))
+            actual = HedgedFetcher.fetch_title('http://slow.link')
+            eventlet.sleep(0)
+        self.assertEqual(u'Attempt 0', actual)
+        self.assertEqual([0, 'killed'], self.fetches)
+
+    def test_fetcher_hedges_bounded_by_budget(self):
+        with requests_mock.mock() as mock:
+            mock.get('http://slow.link', text=self.page([0.02] * 10))
+            for i in range(4):
+                HedgedFetcher.fetch_title('http://slow.link/?%d' % i)
+        # (note): The budget allows a hedge for every other fetch
+        self.assertEqual(6, len(self.fetches))
+
+    def test_fetcher_waits_for_title(self):
+        page = self.page([0.05])
+
+        def callback(request, context):
+            if self.fetches:
+                # (note): The hedge fails at once
+                context.status_code = 503
+                return ''
+            return page(request, context)
+
+        with requests_mock.mock() as mock:
+            mock.get('http://flaky.link', text=callback)
+            actual = HedgedFetcher.fetch_title('http://flaky.link')
+        self.assertEqual(u'Attempt 0', actual)
+
+    def test_fetcher_killed_kills_attempts(self):
+        with requests_mock.mock() as mock:
+            mock.get('http://stuck.link', text=self.page([10, 10]))
+            titles = HedgedFetcher.fetch_titles(['http://stuck.link'],
+                                                deadline=0.05)
+            eventlet.sleep(0)
+        self.assertEqual([None], titles)
+        self.assertEqual(['killed', 'killed'], self.fetches)
+
+
+class SlowHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Answers after a while, counting the requests it gets"""
+
+    protocol_version = 'HTTP/1.1'
+
+    requests = 0
+
+    def do_GET(self):
+        SlowHandler.requests += 1
+        time.sleep(0.2)
+        body = '<title>Coalesced</title>'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StallingHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Sends the title at once, and the rest of the page after a while"""
+
+    protocol_version = 'HTTP/1.1'
+
+    stall = 1.5
+
+    def do_GET(self):
+        # (note): A whole chunk, so the title is read before the stall
+        head = '<title>Found</title>'.ljust(TitleFetcher.chunk_size)
+        rest = ' ' * 1000
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(head) + len(rest)))
+        self.end_headers()
+        self.wfile.write(head)
+        self.wfile.flush()
+        time.sleep(self.stall)
+        self.wfile.write(rest)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StalledFetcher(TitleFetcher):
+
+    backend = ThreadBackend(size=2)
+
+    hosts = Hosts(semaphore=backend.semaphore)
+
+    connections = ConnectionPool(semaphore=backend.semaphore)
+
+    timeout = 1
+
+
+class TestFetcherDrain(unittest.TestCase):
+
+    def setUp(self):
+        TitleFetcher.cache.clear()
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+                                                StallingHandler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs={'poll_interval': 0.01})
+        self.thread.start()
+
+    def tearDown(self):
+        StalledFetcher.connections.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def test_fetcher_title_kept_when_rest_stalls(self):
+        start = time.time()
+        title = StalledFetcher.fetch_title('http://127.0.0.1:%d/' % self.port)
+
+        self.assertEqual(u'Found', title)
+        self.assertLess(time.time() - start, 0.5)
+
+
+class CoalescedFetcher(TitleFetcher):
+
+    # (note): Sockets aren't green here, so fetches run in OS threads to
+    # be concurrent
+    backend = ThreadBackend(size=10)
+
+    hosts = Hosts(semaphore=backend.semaphore)
+
+    connections = ConnectionPool(semaphore=backend.semaphore)
+
+    flights = SingleFlight(event=backend.event)
+
+
+class TestFetcherCoalescing(unittest.TestCase):
+
+    def setUp(self):
+        TitleFetcher.cache.clear()
+        SlowHandler.requests = 0
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+                                                SlowHandler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs={'poll_interval': 0.01})
+        self.thread.start()
+
+    def tearDown(self):
+        CoalescedFetcher.connections.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def test_fetcher_coalesces_concurrent_fetches(self):
+        url = 'http://127.0.0.1:%d/page' % self.port
+        # (note): These differ only in ways that don't change the page
+        urls = [url] * 8 + [url.replace('http', 'HTTP'), url + '#top']
+        coalesced = CoalescedFetcher.flights.coalesced
+
+        titles = CoalescedFetcher.fetch_titles(urls, deadline=5)
+
+        self.assertEqual([u'Coalesced'] * 10, titles)
+        self.assertEqual(1, SlowHandler.requests)
+        self.assertEqual(coalesced + 9, CoalescedFetcher.flights.coalesced)
+        self.assertEqual(u'Coalesced', TitleFetcher.cache.get(url + '#top'))
+
+
+class WarmedFetcher(TitleFetcher):
+
+    connections = ConnectionPool()
+
+
+class TestFetcherWarmUp(unittest.TestCase):
+
+    def setUp(self):
+        self.names = []
+        WarmedFetcher.connections.resolver = Resolver(lookup=self.lookup)
+
+    def lookup(self, name):
+        self.names.append(name)
+        if name == 'slow.link':
+            eventlet.sleep(1)
+        return ['10.0.0.1'], 60
+
+    def test_fetcher_warm_up_looks_up_hosts(self):
+        urls = ['http://a.link/x', 'https://a.link/y', 'http://b.link',
+                'http://[bad', 'not a url']
+
+        self.assertEqual(2, WarmedFetcher.warm_up(urls, deadline=1))
+        self.assertEqual(['a.link', 'b.link'], sorted(self.names))
+        self.assertEqual(2, len(WarmedFetcher.connections.resolver))
+
+    def test_fetcher_warm_up_deadline(self):
+        start = time.time()
+        looked_up = WarmedFetcher.warm_up(
+            ['http://a.link', 'http://slow.link'], deadline=0.1)
+
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual(1, looked_up)
+        # (note): The slow lookup was killed, so it's looked up again
+        WarmedFetcher.connections.resolver.resolve('a.link')
+        self.assertEqual(['10.0.0.1'],
+                         WarmedFetcher.connections.resolver.resolve(
+                             'slow.link'))
+        self.assertEqual(3, len(self.names))
+
+
+class TestFetcherWarmUpConnects(unittest.TestCase):
+
+    def setUp(self):
+        TitleFetcher.cache.clear()
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+                                                SlowHandler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs={'poll_interval': 0.01})
+        self.thread.start()
+
+    def tearDown(self):
+        CoalescedFetcher.connections.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def test_fetcher_warm_up_connects(self):
+        url = 'http://127.0.0.1:%d/page' % self.port
+        pool = CoalescedFetcher.connections.session.get_adapter(
+            url).poolmanager.connection_from_url(url)
+
+        self.assertEqual(1, CoalescedFetcher.warm_up([url], connect=True,
+                                                     deadline=1))
+        self.assertEqual(1, pool.num_connections)
+        # (note): The fetch reuses the pooled connection
+        self.assertEqual(u'Coalesced', CoalescedFetcher.fetch_title(url))
+        self.assertEqual(1, pool.num_connections)
@@ -0,0 +1,52 @@
+import unittest
+
+import eventlet
+
+from strainer.flights import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.flights = SingleFlight()
+        self.calls = []
+
+    def call(self, result, seconds=0.05):
+        self.calls.append(result)
+        eventlet.sleep(seconds)
+        return result
+
+    def test_flights_run_call(self):
+        self.assertEqual(('a', False), self.flights.run('key', self.call, 'a'))
+        self.assertEqual(0, len(self.flights))
+
+    def test_flights_coalesce_concurrent_calls(self):
+        pool = eventlet.GreenPool()
+        results = list(pool.imap(
+            lambda result: self.flights.run('key', self.call, result),
+            ['a', 'b', 'c']))
+        self.assertEqual([('a', False), ('a', True), ('a', True)], results)
+        self.assertEqual(['a'], self.calls)
+        self.assertEqual(2, self.flights.coalesced)
+
+    def test_flights_by_key(self):
+        pool = eventlet.GreenPool()
+        results = list(pool.imap(
+            lambda key: self.flights.run(key, self.call, key), ['a', 'b']))
+        self.assertEqual([('a', False), ('b', False)], results)
+        self.assertEqual(0, self.flights.coalesced)
+
+    def test_flights_run_again_once_done(self):
+        self.flights.run('key', self.call, 'a', 0)
+        self.assertEqual(('b', False),
+                         self.flights.run('key', self.call, 'b', 0))
+
+    def test_flights_killed_call_runs_waiting_one(self):
+        first = eventlet.spawn(self.flights.run, 'key', self.call, 'a', 10)
+        eventlet.sleep(0)
+        second = eventlet.spawn(self.flights.run, 'key', self.call, 'b')
+        eventlet.sleep(0)
+        first.kill()
+        self.assertEqual(('b', False), second.wait())
+        self.assertEqual(['a', 'b'], self.calls)
+        self.assertEqual(0, len(self.flights))
@@ -0,0 +1,73 @@
+import unittest
+
+from strainer.hedging import HedgePolicy
+
+
+class TestHedgePolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = HedgePolicy(percentile=90, max_ratio=0.1,
+                                  min_delay=0.01, window=100,
+                                  min_samples=10, max_burst=2)
+        self.policy.update_every = 1
+
+    def observe(self, times):
+        for seconds in times:
+            self.policy.observe(seconds)
+
+    def test_policy_no_delay_until_min_samples(self):
+        self.observe([0.1] * 9)
+        self.assertIsNone(self.policy.delay())
+        self.observe([0.1])
+        self.assertEqual(0.1, self.policy.delay())
+
+    def test_policy_percentile(self):
+        self.observe([0.02 * i for i in range(1, 101)])
+        self.assertAlmostEqual(1.82, self.policy.delay())
+
+    def test_policy_recent_times(self):
+        self.observe([1] * 100)
+        self.observe([0.05] * 100)
+        self.assertEqual(0.05, self.policy.delay())
+
+    def test_policy_min_delay(self):
+        self.observe([0.001] * 10)
+        self.assertEqual(0.01, self.policy.delay())
+
+    def test_policy_updates_delay_periodically(self):
+        self.policy.update_every = 5
+        self.observe([0.1] * 10)
+        self.observe([1] * 4)
+        self.assertEqual(0.1, self.policy.delay())
+        self.observe([1])
+        self.assertEqual(1, self.policy.delay())
+
+    def test_policy_budget(self):
+        self.assertFalse(self.policy.allow())
+        for _ in range(9):
+            self.policy.delay()
+        self.assertFalse(self.policy.allow())
+        self.policy.delay()
+        self.assertTrue(self.policy.allow())
+        self.assertFalse(self.policy.allow())
+
+    def test_policy_budget_burst(self):
+        for _ in range(100):
+            self.policy.delay()
+        self.assertTrue(self.policy.allow())
+        self.assertTrue(self.policy.allow())
+        self.assertFalse(self.policy.allow())
+
+    def test_policy_no_ratio(self):
+        self.policy.max_ratio = 0
+        self.observe([0.1] * 10)
+        self.assertIsNone(self.policy.delay())
+        self.assertFalse(self.policy.allow())
+
+    def test_policy_clear(self):
+        self.observe([0.1] * 10)
+        for _ in range(10):
+            self.policy.delay()
+        self.policy.clear()
+        self.assertIsNone(self.policy.delay())
+        self.assertFalse(self.policy.allow())
@@ -0,0 +1,141 @@
+import unittest
+
+from strainer.hosts import CircuitBreaker
+from strainer.hosts import Hosts
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker('a.com', failures=3, window=10,
+                                      cooldown=30, clock=self.clock)
+
+    def fail(self, times=1):
+        for _ in range(times):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.done(False)
+
+    def test_breaker_opens_after_failures(self):
+        self.fail(2)
+        self.assertEqual(CircuitBreaker.CLOSED, self.breaker.state)
+        self.fail()
+        self.assertEqual(CircuitBreaker.OPEN, self.breaker.state)
+        self.assertFalse(self.breaker.allow())
+
+    def test_breaker_failures_in_window(self):
+        self.fail(2)
+        self.clock.now += 10
+        self.fail()
+        self.assertEqual(CircuitBreaker.CLOSED, self.breaker.state)
+
+    def test_breaker_failures_in_a_row(self):
+        self.fail(2)
+        self.breaker.allow()
+        self.breaker.done(True)
+        self.fail(2)
+        self.assertEqual(CircuitBreaker.CLOSED, self.breaker.state)
+
+    def test_breaker_unknown_outcome(self):
+        self.fail(2)
+        self.breaker.allow()
+        self.breaker.done(None)
+        self.assertEqual(CircuitBreaker.CLOSED, self.breaker.state)
+        self.fail()
+        self.assertEqual(CircuitBreaker.OPEN, self.breaker.state)
+
+    def test_breaker_half_open_after_cooldown(self):
+        self.fail(3)
+        self.clock.now += 29
+        self.assertFalse(self.breaker.allow())
+        self.clock.now += 1
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(CircuitBreaker.HALF_OPEN, self.breaker.state)
+        # (note): One fetch at a time tries the host
+        self.assertFalse(self.breaker.allow())
+
+    def test_breaker_closes_when_host_answers(self):
+        self.fail(3)
+        self.clock.now += 30
+        self.breaker.allow()
+        self.breaker.done(True)
+        self.assertEqual(CircuitBreaker.CLOSED, self.breaker.state)
+        self.assertTrue(self.breaker.allow())
+
+    def test_breaker_opens_again_when_host_fails(self):
+        self.fail(3)
+        self.clock.now += 30
+        self.fail()
+        self.assertEqual(CircuitBreaker.OPEN, self.breaker.state)
+        self.clock.now += 29
+        self.assertFalse(self.breaker.allow())
+
+    def test_breaker_half_open_unknown_outcome(self):
+        self.fail(3)
+        self.clock.now += 30
+        self.breaker.allow()
+        self.breaker.done(None)
+        self.assertEqual(CircuitBreaker.HALF_OPEN, self.breaker.state)
+        self.assertTrue(self.breaker.allow())
+
+
+class TestHosts(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.hosts = Hosts(max_concurrent=2, max_hosts=2, failures=1,
+                           clock=self.clock)
+
+    def test_hosts_by_name(self):
+        host = self.hosts.get('http://a.com/x')
+        self.assertEqual('a.com', host.name)
+        self.assertIs(host, self.hosts.get('https://A.com/y?z'))
+        self.assertEqual('a.com:8080',
+                         self.hosts.get('http://a.com:8080/').name)
+
+    def test_hosts_invalid_urls(self):
+        self.assertEqual('', self.hosts.get('www.a.com').name)
+        self.assertEqual('a.com', self.hosts.get('http://a.com:x/').name)
+        self.assertEqual('', self.hosts.get('http://[bad/x').name)
+
+    def test_hosts_limit(self):
+        host = self.hosts.get('http://a.com')
+        self.assertTrue(host.semaphore.acquire(blocking=False))
+        self.assertTrue(host.semaphore.acquire(blocking=False))
+        self.assertFalse(host.semaphore.acquire(blocking=False))
+        self.assertTrue(self.hosts.get('http://b.com').semaphore.acquire(
+            blocking=False))
+
+    def test_hosts_forgets_idle(self):
+        a = self.hosts.get('http://a.com')
+        self.hosts.get('http://b.com')
+        self.hosts.get('http://c.com')
+        self.assertEqual(2, len(self.hosts))
+        self.assertIsNot(a, self.hosts.get('http://a.com'))
+
+    def test_hosts_keeps_busy(self):
+        a = self.hosts.get('http://a.com')
+        a.semaphore.acquire()
+        b = self.hosts.get('http://b.com')
+        b.breaker.allow()
+        b.breaker.done(False)
+        self.hosts.get('http://c.com')
+        self.assertEqual(3, len(self.hosts))
+        self.assertIs(a, self.hosts.get('http://a.com'))
+        self.assertIs(b, self.hosts.get('http://b.com'))
+
+    def test_hosts_states(self):
+        self.hosts.get('http://a.com')
+        b = self.hosts.get('http://b.com')
+        b.breaker.allow()
+        b.breaker.done(False)
+        self.assertEqual({'b.com': CircuitBreaker.OPEN}, self.hosts.states())
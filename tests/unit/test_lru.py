@@ -0,0 +1,47 @@
+import unittest
+
+from strainer.lru import LRUCache
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = LRUCache(max_weight=10, clock=self.clock, weigh=len)
+
+    def test_lru_weights(self):
+        self.cache.put('a', 'aaaa', 60)
+        self.cache.put('b', 'bbbb', 60)
+        self.assertEqual('aaaa', self.cache.get('a'))
+        self.cache.put('c', 'cccc', 60)
+
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual('aaaa', self.cache.get('a'))
+        self.assertEqual(8, self.cache.weight)
+        self.assertEqual(1, self.cache.evictions)
+
+    def test_lru_too_heavy(self):
+        self.cache.put('a', 'a' * 11, 60)
+        self.assertEqual(0, len(self.cache))
+
+    def test_lru_expires(self):
+        self.cache.put('a', 'aaaa', 60)
+        self.cache.put('b', 'bbbb', 0)
+        self.clock.now += 30
+        self.assertEqual(30, self.cache.remaining('a'))
+        self.assertEqual(0, self.cache.remaining('b'))
+
+        self.clock.now += 30
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(0, self.cache.weight)
+        self.assertEqual({'hits': 0, 'misses': 1, 'evictions': 0,
+                          'size': 0}, self.cache.stats())
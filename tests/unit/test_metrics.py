@@ -0,0 +1,178 @@
+import logging
+import threading
+import unittest
+
+import eventlet
+
+from strainer import metrics
+from strainer import tracing
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_observe(self):
+        histogram = metrics.Histogram(buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(value)
+
+        # (note): Bounds are inclusive, as Prometheus' 'le'
+        self.assertEqual([2, 1, 1], histogram.counts)
+        self.assertEqual(4, histogram.count)
+        self.assertAlmostEqual(2.65, histogram.sum)
+
+    def test_samples_are_cumulative(self):
+        histogram = metrics.Histogram(buckets=(0.1, 1))
+        for value in (0.05, 0.5, 2):
+            histogram.observe(value)
+
+        samples = list(histogram.samples('h', (('stage', 'parse'),)))
+        expected = [
+            ('h_bucket', (('stage', 'parse'), ('le', '0.1')), 1),
+            ('h_bucket', (('stage', 'parse'), ('le', '1')), 2),
+            ('h_bucket', (('stage', 'parse'), ('le', '+Inf')), 3),
+            ('h_sum', (('stage', 'parse'),), 2.55),
+            ('h_count', (('stage', 'parse'),), 3),
+        ]
+        self.assertEqual(expected, samples)
+
+
+class TestRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_same_metric_for_same_labels(self):
+        a = self.registry.histogram('h', 'Help', stage='a')
+        self.assertIs(a, self.registry.histogram('h', 'Help', stage='a'))
+        self.assertIsNot(a, self.registry.histogram('h', 'Help', stage='b'))
+
+    def test_name_of_another_type(self):
+        self.registry.gauge('m', 'Help')
+        self.assertRaises(ValueError, self.registry.histogram, 'm', 'Help')
+
+    def test_gauge(self):
+        gauge = self.registry.gauge('g', 'Help')
+        gauge.inc()
+        gauge.inc(2)
+        gauge.dec()
+        self.assertEqual(2, gauge.get())
+
+    def test_gauge_threads(self):
+        gauge = self.registry.gauge('g', 'Help')
+
+        def use():
+            for _ in range(20000):
+                gauge.inc()
+                gauge.dec()
+
+        threads = [threading.Thread(target=use) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(0, gauge.get())
+
+    def test_gauge_from_function(self):
+        gauge = self.registry.gauge('g', 'Help', func=lambda: 42)
+        self.assertEqual(42, gauge.get())
+
+    def test_counter_only_goes_up(self):
+        counter = self.registry.counter('c_total', 'Help')
+        counter.inc()
+        self.assertRaises(ValueError, counter.dec)
+
+    def test_render(self):
+        self.registry.gauge('in_flight', 'Requests in flight').inc(3)
+        self.registry.counter('hits_total', 'Hits', func=lambda: 7)
+        histogram = self.registry.histogram('seconds', 'Seconds',
+                                            buckets=(1,), stage='a"b')
+        histogram.observe(0.5)
+
+        expected = '\n'.join([
+            '# HELP in_flight Requests in flight',
+            '# TYPE in_flight gauge',
+            'in_flight 3',
+            '# HELP hits_total Hits',
+            '# TYPE hits_total counter',
+            'hits_total 7',
+            '# HELP seconds Seconds',
+            '# TYPE seconds histogram',
+            'seconds_bucket{stage="a\\"b",le="1"} 1',
+            'seconds_bucket{stage="a\\"b",le="+Inf"} 1',
+            'seconds_sum{stage="a\\"b"} 0.5',
+            'seconds_count{stage="a\\"b"} 1',
+        ]) + '\n'
+        self.assertEqual(expected, self.registry.render())
+
+
+class TestTimed(unittest.TestCase):
+
+    def test_timed(self):
+        histogram = metrics.Histogram()
+
+        @metrics.timed(histogram)
+        def double(x):
+            return x * 2
+
+        self.assertEqual(4, double(2))
+        self.assertEqual(1, histogram.count)
+        self.assertEqual('double', double.__name__)
+
+    def test_timed_raises(self):
+        histogram = metrics.Histogram()
+
+        @metrics.timed(histogram)
+        def fail():
+            raise ValueError()
+
+        self.assertRaises(ValueError, fail)
+        self.assertEqual(1, histogram.count)
+
+
+class TestTracing(unittest.TestCase):
+
+    def test_new_request_ids_are_unique(self):
+        ids = set(tracing.new_request_id() for _ in range(100))
+        self.assertEqual(100, len(ids))
+        self.assertTrue(all(tracing.valid_request_id(i) for i in ids))
+
+    def test_valid_request_id(self):
+        self.assertTrue(tracing.valid_request_id('abc-123.4_5'))
+        self.assertFalse(tracing.valid_request_id(None))
+        self.assertFalse(tracing.valid_request_id(''))
+        self.assertFalse(tracing.valid_request_id('a b'))
+        self.assertFalse(tracing.valid_request_id('a\nb'))
+        self.assertFalse(tracing.valid_request_id('abc\n'))
+        self.assertFalse(tracing.valid_request_id('a' * 65))
+
+    def test_start_request(self):
+        self.assertEqual('abc-1', tracing.start_request('abc-1'))
+        self.assertEqual('abc-1', tracing.get_request_id())
+
+        request_id = tracing.start_request('abc\n')
+        self.assertNotEqual('abc\n', request_id)
+        self.assertTrue(tracing.valid_request_id(request_id))
+        self.assertEqual(request_id, tracing.get_request_id())
+        self.assertNotEqual(request_id, tracing.start_request())
+
+    def test_request_id_per_green_thread(self):
+        tracing.set_request_id('main')
+
+        def other():
+            tracing.set_request_id('other')
+            return tracing.get_request_id()
+
+        self.assertEqual('other', eventlet.spawn(other).wait())
+        self.assertEqual('main', tracing.get_request_id())
+        self.assertIsNone(eventlet.spawn(tracing.get_request_id).wait())
+
+    def test_request_id_filter(self):
+        record = logging.LogRecord('strainer', logging.INFO, __file__, 1,
+                                   'message', (), None)
+        tracing.set_request_id('abc')
+        self.assertTrue(tracing.RequestIdFilter().filter(record))
+        self.assertEqual('abc', record.request_id)
+
+        tracing.set_request_id(None)
+        tracing.RequestIdFilter().filter(record)
+        self.assertEqual('-', record.request_id)
@@ -0,0 +1,140 @@
+import multiprocessing
+import os
+import signal
+import time
+import unittest
+
+import eventlet
+import requests
+
+from strainer.prefork import _Worker
+from strainer.prefork import PreforkServer
+
+
+def pid_app(environ, start_response):
+    if environ['PATH_INFO'] == '/slow':
+        eventlet.sleep(1)
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [str(os.getpid()).encode('ascii')]
+
+
+class FakeSocket(object):
+
+    def __init__(self):
+        self.accepted = 0
+        self.closed = []
+
+    def accept(self):
+        self.accepted += 1
+        return FakeConnection(self), ('127.0.0.1', 1000 + self.accepted)
+
+    def getsockname(self):
+        return ('127.0.0.1', 5000)
+
+
+class FakeConnection(object):
+
+    def __init__(self, sock):
+        self.sock = sock
+
+    def close(self):
+        self.sock.closed.append(self)
+
+
+class TestWorker(unittest.TestCase):
+
+    def test_worker_counts_requests(self):
+        worker = _Worker(FakeSocket(), pid_app)
+        response = worker.wsgi_app({'PATH_INFO': '/'}, lambda *args: None)
+        self.assertEqual(1, worker.requests)
+        list(response)
+        response.close()
+        self.assertEqual(0, worker.requests)
+
+    def test_worker_delegates_to_socket(self):
+        worker = _Worker(FakeSocket(), pid_app)
+        self.assertEqual(('127.0.0.1', 5000), worker.getsockname())
+        self.assertEqual(('127.0.0.1', 1001), worker.accept()[1])
+
+    def test_worker_stops_accepting_when_draining(self):
+        sock = FakeSocket()
+        worker = _Worker(sock, pid_app)
+        worker.draining = True
+        accept = eventlet.spawn(worker.accept)
+        eventlet.sleep(0.01)
+        self.assertFalse(accept.dead)
+        self.assertEqual(0, sock.accepted)
+        accept.kill()
+
+
+class TestPreforkServer(unittest.TestCase):
+
+    def setUp(self):
+        sock = eventlet.listen(('127.0.0.1', 0))
+        self.url = 'http://127.0.0.1:%d' % sock.getsockname()[1]
+        server = PreforkServer(sock, pid_app, workers=2, graceful_timeout=5,
+                               log_output=False)
+        server.poll_interval = 0.01
+        server.supervisor_check_interval = 0.1
+        self.process = multiprocessing.Process(target=server.run)
+        self.process.start()
+        sock.close()
+
+    def tearDown(self):
+        if self.process.is_alive():
+            os.kill(self.process.pid, signal.SIGKILL)
+        self.process.join()
+
+    def pids(self, count):
+        """Returns pids of workers answering count new connections"""
+
+        pids = set()
+        deadline = time.time() + 10
+        while len(pids) < count and time.time() < deadline:
+            try:
+                resp = requests.get(self.url, headers={'Connection': 'close'})
+                pids.add(int(resp.text))
+            except requests.ConnectionError:
+                time.sleep(0.01)
+        return pids
+
+    def test_prefork_restarts_workers(self):
+        pids = self.pids(2)
+        self.assertEqual(2, len(pids))
+
+        os.kill(pids.pop(), signal.SIGKILL)
+        deadline = time.time() + 10
+        new_pids = set()
+        while len(new_pids - pids) < 1 and time.time() < deadline:
+            new_pids = self.pids(2)
+        self.assertEqual(1, len(new_pids - pids))
+
+    def test_prefork_drains_on_stop(self):
+        self.pids(2)
+        slow = eventlet.spawn(requests.get, self.url + '/slow')
+        eventlet.sleep(0.2)
+        os.kill(self.process.pid, signal.SIGTERM)
+
+        resp = slow.wait()
+        self.assertEqual(200, resp.status_code)
+        self.process.join(5)
+        self.assertFalse(self.process.is_alive())
+
+    def test_prefork_workers_stop_with_supervisor(self):
+        pids = self.pids(2)
+        os.kill(self.process.pid, signal.SIGKILL)
+        self.process.join()
+
+        deadline = time.time() + 5
+        while pids and time.time() < deadline:
+            pids = set(pid for pid in pids if _alive(pid))
+            time.sleep(0.05)
+        self.assertEqual(set(), pids)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
@@ -0,0 +1,98 @@
+import os
+import pstats
+import shutil
+import tempfile
+import unittest
+
+import eventlet
+import greenlet
+
+from strainer.profiling import Profiler
+from strainer import tracing
+
+
+def profiled_work():
+    return sum(range(1000))
+
+
+def fetch_work():
+    return sum(range(1000))
+
+
+def other_work():
+    return sum(range(1000))
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.profiler = Profiler(self.directory, enabled=True)
+
+    def tearDown(self):
+        greenlet.settrace(None)
+        shutil.rmtree(self.directory)
+
+    def profiles(self):
+        return sorted(os.listdir(self.directory))
+
+    def functions(self, name):
+        stats = pstats.Stats(os.path.join(self.directory, name))
+        return set(function for _, _, function in stats.stats)
+
+    def test_profiler_disabled(self):
+        self.profiler.enabled = False
+        self.assertIsNone(self.profiler.start({'HTTP_X_PROFILE': '1'}, 'a'))
+
+    def test_profiler_rate(self):
+        self.assertIsNone(self.profiler.start({}, 'a'))
+        self.profiler.rate = 1
+        profile = self.profiler.start({}, 'a')
+        self.assertIsNotNone(profile)
+        self.profiler.stop(profile)
+
+    def test_profiler_header(self):
+        profile = self.profiler.start({'HTTP_X_PROFILE': '1'}, 'a')
+        profiled_work()
+        self.profiler.stop(profile)
+
+        profiles = self.profiles()
+        self.assertEqual(1, len(profiles))
+        self.assertRegexpMatches(profiles[0], r'^\d{13}-a-\d+ms\.pstats$')
+        self.assertIn('profiled_work', self.functions(profiles[0]))
+        self.assertEqual(1, self.profiler.profiled)
+
+    def test_profiler_once_per_request(self):
+        profile = self.profiler.start({'HTTP_X_PROFILE': '1'}, 'a')
+        self.assertIsNone(self.profiler.start({'HTTP_X_PROFILE': '1'}, 'a'))
+        self.profiler.stop(profile)
+
+    def test_profiler_keeps_newest(self):
+        self.profiler.max_files = 2
+        for request_id in ('a', 'b', 'c'):
+            self.profiler.stop(self.profiler.start({'HTTP_X_PROFILE': '1'},
+                                                   request_id))
+        self.assertEqual(['b', 'c'],
+                         [name.split('-')[1] for name in self.profiles()])
+
+    def test_profiler_follows_request_green_threads(self):
+        def fetch():
+            tracing.set_request_id('a')
+            eventlet.sleep(0)
+            fetch_work()
+
+        def other():
+            eventlet.sleep(0)
+            other_work()
+
+        tracing.set_request_id('a')
+        profile = self.profiler.start({'HTTP_X_PROFILE': '1'}, 'a')
+        threads = [eventlet.spawn(fetch), eventlet.spawn(other)]
+        for thread in threads:
+            thread.wait()
+        self.profiler.stop(profile)
+        tracing.set_request_id(None)
+
+        functions = self.functions(self.profiles()[0])
+        self.assertIn('fetch_work', functions)
+        self.assertNotIn('other_work', functions)
@@ -0,0 +1,272 @@
+import BaseHTTPServer
+import socket
+import threading
+import unittest
+
+import dns.message
+import dns.rcode
+import dns.rdatatype
+import dns.resolver
+import dns.rrset
+import eventlet
+from eventlet.green import socket as green_socket
+from eventlet.support import greendns
+import requests
+
+from strainer.connections import ConnectionPool
+from strainer.resolver import lookup_dns
+from strainer.resolver import Resolver
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class StubLookup(object):
+    """Answers lookups from a dict of name to (addresses, ttl)"""
+
+    def __init__(self, answers, delay=0):
+        self.answers = answers
+        self.delay = delay
+        self.names = []
+
+    def __call__(self, name):
+        self.names.append(name)
+        if self.delay:
+            eventlet.sleep(self.delay)
+        if name not in self.answers:
+            raise socket.gaierror(socket.EAI_NONAME,
+                                  'Name or service not known')
+        return self.answers[name]
+
+
+class StubDNSServer(object):
+    """A DNS server on localhost answering A queries from a dict of name
+    to (address, ttl), and NXDOMAIN for other names"""
+
+    def __init__(self, records):
+        self.records = records
+        self.queries = 0
+        self.sock = green_socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.thread = eventlet.spawn(self._serve)
+
+    def _serve(self):
+        while True:
+            data, client = self.sock.recvfrom(512)
+            self.queries += 1
+            query = dns.message.from_wire(data)
+            response = dns.message.make_response(query)
+            question = query.question[0]
+            record = self.records.get(question.name.to_text())
+            if record is None:
+                response.set_rcode(dns.rcode.NXDOMAIN)
+            elif question.rdtype == dns.rdatatype.A:
+                response.answer.append(dns.rrset.from_text(
+                    question.name, record[1], 'IN', 'A', record[0]))
+            self.sock.sendto(response.to_wire(), client)
+
+    def proxy(self):
+        """Returns a green resolver querying this server only"""
+
+        resolver = dns.resolver.Resolver(configure=False)
+        resolver.nameservers = ['127.0.0.1']
+        resolver.port = self.sock.getsockname()[1]
+        proxy = greendns.ResolverProxy()
+        proxy._resolver = resolver
+        return proxy
+
+    def close(self):
+        self.thread.kill()
+        self.sock.close()
+
+
+class TestResolver(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.lookup = StubLookup({'a.test': (['10.0.0.1', '10.0.0.2'], 60),
+                                  'b.test': (['10.0.0.3'], 7200),
+                                  'c.test': (['10.0.0.4'], 0)})
+        self.resolver = Resolver(max_size=2, max_ttl=3600, negative_ttl=10,
+                                 lookup=self.lookup, clock=self.clock)
+
+    def test_resolver_addresses(self):
+        self.assertEqual(['10.0.0.1', '10.0.0.2'],
+                         self.resolver.resolve('a.test'))
+        self.assertEqual(['a.test'], self.lookup.names)
+
+    def test_resolver_skips_addresses(self):
+        self.assertEqual(['127.0.0.1'], self.resolver.resolve('127.0.0.1'))
+        self.assertEqual(['::1'], self.resolver.resolve('::1'))
+        self.assertEqual([], self.lookup.names)
+
+    def test_resolver_caches_for_ttl(self):
+        self.resolver.resolve('a.test')
+        self.clock.now += 59
+        self.resolver.resolve('a.test')
+        self.assertEqual(1, len(self.lookup.names))
+        self.clock.now += 1
+        self.resolver.resolve('a.test')
+        self.assertEqual(2, len(self.lookup.names))
+        self.assertEqual(1, self.resolver.hits)
+        self.assertEqual(2, self.resolver.misses)
+
+    def test_resolver_max_ttl(self):
+        self.resolver.resolve('b.test')
+        self.clock.now += 3600
+        self.resolver.resolve('b.test')
+        self.assertEqual(2, len(self.lookup.names))
+
+    def test_resolver_zero_ttl(self):
+        self.resolver.resolve('c.test')
+        self.resolver.resolve('c.test')
+        self.assertEqual(2, len(self.lookup.names))
+
+    def test_resolver_caches_failures(self):
+        self.assertRaises(socket.gaierror, self.resolver.resolve, 'x.test')
+        self.clock.now += 9
+        self.assertRaises(socket.gaierror, self.resolver.resolve, 'x.test')
+        self.assertEqual(1, len(self.lookup.names))
+        self.clock.now += 1
+        self.assertRaises(socket.gaierror, self.resolver.resolve, 'x.test')
+        self.assertEqual(2, len(self.lookup.names))
+
+    def test_resolver_evicts_least_recently_used(self):
+        self.resolver.resolve('a.test')
+        self.resolver.resolve('b.test')
+        self.resolver.resolve('a.test')
+        self.assertRaises(socket.gaierror, self.resolver.resolve, 'x.test')
+        self.assertEqual(2, len(self.resolver))
+        self.assertEqual(1, self.resolver.evictions)
+        self.resolver.resolve('a.test')
+        self.resolver.resolve('b.test')
+        self.assertEqual(['a.test', 'b.test', 'x.test', 'b.test'],
+                         self.lookup.names)
+
+    def test_resolver_coalesces_lookups(self):
+        self.lookup.delay = 0.01
+        pool = eventlet.GreenPool()
+        results = list(pool.imap(self.resolver.resolve, ['a.test'] * 5))
+        self.assertEqual([['10.0.0.1', '10.0.0.2']] * 5, results)
+        self.assertEqual(['a.test'], self.lookup.names)
+        self.assertEqual(1, self.resolver.misses)
+        self.assertEqual(4, self.resolver.coalesced)
+
+    def test_resolver_coalesces_failures(self):
+        self.lookup.delay = 0.01
+        def resolve():
+            try:
+                self.resolver.resolve('x.test')
+            except socket.gaierror as e:
+                return e
+
+        waiting = eventlet.spawn(resolve)
+        eventlet.sleep(0)
+        self.assertRaises(socket.gaierror, self.resolver.resolve, 'x.test')
+        self.assertIsInstance(waiting.wait(), socket.gaierror)
+        self.assertEqual(['x.test'], self.lookup.names)
+
+    def test_resolver_lookup_killed(self):
+        self.lookup.delay = 0.01
+        first = eventlet.spawn(self.resolver.resolve, 'a.test')
+        eventlet.sleep(0)
+        second = eventlet.spawn(self.resolver.resolve, 'a.test')
+        eventlet.sleep(0)
+        first.kill()
+        # (note): The green thread waiting looks the name up itself
+        self.assertEqual(['10.0.0.1', '10.0.0.2'], second.wait())
+        self.assertEqual(['a.test', 'a.test'], self.lookup.names)
+
+
+class TestLookupDNS(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubDNSServer({'titles.test.': ('127.0.0.2', 42)})
+        self.proxy = self.server.proxy()
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_lookup_dns(self):
+        self.assertEqual((['127.0.0.2'], 42),
+                         lookup_dns('titles.test', self.proxy))
+
+    def test_lookup_dns_unknown_name(self):
+        self.assertRaises(socket.gaierror, lookup_dns, 'unknown.test',
+                          self.proxy)
+
+    def test_resolver_with_dns(self):
+        resolver = Resolver(
+            lookup=lambda name: lookup_dns(name, self.proxy))
+        self.assertEqual(['127.0.0.2'], resolver.resolve('titles.test'))
+        queries = self.server.queries
+        self.assertEqual(['127.0.0.2'], resolver.resolve('titles.test'))
+        self.assertEqual(queries, self.server.queries)
+
+
+class HostHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Answers with the Host header as the title"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = '<title>%s</title>' % self.headers['Host']
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestResolvingConnections(unittest.TestCase):
+
+    def setUp(self):
+        # (note): Sockets aren't green here, so the server runs in a
+        # thread of its own
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+                                                HostHandler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs={'poll_interval': 0.01})
+        self.thread.start()
+        self.lookup = StubLookup({'titles.test': (['127.0.0.1'], 60)})
+        self.connections = ConnectionPool(
+            idle_timeout=0, resolver=Resolver(lookup=self.lookup))
+
+    def tearDown(self):
+        self.connections.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def test_connections_resolve_host_names(self):
+        url = 'http://titles.test:%d/' % self.port
+        for _ in range(2):
+            resp = self.connections.session.get(url)
+            self.assertEqual('<title>titles.test:%d</title>' % self.port,
+                             resp.text)
+        # (note): The idle connection is closed and a new one is made,
+        # without looking the name up again
+        self.assertEqual(['titles.test'], self.lookup.names)
+
+    def test_connections_try_each_address(self):
+        # (note): Nothing listens on the port over IPv6
+        self.lookup.answers['titles.test'] = (['::1', '127.0.0.1'], 60)
+        resp = self.connections.session.get(
+            'http://titles.test:%d/' % self.port)
+        self.assertEqual(200, resp.status_code)
+
+    def test_connections_unknown_host_name(self):
+        self.assertRaises(requests.ConnectionError,
+                          self.connections.session.get,
+                          'http://unknown.test:%d/' % self.port)
+        self.assertEqual(['unknown.test'], self.lookup.names)
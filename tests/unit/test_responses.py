@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import unittest
+
+from strainer.responses import ResponseCache
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        # (note): Room for two responses of 100 bytes
+        max_bytes = 2 * (100 + ResponseCache.overhead)
+        self.cache = ResponseCache(max_bytes=max_bytes, clock=self.clock)
+
+    def body(self, c):
+        return c * 100
+
+    def test_cache_hit(self):
+        self.cache.set(u'@chris (coffee)', b'{"mentions": ["chris"]}', 60)
+        self.assertEqual(b'{"mentions": ["chris"]}',
+                         self.cache.get(u'@chris (coffee)'))
+        self.assertEqual(1, self.cache.hits)
+        self.assertEqual(0, self.cache.misses)
+
+    def test_cache_miss(self):
+        self.assertIsNone(self.cache.get(u'@chris'))
+        self.assertEqual(0, self.cache.hits)
+        self.assertEqual(1, self.cache.misses)
+
+    def test_cache_unicode_messages(self):
+        self.cache.set(u'caf\xe9 (coffee)', b'a', 60)
+        self.assertEqual(b'a', self.cache.get(u'caf\xe9 (coffee)'))
+        self.assertEqual(b'a', self.cache.get(u'caf\xe9 (coffee)'
+                                              .encode('utf-8')))
+        self.assertIsNone(self.cache.get(u'cafe (coffee)'))
+
+    def test_cache_ttl(self):
+        self.cache.set(u'a', b'a', 60)
+        self.clock.now += 59
+        self.assertEqual(b'a', self.cache.get(u'a'))
+        self.clock.now += 1
+        self.assertIsNone(self.cache.get(u'a'))
+        self.assertEqual(0, len(self.cache))
+        self.assertEqual(0, self.cache.bytes)
+
+    def test_cache_zero_ttl(self):
+        self.cache.set(u'a', b'a', 0)
+        self.assertIsNone(self.cache.get(u'a'))
+
+    def test_cache_evicts_least_recently_used(self):
+        self.cache.set(u'a', self.body(b'a'), 60)
+        self.cache.set(u'b', self.body(b'b'), 60)
+        self.cache.get(u'a')
+        self.cache.set(u'c', self.body(b'c'), 60)
+        self.assertEqual(self.body(b'a'), self.cache.get(u'a'))
+        self.assertIsNone(self.cache.get(u'b'))
+        self.assertEqual(self.body(b'c'), self.cache.get(u'c'))
+        self.assertEqual(1, self.cache.evictions)
+        self.assertEqual(self.cache.max_bytes, self.cache.bytes)
+
+    def test_cache_evicts_for_big_response(self):
+        self.cache.set(u'a', self.body(b'a'), 60)
+        self.cache.set(u'b', self.body(b'b'), 60)
+        self.cache.set(u'c', self.body(b'c') * 2, 60)
+        self.assertEqual(1, len(self.cache))
+        self.assertEqual(2, self.cache.evictions)
+
+    def test_cache_too_big_response(self):
+        self.cache.set(u'a', self.body(b'a'), 60)
+        self.cache.set(u'b', self.body(b'b') * 5, 60)
+        self.assertIsNone(self.cache.get(u'b'))
+        self.assertEqual(self.body(b'a'), self.cache.get(u'a'))
+
+    def test_cache_replace(self):
+        self.cache.set(u'a', self.body(b'a'), 60)
+        self.cache.set(u'a', b'a', 60)
+        self.assertEqual(b'a', self.cache.get(u'a'))
+        self.assertEqual(1 + ResponseCache.overhead, self.cache.bytes)
+
+    def test_cache_clear(self):
+        self.cache.set(u'a', b'a', 60)
+        self.cache.get(u'a')
+        self.cache.clear()
+        self.assertEqual(0, len(self.cache))
+        self.assertEqual(0, self.cache.bytes)
+        self.assertEqual(0, self.cache.hits)
+
+    def test_cache_threads(self):
+        errors = []
+
+        def use():
+            try:
+                for i in range(2000):
+                    message = u'%d' % (i % 5)
+                    if self.cache.get(message) is None:
+                        self.cache.set(message, self.body(message), 60)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=use) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([], errors)
+        self.assertEqual(2, len(self.cache))
+        self.assertEqual(2 * (100 + ResponseCache.overhead), self.cache.bytes)
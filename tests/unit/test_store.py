@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from strainer.store import TitleStore
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTitleStore(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'titles.db')
+        self.clock = FakeClock()
+        self.store = TitleStore(self.path, max_size=2, ttl=60,
+                                negative_ttl=10, clock=self.clock)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.dir)
+
+    def test_store_hit(self):
+        self.store.set('http://a.com', u'A')
+        self.assertEqual(u'A', self.store.get('http://a.com'))
+        self.assertEqual(1, self.store.hits)
+        self.assertEqual(0, self.store.misses)
+
+    def test_store_miss(self):
+        self.assertIsNone(self.store.get('http://a.com'))
+        self.assertEqual(1, self.store.misses)
+
+    def test_store_unicode_title(self):
+        self.store.set('http://a.com', u'Unicode® character table')
+        self.assertEqual(u'Unicode® character table',
+                         self.store.get('http://a.com'))
+
+    def test_store_expires(self):
+        self.store.set('http://a.com', u'A')
+        self.clock.now += 59
+        self.assertEqual(u'A', self.store.get('http://a.com'))
+        self.clock.now += 1
+        self.assertIsNone(self.store.get('http://a.com'))
+
+    def test_store_empty_title_expires_sooner(self):
+        self.store.set('http://dead.link', u'')
+        self.assertEqual(u'', self.store.get('http://dead.link'))
+        self.clock.now += 10
+        self.assertIsNone(self.store.get('http://dead.link'))
+
+    def test_store_evicts_closest_to_expiring(self):
+        self.store.prune_every = 1
+        self.store.set('http://a.com', u'A')
+        self.clock.now += 1
+        self.store.set('http://b.com', u'B')
+        self.clock.now += 1
+        self.store.set('http://c.com', u'C')
+
+        self.assertEqual(2, len(self.store))
+        self.assertIsNone(self.store.get('http://a.com'))
+        self.assertEqual(u'B', self.store.get('http://b.com'))
+        self.assertEqual(u'C', self.store.get('http://c.com'))
+
+    def test_store_prunes_expired(self):
+        self.store.prune_every = 2
+        self.store.set('http://dead.link', u'')
+        self.clock.now += 10
+        self.store.set('http://a.com', u'A')
+        self.assertEqual(1, len(self.store))
+
+    def test_store_disabled(self):
+        store = TitleStore(self.path, max_size=0)
+        store.set('http://a.com', u'A')
+        self.assertIsNone(store.get('http://a.com'))
+
+    def test_store_shared(self):
+        self.store.set('http://a.com', u'A')
+        other = TitleStore(self.path, clock=self.clock)
+        try:
+            self.assertEqual(u'A', other.get('http://a.com'))
+            other.set('http://b.com', u'B')
+            self.assertEqual(u'B', self.store.get('http://b.com'))
+        finally:
+            other.close()
+
+    def test_store_survives_reopening(self):
+        self.store.set('http://a.com', u'A')
+        self.store.close()
+        store = TitleStore(self.path, clock=self.clock)
+        try:
+            self.assertEqual(u'A', store.get('http://a.com'))
+        finally:
+            store.close()
+
+    def test_store_wal_mode(self):
+        self.store.get('http://a.com')
+        db = sqlite3.connect(self.path)
+        try:
+            mode = db.execute('PRAGMA journal_mode').fetchone()[0]
+        finally:
+            db.close()
+        self.assertEqual('wal', mode)
+
+    def test_store_locked(self):
+        self.store.set('http://a.com', u'A')
+        db = sqlite3.connect(self.path, isolation_level=None)
+        try:
+            db.execute('BEGIN EXCLUSIVE')
+            self.store.set('http://b.com', u'B')
+            self.assertEqual(1, self.store.errors)
+        finally:
+            db.close()
+        self.assertIsNone(self.store.get('http://b.com'))
+
+    def test_store_clear(self):
+        self.store.set('http://a.com', u'A')
+        self.store.get('http://a.com')
+        self.store.clear()
+        self.assertEqual(0, len(self.store))
+        self.assertEqual(0, self.store.hits)
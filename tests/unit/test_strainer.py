@@ -210,3 +210,173 @@ class TestURLsStraining(unittest.TestCase):
                     'www.olympic.org/rio-2016']
         actual = MessageStrainer.strain_urls(test_input)
         self.assertItemsEqual(expected, actual)
+
+
+class TestAllStraining(unittest.TestCase):
+
+    def _assert_same_as_individual_strainers(self, test_input):
+        expected = (MessageStrainer.strain_mentions(test_input),
+                    MessageStrainer.strain_emoticons(test_input),
+                    MessageStrainer.strain_urls(test_input))
+        actual = MessageStrainer.strain_all(test_input)
+        self.assertEqual(expected, actual)
+
+    def test_strain_all_included(self):
+        test_input = ("@bob @john (success) such a cool feature; "
+                      "https://twitter.com/jdorfman/status/430511497475670016")
+        expected = (['bob', 'john'], ['success'],
+                    ['https://twitter.com/jdorfman/status/430511497475670016'])
+        actual = MessageStrainer.strain_all(test_input)
+        self.assertEqual(expected, actual)
+
+    def test_strain_all_none(self):
+        actual = MessageStrainer.strain_all("Good morning!")
+        self.assertEqual(([], [], []), actual)
+
+    def test_strain_all_mentions_and_emoticons_in_urls(self):
+        test_input = ("see http://example.com/@bob/(yes) and "
+                      "https://www.olympic.org/(rio)-2016 @john (cool)")
+        expected = (['bob', 'john'], ['yes', 'rio', 'cool'],
+                    ['http://example.com/@bob/(yes)',
+                     'https://www.olympic.org/(rio)-2016'])
+        actual = MessageStrainer.strain_all(test_input)
+        self.assertEqual(expected, actual)
+        self._assert_same_as_individual_strainers(test_input)
+
+    def test_strain_all_url_right_after_mention(self):
+        self._assert_same_as_individual_strainers(
+            "@www.olympic.org/rio-2016 @alice@nbcolympics.com (yo)http://a.b")
+
+    def test_strain_all_same_as_individual_strainers(self):
+        test_inputs = [
+            "@alice @@bob @john@ such a cool feature;",
+            "@bob @john ((success)) such a (cool))) feature;",
+            "(blah)(blah1)(blah2)(blah3) (1234) (supercalifragilistic)!",
+            ("Olympics are starting soon; (https://www.olympic.org/rio-2016) "
+             "www.nbcolympics.com http://www.nbcolympics.com "),
+            "super@alice ,,,@bob;;; @john, (o/) such a (cool#) feature;",
+        ]
+        for test_input in test_inputs:
+            self._assert_same_as_individual_strainers(test_input)
+
+
+class TestIterStraining(unittest.TestCase):
+
+    test_input = ("@bob (coffee) see http://example.com/@ann/(yes) "
+                  "and www.olympic.org @john (cool)")
+
+    def _assert_spans(self, results, prefix='', suffix=''):
+        for text, start, end in results:
+            self.assertEqual(prefix + text + suffix,
+                             self.test_input[start:end])
+
+    def test_iter_mentions(self):
+        actual = list(MessageStrainer.iter_mentions(self.test_input))
+        self.assertEqual([('bob', 0, 4), ('ann', 37, 41), ('john', 68, 73)],
+                         actual)
+        self._assert_spans(actual, prefix='@')
+
+    def test_iter_emoticons(self):
+        actual = list(MessageStrainer.iter_emoticons(self.test_input))
+        self.assertEqual([('coffee', 5, 13), ('yes', 42, 47),
+                          ('cool', 74, 80)], actual)
+        self._assert_spans(actual, prefix='(', suffix=')')
+
+    def test_iter_urls(self):
+        actual = list(MessageStrainer.iter_urls(self.test_input))
+        self.assertEqual([('http://example.com/@ann/(yes)', 18, 47),
+                          ('www.olympic.org', 52, 67)], actual)
+        self._assert_spans(actual)
+
+    def test_iter_limit(self):
+        self.assertEqual([('bob', 0, 4)], list(
+            MessageStrainer.iter_mentions(self.test_input, limit=1)))
+        self.assertEqual([], list(
+            MessageStrainer.iter_emoticons(self.test_input, limit=0)))
+        self.assertEqual(2, len(list(
+            MessageStrainer.iter_urls(self.test_input, limit=5))))
+
+    def test_iter_stops_early(self):
+        message = '@bob ' * 10 ** 6
+        mentions = MessageStrainer.iter_mentions(message)
+        self.assertEqual(('bob', 0, 4), next(mentions))
+        mentions.close()
+
+    def test_iter_all_same_as_iter_strainers(self):
+        actual = list(MessageStrainer.iter_all(self.test_input))
+        for kind, strainer in [('mentions', MessageStrainer.iter_mentions),
+                               ('emoticons', MessageStrainer.iter_emoticons),
+                               ('urls', MessageStrainer.iter_urls)]:
+            self.assertEqual(list(strainer(self.test_input)),
+                             [result[1:] for result in actual
+                              if result[0] == kind])
+        starts = [start for _, _, start, _ in actual]
+        self.assertEqual(sorted(starts), starts)
+
+    def test_strain_all_spans(self):
+        expected = (list(MessageStrainer.iter_mentions(self.test_input)),
+                    list(MessageStrainer.iter_emoticons(self.test_input)),
+                    list(MessageStrainer.iter_urls(self.test_input)))
+        actual = MessageStrainer.strain_all(self.test_input, spans=True)
+        self.assertEqual(expected, actual)
+
+    def test_strain_all_limit(self):
+        expected = (['bob', 'ann'], ['coffee', 'yes'],
+                    ['http://example.com/@ann/(yes)', 'www.olympic.org'])
+        actual = MessageStrainer.strain_all(self.test_input, limit=2)
+        self.assertEqual(expected, actual)
+        self.assertEqual(([], [], []), MessageStrainer.strain_all(
+            self.test_input, limit=0))
+
+    def test_strain_all_limit_spans(self):
+        expected = ([('bob', 0, 4)], [('coffee', 5, 13)],
+                    [('http://example.com/@ann/(yes)', 18, 47)])
+        actual = MessageStrainer.strain_all(self.test_input, limit=1,
+                                            spans=True)
+        self.assertEqual(expected, actual)
+
+
+class SmallChunkStrainer(MessageStrainer):
+
+    parallel_threshold = 100
+
+    parallel_chunk_size = 10
+
+    processes = 2
+
+
+class TestParallelStraining(unittest.TestCase):
+
+    test_input = ("@alice see http://example.com/a_(b) and www.olympic.org "
+                  "(coffee)\n@bob\tfoo.com/bar (success) https://x.org/ok "
+                  "@john (yes)") * 5
+
+    def test_split_after_whitespace(self):
+        chunks = MessageStrainer.split("aaa bbb\tccc\nddd", 2)
+        self.assertEqual(["aaa ", "bbb\t", "ccc\n", "ddd"], chunks)
+
+    def test_split_long_run_without_whitespace(self):
+        chunks = MessageStrainer.split("a" * 20 + " b", 5)
+        self.assertEqual(["a" * 20 + " ", "b"], chunks)
+
+    def test_split_short_message(self):
+        chunks = MessageStrainer.split("@bob (yes)", 20)
+        self.assertEqual(["@bob (yes)"], chunks)
+
+    def test_split_keeps_tokens_whole(self):
+        for size in range(1, 40):
+            chunks = MessageStrainer.split(self.test_input, size)
+            self.assertEqual(self.test_input, ''.join(chunks))
+            merged = ([], [], [])
+            for chunk in chunks:
+                for tokens, chunk_tokens in zip(
+                        merged, MessageStrainer.strain_all(chunk)):
+                    tokens.extend(chunk_tokens)
+            expected = MessageStrainer.strain_all(self.test_input)
+            self.assertEqual(expected, merged)
+
+    def test_strain_parallel(self):
+        expected = MessageStrainer.strain_all(self.test_input)
+        actual = SmallChunkStrainer.strain_all(self.test_input)
+        self.assertEqual(expected, actual)
+        self.assertIsNotNone(SmallChunkStrainer._process_pool)
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import re
+import time
+import unittest
+
+from strainer import util
+from strainer.urls import URLFinder
+
+
+class TestURLFinder(unittest.TestCase):
+
+    re_url = re.compile(util.WEB_URL_REGEX)
+
+    def _assert_same_as_regex(self, test_input):
+        expected = self.re_url.findall(test_input)
+        actual = URLFinder.find_urls(test_input)
+        self.assertEqual(expected, actual)
+
+    def test_find_urls_with_scheme(self):
+        test_input = ("Olympics are starting soon; "
+                      "https://www.olympic.org/rio-2016 "
+                      "http://www.nbcolympics.com ")
+        expected = ['https://www.olympic.org/rio-2016',
+                    'http://www.nbcolympics.com']
+        actual = URLFinder.find_urls(test_input)
+        self.assertEqual(expected, actual)
+
+    def test_find_urls_without_scheme(self):
+        test_input = "see www.olympic.org/rio-2016 and nbcolympics.com."
+        expected = ['www.olympic.org/rio-2016', 'nbcolympics.com']
+        actual = URLFinder.find_urls(test_input)
+        self.assertEqual(expected, actual)
+
+    def test_find_urls_unknown_tld(self):
+        test_input = "e.g. the file is called README.txt, not foo.bar"
+        actual = URLFinder.find_urls(test_input)
+        self.assertEqual([], actual)
+
+    def test_find_urls_with_parenthesis(self):
+        test_input = ("https://en.wikipedia.org/wiki/Python_(language) "
+                      "(https://www.olympic.org/rio-2016)")
+        expected = ['https://en.wikipedia.org/wiki/Python_(language)',
+                    'https://www.olympic.org/rio-2016']
+        actual = URLFinder.find_urls(test_input)
+        self.assertEqual(expected, actual)
+
+    def test_find_urls_same_as_regex(self):
+        test_inputs = [
+            "@bob @john (success) such a cool feature; "
+            "https://twitter.com/jdorfman/status/430511497475670016",
+            "@www.google.com @alice@example.com bob@example.co.uk/x",
+            "HTTPS://WWW.EXAMPLE.COM/A?b=c&d=e#f, http:foo.com!",
+            "ftp://example.com http:/x https:///x http://a",
+            "foo.http://example.com/(a)(b) x.com/((a)b) x.com/((a)b)c",
+            "x.com/(a)]b).com http://x(x)].COM))(x)_[/ a.b.c.d.com-e",
+            "dots... example..com .com/x -example.com/x _example.com",
+            u"unicode: http://example.com/caf\xe9 “http://x.org”",
+            "10.0.0.1/admin 127.0.0.1 example.com:8080/path example.Ja",
+        ]
+        for test_input in test_inputs:
+            self._assert_same_as_regex(test_input)
+
+    def test_find_urls_pathological_input_is_fast(self):
+        test_inputs = ['a.' * 20000, 'a' + '.' * 50000, 'a-' * 20000 + '.x',
+                       'http://x' + '(' * 50000,
+                       'http://x/' + '(a' * 20000 + ' ',
+                       'http://' + '!' * 50000,
+                       'http://a(' * 20000, 'x.com/(a' * 20000]
+        for test_input in test_inputs:
+            start = time.time()
+            URLFinder.find_urls(test_input)
+            self.assertLess(time.time() - start, 2)